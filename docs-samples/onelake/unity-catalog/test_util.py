@@ -0,0 +1,400 @@
+import base64
+import json
+import sys
+import time
+import types
+
+import pytest
+import requests
+
+# util.py imports notebookutils, which only exists inside Fabric notebooks
+if 'notebookutils' not in sys.modules:
+    sys.modules['notebookutils'] = types.SimpleNamespace(mssparkutils=None)
+
+import util  # noqa: E402
+from util import AdaptiveConcurrency, SyncReport, ThrottleGate, TokenCache, Utils  # noqa: E402
+
+FABRIC_CONFIG = {
+    'workspace_id': 'ws',
+    'lakehouse_id': 'lh',
+    'shortcut_connection_id': 'conn',
+    'consider_dbx_uc_table_changes': True,
+}
+
+
+def table(catalog, schema, name):
+    return {'catalog_name': catalog, 'schema_name': schema, 'name': name, 'table_type': 'MANAGED'}
+
+
+def external_table(name, operation='create', updated_at=None):
+    return {
+        'catalog_name': 'c', 'schema_name': 's', 'name': name, 'table_type': 'EXTERNAL',
+        'data_source_format': 'DELTA', 'storage_location': f'abfss://data@acct.dfs.core.windows.net/tables/{name}',
+        'operation': operation, 'created_at': 1000, 'updated_at': updated_at,
+    }
+
+
+def response(status_code, body=None, headers=None):
+    res = requests.Response()
+    res.status_code = status_code
+    res._content = json.dumps(body if body is not None else {}).encode()
+    res.headers.update(headers or {})
+    return res
+
+
+def jwt(exp):
+    payload = base64.urlsafe_b64encode(json.dumps({'exp': exp}).encode()).decode().rstrip('=')
+    return f"header.{payload}.signature"
+
+
+class FakeClock:
+    """Stands in for time.time/time.sleep so back-offs and throttle pauses pass instantly."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += max(0.0, seconds)
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    """Fresh shared state per test, a fake token and a virtual clock."""
+    clock = FakeClock()
+    monkeypatch.setattr(util.time, 'time', clock.time)
+    monkeypatch.setattr(util.time, 'sleep', clock.sleep)
+    monkeypatch.setattr(Utils, 'TOKEN_CACHE', TokenCache(fetch_token=lambda audience: f"{audience}-token"))
+    monkeypatch.setattr(Utils, 'THROTTLE', ThrottleGate())
+    monkeypatch.setattr(Utils, 'ONELAKE_THROTTLE', ThrottleGate())
+    return clock
+
+
+class FakeFabric:
+    """Answers requests.request calls from a list of (method, url fragment, response or callable) routes.
+
+    Responses listed for the same route are returned in order; the last one repeats.
+    """
+
+    def __init__(self, monkeypatch, routes, function='request'):
+        self.routes = routes
+        self.calls = []
+        if function == 'request':
+            monkeypatch.setattr(util.requests, 'request', self.request)
+        else:
+            monkeypatch.setattr(util.requests, 'get', lambda url, **kwargs: self.request('GET', url, **kwargs))
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        for route_method, fragment, responses in self.routes:
+            if route_method == method and fragment in url:
+                result = responses.pop(0) if len(responses) > 1 else responses[0]
+                return result(url, **kwargs) if callable(result) else result
+        raise AssertionError(f"Unexpected request {method} {url}")
+
+
+def test_deletions_skip_shortcuts_of_schemas_with_overlapping_names():
+    current_shortcuts = {
+        'uc_c_s_t1': None,      # still a table of c.s
+        'uc_c_s_gone': None,    # table of c.s that was dropped
+        'uc_c_s_x_t9': None,    # belongs to schema c.s_x
+    }
+    deletions = Utils.plan_shortcut_changes(
+        [table('c', 's', 't1')], current_shortcuts, scopes={('c', 's')}, known_scopes={('c', 's_x')})
+    assert deletions == ['uc_c_s_gone']
+
+
+def test_deletions_skip_shortcuts_of_catalogs_with_overlapping_names():
+    current_shortcuts = {
+        'uc_main_sales_orders': None,      # dropped table of main.sales
+        'uc_main_sales_eu_orders': None,   # belongs to catalog main_sales, schema eu
+    }
+    deletions = Utils.plan_shortcut_changes(
+        [], current_shortcuts, scopes={('main', 'sales')}, known_scopes={('main_sales', 'eu')})
+    assert deletions == ['uc_main_sales_orders']
+
+
+def test_the_longer_scope_owns_shortcuts_of_the_shorter_one():
+    current_shortcuts = {'uc_c_s_t1': None, 'uc_c_s_x_t9': None}
+    deletions = Utils.plan_shortcut_changes(
+        [], current_shortcuts, scopes={('c', 's_x')}, known_scopes={('c', 's')})
+    assert deletions == ['uc_c_s_x_t9']
+
+
+# user-026: token cache and paginated Unity Catalog listing
+
+def test_token_cache_fetches_once_until_the_refresh_margin():
+    fetched = []
+
+    def fetch(audience):
+        fetched.append(audience)
+        return jwt(time.time() + 3600)
+
+    cache = TokenCache(fetch_token=fetch)
+    assert cache.get_token('pbi') == cache.get_token('pbi')
+    assert fetched == ['pbi']
+
+
+def test_token_cache_refreshes_tokens_close_to_expiry_and_after_invalidate():
+    tokens = iter([jwt(time.time() + 60), jwt(time.time() + 3600), jwt(time.time() + 7200)])
+    cache = TokenCache(fetch_token=lambda audience: next(tokens), refresh_margin_seconds=300)
+    first = cache.get_token()
+    second = cache.get_token()
+    assert first != second  # the first one expires within the margin
+    assert cache.get_token() == second
+    cache.invalidate()
+    assert cache.get_token() not in {first, second}
+
+
+def test_token_cache_falls_back_to_the_default_ttl_for_opaque_tokens():
+    assert TokenCache._expires_on('not-a-jwt') == pytest.approx(time.time() + TokenCache.DEFAULT_TTL_SECONDS, abs=5)
+
+
+def test_get_dbx_uc_tables_follows_page_tokens(monkeypatch):
+    pages = {
+        None: {'tables': [{'name': 't1'}, {'name': 't2'}], 'next_page_token': 'p2'},
+        'p2': {'tables': [{'name': 't3'}]},
+    }
+    requested = []
+
+    def get(self, url, params=None):
+        requested.append(dict(params))
+        return response(200, pages[params.get('page_token')])
+
+    monkeypatch.setattr(util.requests.Session, 'get', get)
+    tables = Utils.get_dbx_uc_tables({
+        'dbx_workspace': 'https://dbx', 'dbx_token': 'pat', 'dbx_uc_catalog': 'c', 'dbx_uc_schemas': ['s']})
+    assert [t['name'] for t in tables] == ['t1', 't2', 't3']
+    assert requested[0]['omit_columns'] == 'true'
+    assert requested[1]['page_token'] == 'p2'
+
+
+def test_get_dbx_uc_tables_returns_none_when_unity_catalog_fails(monkeypatch):
+    monkeypatch.setattr(util.requests.Session, 'get', lambda self, url, params=None: response(403))
+    assert Utils.get_dbx_uc_tables({
+        'dbx_workspace': 'https://dbx', 'dbx_token': 'pat', 'dbx_uc_catalog': 'c', 'dbx_uc_schemas': ['s']}) is None
+
+
+# user-027: parallel deletes behind a shared throttle
+
+def test_throttle_gate_blocks_until_the_pause_has_elapsed(clock):
+    gate = ThrottleGate()
+    gate.pause(30)
+    gate.pause(10)  # a shorter pause never shortens the current one
+    gate.wait()
+    assert sum(clock.slept) == pytest.approx(30)
+
+
+def test_delete_shortcuts_retries_throttled_calls_without_spending_max_retries(monkeypatch):
+    fabric = FakeFabric(monkeypatch, [
+        ('DELETE', '/Tables/gone1', [response(429, headers={'Retry-After': '1'}), response(429), response(200)]),
+        ('DELETE', '/Tables/gone2', [response(404)]),
+        ('DELETE', '/Tables/broken', [response(500)]),
+    ])
+    report = SyncReport()
+    deleted, failed = Utils.delete_shortcuts(dict(FABRIC_CONFIG, max_retries=2), ['gone1', 'gone2', 'broken'],
+                                             report=report)
+    assert (deleted, failed) == (1, 1)
+    assert len([call for call in fabric.calls if call[1].endswith('/broken')]) == 2
+    assert {e['shortcut_name']: e['outcome'] for e in report.entries} == {
+        'gone1': 'deleted', 'gone2': 'not_found', 'broken': 'failed'}
+
+
+# user-028: adaptive concurrency
+
+def test_adaptive_concurrency_halves_on_throttle_and_grows_on_healthy_responses():
+    concurrency = AdaptiveConcurrency(min_threads=1, max_threads=8, initial_threads=4,
+                                      latency_threshold_seconds=10, increase_after=2)
+    concurrency.record(429, 0.1)
+    assert concurrency.limit == 2
+    concurrency.record(429, 0.1)  # same burst, within the cooldown
+    assert concurrency.limit == 2
+    concurrency.record(200, 0.1)
+    concurrency.record(200, 0.1)
+    assert concurrency.limit == 3
+    assert [limit for _, limit in concurrency.history] == [4, 2, 3]
+
+
+def test_adaptive_concurrency_labels_slow_responses_and_errors(capsys, monkeypatch):
+    concurrency = AdaptiveConcurrency(min_threads=1, max_threads=8, initial_threads=8, latency_threshold_seconds=10)
+    concurrency.record(200, 12.0)
+    monkeypatch.setattr(AdaptiveConcurrency, 'DECREASE_COOLDOWN_SECONDS', 0)
+    concurrency.record(None, 0.5)
+    output = capsys.readouterr().out
+    assert "4 threads (slow response (12.0s))" in output
+    assert "2 threads (request error)" in output
+
+
+# user-029: shortcut listing and retarget detection
+
+def test_get_lakehouse_shortcuts_follows_continuation_tokens(monkeypatch):
+    def listing(url, params=None, **kwargs):
+        if 'continuationToken' not in params:
+            return response(200, {'value': [{'name': 'uc_c_s_t1', 'target': {'adlsGen2': {
+                'location': 'https://ACCT.dfs.core.windows.net/data/', 'subpath': '/tables/t1'}}}],
+                'continuationToken': 'next'})
+        return response(200, {'value': [{'name': 'other', 'target': {'oneLake': {}}}]})
+
+    FakeFabric(monkeypatch, [('GET', '/shortcuts', [listing])])
+    assert Utils.get_lakehouse_shortcuts(FABRIC_CONFIG) == {
+        'uc_c_s_t1': 'https://acct.dfs.core.windows.net/data/tables/t1', 'other': None}
+
+
+def test_get_lakehouse_shortcuts_gives_up_after_the_throttle_budget(monkeypatch):
+    fabric = FakeFabric(monkeypatch, [('GET', '/shortcuts', [response(429, headers={'Retry-After': '0'})])])
+    with pytest.raises(requests.HTTPError):
+        Utils.get_lakehouse_shortcuts(dict(FABRIC_CONFIG, max_throttle_retries=3))
+    assert len(fabric.calls) == 4
+
+
+def test_plan_shortcut_changes_retargets_moved_tables():
+    moved, same, new = external_table('moved'), external_table('same'), external_table('new')
+    current_shortcuts = {
+        'uc_c_s_moved': 'https://acct.dfs.core.windows.net/data/old/moved',
+        'uc_c_s_same': 'https://acct.dfs.core.windows.net/data/tables/same',
+    }
+    assert Utils.plan_shortcut_changes([moved, same, new], current_shortcuts) == []
+    assert (moved['operation'], same['operation'], new['operation']) == ('retarget', 'skip', 'create')
+
+
+# user-030: watermarks
+
+def test_plan_incremental_changes_picks_tables_newer_than_their_schema_watermark():
+    old, changed, created = external_table('old', updated_at=2000), external_table('changed', updated_at=5000), \
+        external_table('created')
+    created['created_at'] = 6000
+    watermarks = {'c.s': {'updated_at': 3000}}
+    assert Utils.plan_incremental_changes([old, changed, created], watermarks) == [changed, created]
+    assert changed['operation'] == 'upsert'
+
+
+def test_advance_watermarks_holds_back_schemas_with_failed_tables():
+    ok, failed = external_table('ok', updated_at=5000), dict(external_table('bad', updated_at=6000), schema_name='t')
+    failed['outcome'] = 'failed'
+    watermarks = {'c.t': {'updated_at': 1000}}
+    Utils.advance_watermarks(watermarks, [ok, failed], ['c.s', 'c.t'], full_reconcile=False)
+    assert watermarks['c.s']['updated_at'] == 5000
+    assert watermarks['c.t'] == {'updated_at': 1000}
+
+
+def test_needs_full_reconcile():
+    keys = ['c.s']
+    assert Utils.needs_full_reconcile({}, {}, keys)
+    config = {'incremental_sync': True, 'full_reconcile_hours': 1}
+    assert Utils.needs_full_reconcile(config, {}, keys)
+    assert not Utils.needs_full_reconcile(config, {'c.s': {'last_full_reconcile': time.time() - 60}}, keys)
+    assert Utils.needs_full_reconcile(config, {'c.s': {'last_full_reconcile': time.time() - 7200}}, keys)
+
+
+def test_watermarks_round_trip_through_the_lakehouse(monkeypatch):
+    files = {}
+    fs = types.SimpleNamespace(
+        exists=lambda path: path in files,
+        head=lambda path, max_bytes: files[path],
+        put=lambda path, content, overwrite: files.__setitem__(path, content))
+    monkeypatch.setattr(util, 'mssparkutils', types.SimpleNamespace(fs=fs))
+    path = Utils.get_watermark_path(FABRIC_CONFIG)
+    assert path.endswith('/lh/Files/uc_sync/watermarks.json')
+    assert Utils.load_watermarks(path) == {}
+    Utils.save_watermarks(path, {'c.s': {'updated_at': 5}})
+    assert Utils.load_watermarks(path) == {'c.s': {'updated_at': 5}}
+
+
+# user-031: bulk create and long running operations
+
+def test_create_shortcuts_falls_back_to_single_calls_when_bulk_create_is_missing(monkeypatch):
+    fabric = FakeFabric(monkeypatch, [
+        ('POST', '/shortcuts/bulkCreate', [response(404)]),
+        ('POST', '/shortcuts', [lambda url, json=None, **kwargs: response(201, {'name': json['name']})]),
+    ])
+    tables = [external_table('a'), external_table('b', operation='retarget'), external_table('c', operation='skip')]
+    created, retargeted, skipped, failed = Utils.create_shortcuts(FABRIC_CONFIG, tables)
+    assert (created, retargeted, skipped, failed) == (1, 1, 1, 0)
+    single_calls = [call for call in fabric.calls if 'bulkCreate' not in call[1]]
+    assert any('CreateOrOverwrite' in call[1] for call in single_calls)
+
+
+def test_create_shortcuts_bulk_maps_item_results_back_to_tables(monkeypatch):
+    def bulk(url, json=None, **kwargs):
+        items = [{'request': request, 'status': 'Succeeded'} for request in json['createShortcutRequests']]
+        items[-1]['status'] = 'Failed'
+        return response(200, {'value': items})
+
+    fabric = FakeFabric(monkeypatch, [
+        ('POST', '/shortcuts/bulkCreate', [bulk]),
+        ('POST', '/shortcuts', [response(500)]),
+    ])
+    tables = [external_table('a'), external_table('b')]
+    counts = Utils.create_shortcuts(dict(FABRIC_CONFIG, max_retries=1), tables)
+    assert counts == (1, 0, 0, 1)
+    assert tables[0]['outcome'] == 'created'
+    assert tables[1]['outcome'] == 'failed'
+    assert len([call for call in fabric.calls if 'bulkCreate' not in call[1]]) == 1
+
+
+def test_wait_for_operation_polls_until_succeeded_and_reads_the_result(monkeypatch):
+    FakeFabric(monkeypatch, [
+        ('GET', '/operations/op1/result', [response(200, {'value': ['done']})]),
+        ('GET', '/operations/op1', [response(200, {'status': 'Running'}, {'Retry-After': '1'}),
+                                    response(200, {'status': 'Succeeded'})]),
+    ])
+    accepted = response(202, headers={'Location': 'https://api.fabric.microsoft.com/v1/operations/op1'})
+    assert Utils.wait_for_operation(accepted, Utils.get_concurrency({})) == {'value': ['done']}
+
+
+def test_wait_for_operation_gives_up_at_the_deadline(monkeypatch, clock):
+    FakeFabric(monkeypatch, [('GET', '/operations/op1', [response(200, {'status': 'Running'})])])
+    started = clock.now
+    accepted = response(202, headers={'x-ms-operation-id': 'op1'})
+    assert Utils.wait_for_operation(accepted, Utils.get_concurrency({}), max_wait_seconds=30) is None
+    assert clock.now - started <= 30
+
+
+# user-033: verification
+
+def test_verify_shortcuts_classifies_each_target(monkeypatch):
+    def probe(url, params=None, headers=None):
+        assert headers['Authorization'] == 'Bearer storage-token'
+        name = params['directory'].rsplit('/', 1)[1]
+        return {
+            'healthy': response(200, {'paths': [{'name': 'x'}]}),
+            'empty': response(200, {'paths': []}),
+            'forbidden': response(403),
+            'missing': response(404),
+        }[name]
+
+    FakeFabric(monkeypatch, [('GET', 'onelake', [probe])], function='get')
+    report = Utils.verify_shortcuts(FABRIC_CONFIG, ['healthy', 'empty', 'forbidden', 'missing'])
+    assert {e['shortcut_name']: e['outcome'] for e in report.entries} == {
+        'healthy': 'healthy', 'empty': 'empty', 'forbidden': 'forbidden', 'missing': 'missing'}
+    assert report.summary()['health'] == {'healthy': 1, 'empty': 1, 'forbidden': 1, 'missing': 1}
+    assert report.summary()['shortcuts'] == 0
+
+
+def test_sync_verifies_only_created_or_kept_shortcuts_and_keeps_the_report(monkeypatch):
+    tables = [external_table('ok'), external_table('fails')]
+    monkeypatch.setattr(Utils, 'get_dbx_uc_tables', staticmethod(lambda config: tables))
+    monkeypatch.setattr(Utils, 'get_dbx_uc_overlapping_scopes', staticmethod(lambda config: set()))
+    FakeFabric(monkeypatch, [
+        ('GET', '/shortcuts', [response(200, {'value': []})]),
+        ('POST', '/shortcuts/bulkCreate', [response(404)]),
+        ('POST', '/shortcuts', [lambda url, json=None, **kwargs:
+                                response(201, {'name': json['name']}) if json['name'].endswith('_ok') else response(500)]),
+    ])
+    probed = []
+
+    def probe(url, params=None, headers=None):
+        probed.append(params['directory'])
+        return response(404)
+
+    monkeypatch.setattr(util.requests, 'get', probe)
+    report = util.sync_dbx_uc_tables_to_onelake(
+        {'dbx_uc_catalog': 'c', 'dbx_uc_schemas': ['s']},
+        dict(FABRIC_CONFIG, verify_shortcuts=True, max_retries=1))
+    assert probed == ['lh/Tables/uc_c_s_ok']
+    assert report.summary()['health'] == {'missing': 1}
+    assert report.summary()['outcomes'] == {'created': 1, 'failed': 1}
@@ -1,15 +1,285 @@
+import base64
+import email.utils
 import json
 import requests
+import threading
 import time
 from concurrent.futures import ThreadPoolExecutor
 from notebookutils import mssparkutils
 
+
+class TokenCache:
+    """Thread-safe cache of bearer tokens per audience.
+
+    Tokens are refreshed proactively once they get within `refresh_margin_seconds`
+    of their expiry. While a still-valid token is being refreshed by one thread,
+    the other threads keep using the current token instead of blocking.
+    """
+
+    REFRESH_MARGIN_SECONDS = 300
+    DEFAULT_TTL_SECONDS = 3000
+
+    def __init__(self, fetch_token=None, refresh_margin_seconds=REFRESH_MARGIN_SECONDS):
+        self._fetch_token = fetch_token or (lambda audience: mssparkutils.credentials.getToken(audience))
+        self._refresh_margin_seconds = refresh_margin_seconds
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def get_token(self, audience='pbi'):
+        entry = self._tokens.get(audience)
+        now = time.time()
+        if entry is not None and now < entry[1] - self._refresh_margin_seconds:
+            return entry[0]
+
+        still_valid = entry is not None and now < entry[1]
+        # Only one thread refreshes; others keep the current token while it is still valid
+        if not self._lock.acquire(blocking=not still_valid):
+            return entry[0]
+        try:
+            entry = self._tokens.get(audience)
+            if entry is None or time.time() >= entry[1] - self._refresh_margin_seconds:
+                token = self._fetch_token(audience)
+                entry = (token, TokenCache._expires_on(token))
+                self._tokens[audience] = entry
+            return entry[0]
+        finally:
+            self._lock.release()
+
+    def invalidate(self, audience='pbi'):
+        with self._lock:
+            self._tokens.pop(audience, None)
+
+    @staticmethod
+    def _expires_on(token):
+        # Entra ID access tokens are JWTs; read the 'exp' claim without validating the signature
+        try:
+            payload = token.split('.')[1]
+            payload += '=' * (-len(payload) % 4)
+            return float(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+        except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+            return time.time() + TokenCache.DEFAULT_TTL_SECONDS
+
+
+class ThrottleGate:
+    """Shared back-off for all workers calling the same Fabric API.
+
+    A 429 seen by any worker pauses every worker until the server's Retry-After has elapsed,
+    instead of each thread discovering the throttle on its own.
+    """
+
+    def __init__(self):
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        while True:
+            with self._lock:
+                delay = self._resume_at - time.time()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def pause(self, seconds):
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.time() + seconds)
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on the number of Fabric API calls in flight.
+
+    The limit grows by one after `increase_after` consecutive healthy responses and is halved
+    on a 429 or when a response takes longer than `latency_threshold_seconds`. Every change
+    is printed and kept in `history` as (seconds since start, limit).
+    """
+
+    DECREASE_COOLDOWN_SECONDS = 5
+
+    def __init__(self, min_threads, max_threads, initial_threads, latency_threshold_seconds, increase_after=5):
+        self.min_threads = min_threads
+        self.max_threads = max_threads
+        self.latency_threshold_seconds = latency_threshold_seconds
+        self.increase_after = increase_after
+        self._limit = max(min_threads, min(initial_threads, max_threads))
+        self._in_flight = 0
+        self._healthy = 0
+        self._last_decrease = 0.0
+        self._started = time.time()
+        self._cond = threading.Condition()
+        self.history = [(0.0, self._limit)]
+
+    @property
+    def limit(self):
+        return self._limit
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= self._limit:
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def record(self, status_code, latency_seconds):
+        with self._cond:
+            if status_code == 429 or status_code is None or latency_seconds > self.latency_threshold_seconds:
+                self._healthy = 0
+                # A burst of 429s from the same window should only halve the limit once
+                if time.time() - self._last_decrease >= AdaptiveConcurrency.DECREASE_COOLDOWN_SECONDS:
+                    self._last_decrease = time.time()
+                    if status_code == 429:
+                        reason = "throttled"
+                    elif status_code is None:
+                        reason = "request error"
+                    else:
+                        reason = f"slow response ({latency_seconds:.1f}s)"
+                    self._set_limit(max(self.min_threads, self._limit // 2), reason)
+            elif status_code < 500:
+                self._healthy += 1
+                if self._healthy >= self.increase_after:
+                    self._healthy = 0
+                    self._set_limit(min(self.max_threads, self._limit + 1), "healthy responses")
+
+    def _set_limit(self, new_limit, reason):
+        if new_limit == self._limit:
+            return
+        self._limit = new_limit
+        elapsed = time.time() - self._started
+        self.history.append((elapsed, new_limit))
+        print(f"~ [{elapsed:.0f}s] Concurrency set to {new_limit} threads ({reason}).")
+        self._cond.notify_all()
+
+
+class SyncReport:
+    """Thread-safe record of what happened to each shortcut during a sync."""
+
+    def __init__(self):
+        self.entries = []
+        self._lock = threading.Lock()
+
+    def record(self, shortcut_name, operation, outcome, latency_seconds, retries=0):
+        with self._lock:
+            self.entries.append({
+                'shortcut_name': shortcut_name,
+                'operation': operation,
+                'outcome': outcome,
+                'latency_seconds': round(latency_seconds, 3),
+                'retries': retries
+            })
+
+    def summary(self):
+        with self._lock:
+            entries = list(self.entries)
+
+        # Verification probes are reported as 'health', separately from the sync operations
+        health = {}
+        for entry in entries:
+            if entry['operation'] == 'verify':
+                health[entry['outcome']] = health.get(entry['outcome'], 0) + 1
+        entries = [entry for entry in entries if entry['operation'] != 'verify']
+
+        outcomes = {}
+        for entry in entries:
+            outcomes[entry['outcome']] = outcomes.get(entry['outcome'], 0) + 1
+        # Skips never reach the API, so they would only flatten the latency percentiles
+        latencies = sorted(entry['latency_seconds'] for entry in entries if entry['operation'] != 'skip')
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0.0
+
+        return {
+            'shortcuts': len(entries),
+            'outcomes': outcomes,
+            'retries': sum(entry['retries'] for entry in entries),
+            'p50_latency_seconds': percentile(0.50),
+            'p95_latency_seconds': percentile(0.95),
+            'max_latency_seconds': latencies[-1] if latencies else 0.0,
+            'health': health
+        }
+
+    def to_json(self):
+        with self._lock:
+            entries = list(self.entries)
+        return json.dumps({'summary': self.summary(), 'entries': entries}, indent=2)
+
+
 class Utils:
 
     FABRIC_API_ENDPOINT = "api.fabric.microsoft.com"
     ONELAKE_API_ENDPOINT = "onelake.dfs.fabric.microsoft.com"
     PREFIX = "uc"
 
+    # Shared by all worker threads, so a sync fetches a token once per lifetime instead of once per table
+    TOKEN_CACHE = TokenCache()
+    THROTTLE = ThrottleGate()
+    # OneLake DFS throttles independently of the Fabric REST API
+    ONELAKE_THROTTLE = ThrottleGate()
+    ONELAKE_API_VERSION = "2023-11-03"
+
+    # Defaults, overridable through fabric_config
+    MAX_RETRIES = 3
+    # 429s only wait out the shared throttle, so they get their own, larger budget
+    MAX_THROTTLE_RETRIES = 20
+    MAX_PARALLEL_CATALOGS = 4
+    MIN_THREADS = 1
+    INITIAL_THREADS = 2
+    MAX_THREADS = 16
+    LATENCY_THRESHOLD_SECONDS = 10
+    FULL_RECONCILE_HOURS = 24
+    BULK_BATCH_SIZE = 100
+    OPERATION_POLL_SECONDS = 5
+    OPERATION_TIMEOUT_SECONDS = 600
+    VERIFY_MAX_THREADS = 32
+    WATERMARK_MAX_BYTES = 10 * 1024 * 1024
+
+    @staticmethod
+    def get_fabric_headers():
+        return {
+            'Authorization': f'Bearer {Utils.TOKEN_CACHE.get_token("pbi")}',
+            'Content-Type': 'application/json',
+        }
+
+    @staticmethod
+    def get_retry_after_seconds(response):
+        retry_after_seconds = 60
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                retry_after_seconds = int(retry_after) + 5
+            except ValueError:
+                # Retry-After may also be an HTTP date
+                try:
+                    retry_after_seconds = max(0, int(email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time())) + 5
+                except (TypeError, ValueError):
+                    pass
+        return retry_after_seconds
+
+    @staticmethod
+    def get_concurrency(fabric_config):
+        return AdaptiveConcurrency(
+            min_threads=fabric_config.get('min_threads', Utils.MIN_THREADS),
+            max_threads=fabric_config.get('max_threads', Utils.MAX_THREADS),
+            initial_threads=fabric_config.get('initial_threads', Utils.INITIAL_THREADS),
+            latency_threshold_seconds=fabric_config.get('latency_threshold_seconds', Utils.LATENCY_THRESHOLD_SECONDS)
+        )
+
+    @staticmethod
+    def send_fabric_request(concurrency, method, url, **kwargs):
+        """Send one Fabric API call within the shared throttle and concurrency limits."""
+        Utils.THROTTLE.wait()
+        concurrency.acquire()
+        started = time.time()
+        status_code = None
+        try:
+            response = requests.request(method, url, headers=Utils.get_fabric_headers(), **kwargs)
+            status_code = response.status_code
+            return response
+        finally:
+            concurrency.release()
+            concurrency.record(status_code, time.time() - started)
+
     # DBX utils
 
     @staticmethod
@@ -20,77 +290,423 @@ class Utils:
         dbx_token = databricks_config['dbx_token']
         dbx_uc_catalog = databricks_config['dbx_uc_catalog']
         dbx_uc_schemas = databricks_config['dbx_uc_schemas']
-  
+
+        session = requests.Session()
+        session.headers.update({
+            'Authorization': f'Bearer {dbx_token}',
+            'Content-Type': 'application/json'
+        })
+
         for schema in dbx_uc_schemas:
-            url = f"{dbx_workspace}/api/2.1/unity-catalog/tables?catalog_name={dbx_uc_catalog}&schema_name={schema}"
-            payload = {}
-            headers = {
-                'Authorization': f'Bearer {dbx_token}',
-                'Content-Type': 'application/json'
+            url = f"{dbx_workspace}/api/2.1/unity-catalog/tables"
+            # Columns and properties are not needed for shortcuts and dominate the payload of large schemas
+            params = {
+                'catalog_name': dbx_uc_catalog,
+                'schema_name': schema,
+                'omit_columns': 'true',
+                'omit_properties': 'true'
             }
-            response = requests.get(url, data=payload, headers=headers)
+            while True:
+                response = session.get(url, params=params)
 
-            if response.status_code == 200:
-                response_json = json.loads(response.text)
-                all_tables.extend(response_json['tables'])
-            else:
-                print(f"! Upps [{response.status_code}] Cannot connect to Unity Catalog. Please review configs.")
-                return None
+                if response.status_code == 200:
+                    response_json = json.loads(response.text)
+                    all_tables.extend(response_json.get('tables', []))
+                    next_page_token = response_json.get('next_page_token')
+                    if not next_page_token:
+                        break
+                    params['page_token'] = next_page_token
+                else:
+                    print(f"! Upps [{response.status_code}] Cannot connect to Unity Catalog. Please review configs.")
+                    return None
         return all_tables
 
+    @staticmethod
+    def get_dbx_uc_overlapping_scopes(databricks_config):
+        """Return the (catalog, schema) pairs in Unity Catalog whose shortcut names can start like this catalog's.
+
+        That is every schema of the catalog itself and of catalogs named `<catalog>_...`; e.g. the
+        shortcuts of schema `s_x` start with the prefix of schema `s`. Returns an empty set when
+        Unity Catalog cannot be listed.
+        """
+        dbx_workspace = databricks_config['dbx_workspace']
+        dbx_uc_catalog = databricks_config['dbx_uc_catalog']
+
+        session = requests.Session()
+        session.headers.update({
+            'Authorization': f"Bearer {databricks_config['dbx_token']}",
+            'Content-Type': 'application/json'
+        })
+
+        def list_names(url, params, key):
+            names = []
+            while True:
+                response = session.get(url, params=params)
+                if response.status_code != 200:
+                    print(f"! Upps [{response.status_code}] Cannot list Unity Catalog {key}; only configured schemas are protected from deletion.")
+                    return None
+                response_json = json.loads(response.text)
+                names.extend(item['name'] for item in response_json.get(key, []))
+                next_page_token = response_json.get('next_page_token')
+                if not next_page_token:
+                    return names
+                params = dict(params, page_token=next_page_token)
+
+        catalogs = list_names(f"{dbx_workspace}/api/2.1/unity-catalog/catalogs", {}, 'catalogs')
+        if catalogs is None:
+            return set()
+        scopes = set()
+        for catalog in catalogs:
+            if catalog == dbx_uc_catalog or catalog.startswith(f"{dbx_uc_catalog}_"):
+                schemas = list_names(f"{dbx_workspace}/api/2.1/unity-catalog/schemas", {'catalog_name': catalog}, 'schemas')
+                scopes.update((catalog, schema) for schema in schemas or [])
+        return scopes
+
     # Fabric utils
 
-    def get_lakehouse_shortcuts(fabric_config):
-        class FileInfo:
-            def __init__(self, path, name, size):
-                self.path = path
-                self.name = name
-                self.size = size
+    @staticmethod
+    def get_shortcut_name(table):
+        return f"{Utils.PREFIX}_{table['catalog_name']}_{table['schema_name']}_{table['name']}"
+
+    @staticmethod
+    def get_shortcut_prefix(catalog, schema):
+        return f"{Utils.PREFIX}_{catalog}_{schema}_"
+
+    @staticmethod
+    def get_shortcut_target(table_location):
+        # Remove the 'abfss://' scheme from the path
+        without_scheme = table_location.replace("abfss://", "", 1)
 
+        # Extract the storage account name and the rest of the path
+        container_end = without_scheme.find("@")
+        container = without_scheme[:container_end]
+        remainder = without_scheme[container_end + 1:]
+
+        account_end = remainder.find("/")
+        storage_account = remainder[:account_end]
+        path = remainder[account_end + 1:]
+        https_path = f"https://{storage_account}/{container}"
+        return https_path, path
+
+    @staticmethod
+    def normalize_target(location, subpath):
+        """The resolved target as one string, so the same path compares equal however Fabric splits it.
+
+        `location` and `subpath` are joined without surrounding slashes and the scheme and host are
+        lowercased; the container and path keep their case.
+        """
+        scheme, separator, rest = (location or '').strip('/').partition('://')
+        if not separator:
+            scheme, rest = '', scheme
+        host, _, path = rest.partition('/')
+        parts = [part for part in (path.strip('/'), (subpath or '').strip('/')) if part]
+        return '/'.join([f"{scheme.lower()}{separator}{host.lower()}"] + parts)
+
+    @staticmethod
+    def get_lakehouse_shortcuts(fabric_config, concurrency=None):
+        """Return {shortcut name: normalized target} for the shortcuts under Tables.
+
+        Reads the shortcut list once through the Fabric REST API, following continuation tokens.
+        Shortcuts that do not target ADLS Gen2 map to None. Raises requests.HTTPError when the
+        list cannot be read, including after max_throttle_retries 429s.
+        """
         workspace_id = fabric_config['workspace_id']
         lakehouse_id = fabric_config['lakehouse_id']
+        max_throttle_retries = fabric_config.get('max_throttle_retries', Utils.MAX_THROTTLE_RETRIES)
+        concurrency = concurrency or Utils.get_concurrency(fabric_config)
+
+        current_shortcuts = {}
+        url = f"https://{Utils.FABRIC_API_ENDPOINT}/v1/workspaces/{workspace_id}/items/{lakehouse_id}/shortcuts"
+        params = {'parentPath': 'Tables'}
+        throttled = 0
+        while True:
+            response = Utils.send_fabric_request(concurrency, 'GET', url, params=params)
+            if response.status_code == 429 and throttled < max_throttle_retries:
+                retry_after_seconds = Utils.get_retry_after_seconds(response)
+                print(f"! Upps [429] Exceeded the amount of calls while listing shortcuts, pausing all workers for {retry_after_seconds} seconds.")
+                Utils.THROTTLE.pause(retry_after_seconds)
+                throttled += 1
+                continue
+            response.raise_for_status()
+
+            response_json = json.loads(response.text)
+            for shortcut in response_json.get('value', []):
+                adls_target = shortcut.get('target', {}).get('adlsGen2')
+                current_shortcuts[shortcut['name']] = (
+                    Utils.normalize_target(adls_target['location'], adls_target['subpath']) if adls_target else None
+                )
+            continuation_token = response_json.get('continuationToken')
+            if not continuation_token:
+                break
+            params['continuationToken'] = continuation_token
+        return current_shortcuts
+
+    @staticmethod
+    def plan_shortcut_changes(tables, current_shortcuts, scopes=None, known_scopes=()):
+        """Diff UC tables against current shortcuts in linear time.
+
+        Sets each table's 'operation' to 'create', 'retarget' or 'skip' and returns the
+        names of UC shortcuts that no longer have a table.
+
+        `scopes` are the (catalog, schema) pairs being synced; only their shortcuts are
+        candidates for deletion. Names do not separate catalog, schema and table
+        unambiguously (`uc_c_s_x_t` fits schema `s` and schema `s_x`), so a shortcut
+        belongs to the pair in `scopes` or `known_scopes` with the longest matching prefix.
+        Pass every other synced or existing pair that overlaps in `known_scopes`. Without
+        `scopes` every UC shortcut is a candidate.
+        """
+        if scopes is None:
+            uc_shortcuts = {name: target for name, target in current_shortcuts.items() if name.startswith(f"{Utils.PREFIX}_")}
+        else:
+            owned_prefixes = {Utils.get_shortcut_prefix(*scope) for scope in scopes}
+            # Longest first, so the first match is the owner
+            prefixes = sorted(owned_prefixes | {Utils.get_shortcut_prefix(*scope) for scope in known_scopes},
+                              key=len, reverse=True)
+            uc_shortcuts = {}
+            for name, target in current_shortcuts.items():
+                owner = next((prefix for prefix in prefixes if name.startswith(prefix)), None)
+                if owner in owned_prefixes:
+                    uc_shortcuts[name] = target
+        uc_table_names = set()
+
+        for table in tables:
+            table_name = Utils.get_shortcut_name(table)
+            uc_table_names.add(table_name)
+            if table_name not in uc_shortcuts:
+                table['operation'] = 'create'
+            elif table.get('table_type') == "EXTERNAL" and table.get('data_source_format') == "DELTA" \
+                    and uc_shortcuts[table_name] != Utils.normalize_target(*Utils.get_shortcut_target(table['storage_location'])):
+                table['operation'] = 'retarget'
+            else:
+                table['operation'] = 'skip'
+
+        return [name for name in uc_shortcuts if name not in uc_table_names]
 
-        table_infos = mssparkutils.fs.ls(f"abfss://{workspace_id}@{Utils.ONELAKE_API_ENDPOINT}/{lakehouse_id}/Tables")
-        current_shortcut_names = [table_info.name for table_info in table_infos]
-        return current_shortcut_names
-    
     @staticmethod
-    def delete_shortcuts(fabric_config, deletions_required):
+    def delete_shortcuts(fabric_config, deletions_required, concurrency=None, report=None):
         sc_deleted, sc_failed = 0, 0
+        counter_lock = threading.Lock()
+        report = report if report is not None else SyncReport()
         workspace_id = fabric_config['workspace_id']
         lakehouse_id = fabric_config['lakehouse_id']
 
-        for table_name in deletions_required:
+        max_retries = fabric_config.get('max_retries', Utils.MAX_RETRIES)
+        max_throttle_retries = fabric_config.get('max_throttle_retries', Utils.MAX_THROTTLE_RETRIES)
+        concurrency = concurrency or Utils.get_concurrency(fabric_config)
+
+        def delete_shortcut(table_name):
+            nonlocal sc_deleted, sc_failed
+            started = time.time()
             url = f"https://{Utils.FABRIC_API_ENDPOINT}/v1/workspaces/{workspace_id}/items/{lakehouse_id}/shortcuts/Tables/{table_name}"
-            token = mssparkutils.credentials.getToken('pbi')
 
-            payload = {}
-            headers = {
-                'Authorization': f'Bearer {token}',
-                'Content-Type': 'application/json',
-            }
-            
-            response = requests.delete(url, json=payload, headers=headers)
-
-            if response.status_code == 200:
-                print(f"∟ Shortcut deleted successfully with name:'{table_name}'")
-                sc_deleted += 1
-            elif response.status_code == 429:
-                retry_after_seconds = 60
-                if 'Retry-After' in response.headers:
-                    retry_after_seconds = int(response.headers['Retry-After']) + 5
-                print(f"! Upps [429] Exceeded the amount of calls while deleting '{table_name}', sleeping for {retry_after_seconds} seconds.")
-                time.sleep(retry_after_seconds)
-                sc_failed += 1
-            elif response.status_code != 404:
-                print(f"! Upps [{response.status_code}] Failed to delete shortcut '{table_name}'. Response details: {response.text}")
+            attempt, throttled = 0, 0
+            while attempt < max_retries:
+                try:
+                    response = Utils.send_fabric_request(concurrency, 'DELETE', url)
+                    if response.status_code == 200:
+                        print(f"∟ Shortcut deleted successfully with name:'{table_name}'")
+                        report.record(table_name, 'delete', 'deleted', time.time() - started, attempt)
+                        with counter_lock:
+                            sc_deleted += 1
+                        return
+                    elif response.status_code == 404:
+                        report.record(table_name, 'delete', 'not_found', time.time() - started, attempt)
+                        return
+                    elif response.status_code == 429:
+                        retry_after_seconds = Utils.get_retry_after_seconds(response)
+                        print(f"! Upps [429] Exceeded the amount of calls while deleting '{table_name}', pausing all workers for {retry_after_seconds} seconds.")
+                        Utils.THROTTLE.pause(retry_after_seconds)
+                        throttled += 1
+                        if throttled <= max_throttle_retries:
+                            continue
+                    elif response.status_code == 401:
+                        print(f"! Upps [401] Token rejected while deleting '{table_name}', refreshing it.")
+                        Utils.TOKEN_CACHE.invalidate('pbi')
+                    else:
+                        print(f"! Upps [{response.status_code}] Failed to delete shortcut '{table_name}'. Response details: {response.text}")
+                except requests.RequestException as e:
+                    print(f"Request failed: {e}")
+                attempt += 1
+                if attempt < max_retries:
+                    sleep_time = 2 ** (attempt - 1)
+                    print(f"___ Retrying in {sleep_time} seconds for '{table_name}'...")
+                    time.sleep(sleep_time)
+
+            print(f"! Max retries reached while deleting '{table_name}'.")
+            report.record(table_name, 'delete', 'failed', time.time() - started, max_retries - 1)
+            with counter_lock:
                 sc_failed += 1
 
-        return sc_deleted, sc_failed 
+        # The pool is sized for the upper bound; the controller decides how many calls are in flight
+        with ThreadPoolExecutor(max_workers=concurrency.max_threads) as executor:
+            list(executor.map(delete_shortcut, deletions_required))
+
+        return sc_deleted, sc_failed
+
+    @staticmethod
+    def get_shortcut_payload(table, shortcut_connection_id):
+        https_path, path = Utils.get_shortcut_target(table['storage_location'])
+        return {
+            "path": "Tables",
+            "name": Utils.get_shortcut_name(table),
+            "target": {
+                "adlsGen2": {
+                    "location": https_path,
+                    "subpath": path,
+                    "connectionId": shortcut_connection_id
+                }
+            }
+        }
 
     @staticmethod
-    def create_shortcuts(fabric_config, tables):
-        sc_created, sc_failed, sc_skipped = 0, 0, 0
+    def wait_for_operation(response, concurrency, max_wait_seconds=OPERATION_TIMEOUT_SECONDS):
+        """Poll a Fabric long running operation until it completes and return its result.
+
+        Returns None if the operation failed or did not finish within `max_wait_seconds`.
+        """
+        operation_url = response.headers.get('Location')
+        if not operation_url:
+            operation_url = f"https://{Utils.FABRIC_API_ENDPOINT}/v1/operations/{response.headers['x-ms-operation-id']}"
+
+        deadline = time.time() + max_wait_seconds
+        while True:
+            poll_seconds = Utils.get_retry_after_seconds(response) if 'Retry-After' in response.headers else Utils.OPERATION_POLL_SECONDS
+            if time.time() + poll_seconds > deadline:
+                print(f"! Upps Operation did not finish within {max_wait_seconds} seconds: {operation_url}")
+                return None
+            time.sleep(poll_seconds)
+            response = Utils.send_fabric_request(concurrency, 'GET', operation_url)
+            if response.status_code == 429:
+                Utils.THROTTLE.pause(Utils.get_retry_after_seconds(response))
+                continue
+            if response.status_code != 200:
+                print(f"! Upps [{response.status_code}] Cannot read operation status. Response details: {response.text}")
+                return None
+
+            status = json.loads(response.text).get('status')
+            if status == 'Succeeded':
+                break
+            if status in {'Failed', 'Undefined'}:
+                print(f"! Upps Operation {status.lower()}. Response details: {response.text}")
+                return None
+
+        response = Utils.send_fabric_request(concurrency, 'GET', f"{operation_url.rstrip('/')}/result")
+        if response.status_code != 200:
+            print(f"! Upps [{response.status_code}] Cannot read operation result. Response details: {response.text}")
+            return None
+        return json.loads(response.text)
+
+    @staticmethod
+    def create_shortcuts_bulk(fabric_config, tables, concurrency, report):
+        """Create shortcuts in batches through the bulkCreate API.
+
+        Returns (handled, remaining): handled tables have their 'outcome' set, remaining tables
+        (skips, unsupported tables, per-item failures, or everything when the bulk endpoint is
+        not available) are left for the single-call path.
+        """
+        workspace_id = fabric_config['workspace_id']
+        lakehouse_id = fabric_config['lakehouse_id']
+        shortcut_connection_id = fabric_config['shortcut_connection_id']
+        batch_size = fabric_config.get('bulk_batch_size', Utils.BULK_BATCH_SIZE)
+        max_retries = fabric_config.get('max_retries', Utils.MAX_RETRIES)
+        max_throttle_retries = fabric_config.get('max_throttle_retries', Utils.MAX_THROTTLE_RETRIES)
+        operation_timeout_seconds = fabric_config.get('operation_timeout_seconds', Utils.OPERATION_TIMEOUT_SECONDS)
+
+        batches_by_policy = {'Abort': [], 'CreateOrOverwrite': []}
+        remaining = []
+        for table in tables:
+            if table['operation'] in {"create", "retarget", "upsert"} and table['table_type'] == "EXTERNAL" \
+                    and table.get('data_source_format') == "DELTA":
+                policy = 'Abort' if table['operation'] == "create" else 'CreateOrOverwrite'
+                batches_by_policy[policy].append(table)
+            else:
+                remaining.append(table)
+
+        batches = [
+            (policy, policy_tables[i:i + batch_size])
+            for policy, policy_tables in batches_by_policy.items()
+            for i in range(0, len(policy_tables), batch_size)
+        ]
+        if not batches:
+            return [], remaining
+
+        handled = []
+        results_lock = threading.Lock()
+        bulk_available = threading.Event()
+        bulk_available.set()
+
+        def create_batch(policy, batch):
+            started = time.time()
+            url = f"https://{Utils.FABRIC_API_ENDPOINT}/v1/workspaces/{workspace_id}/items/{lakehouse_id}/shortcuts/bulkCreate?shortcutConflictPolicy={policy}"
+            payload = {"createShortcutRequests": [Utils.get_shortcut_payload(table, shortcut_connection_id) for table in batch]}
+
+            result = None
+            attempt, throttled = 0, 0
+            while attempt < max_retries:
+                if not bulk_available.is_set():
+                    break
+                try:
+                    response = Utils.send_fabric_request(concurrency, 'POST', url, json=payload)
+                    if response.status_code == 429:
+                        retry_after_seconds = Utils.get_retry_after_seconds(response)
+                        print(f"! Upps [429] Exceeded the amount of calls while bulk creating {len(batch)} shortcuts, pausing all workers for {retry_after_seconds} seconds.")
+                        Utils.THROTTLE.pause(retry_after_seconds)
+                        throttled += 1
+                        if throttled > max_throttle_retries:
+                            break
+                        continue
+                    elif response.status_code in [404, 405]:
+                        print(f"! Bulk shortcut creation is not available [{response.status_code}], falling back to single calls.")
+                        bulk_available.clear()
+                        break
+                    elif response.status_code == 200:
+                        result = json.loads(response.text)
+                        break
+                    elif response.status_code == 202:
+                        result = Utils.wait_for_operation(response, concurrency, operation_timeout_seconds)
+                        break
+                    else:
+                        print(f"! Upps [{response.status_code}] Failed to bulk create {len(batch)} shortcuts. Response details: {response.text}")
+                        break
+                except requests.RequestException as e:
+                    print(f"Request failed: {e}")
+                    time.sleep(2 ** attempt)
+                    attempt += 1
+
+            # Map each per-item result back to its table by shortcut name
+            items = {}
+            for item in (result or {}).get('value', []):
+                items[item.get('request', {}).get('name')] = item
+
+            with results_lock:
+                for table in batch:
+                    table_name = Utils.get_shortcut_name(table)
+                    item = items.get(table_name)
+                    if item is None:
+                        remaining.append(table)
+                    elif item.get('status') == 'Succeeded':
+                        table['outcome'] = 'retargeted' if table['operation'] == "retarget" else 'created'
+                        print(f"∟ Shortcut {table['outcome']} successfully with name:'{table_name}'")
+                        report.record(table_name, table['operation'], table['outcome'], time.time() - started, attempt)
+                        handled.append(table)
+                    elif item.get('error', {}).get('message') == "Copy, Rename or Update of shortcuts are not supported by OneLake.":
+                        print(f"∟ Skipped shortcut creation for '{table_name}'. Shortcut with the SAME NAME exists.")
+                        table['outcome'] = 'skipped'
+                        report.record(table_name, table['operation'], table['outcome'], time.time() - started, attempt)
+                        handled.append(table)
+                    else:
+                        # Retry through the single-call path, which reports the detailed error
+                        remaining.append(table)
+
+        with ThreadPoolExecutor(max_workers=concurrency.max_threads) as executor:
+            list(executor.map(lambda policy_batch: create_batch(*policy_batch), batches))
+
+        return handled, remaining
+
+    @staticmethod
+    def create_shortcuts(fabric_config, tables, concurrency=None, report=None):
+        counts = {'created': 0, 'retargeted': 0, 'skipped': 0, 'failed': 0}
+        counts_lock = threading.Lock()
 
         workspace_id = fabric_config['workspace_id']
         lakehouse_id = fabric_config['lakehouse_id']
@@ -98,75 +714,58 @@ class Utils:
         #shortcut_name = fabric_config['shortcut_name']
         skip_if_shortcut_exists = True #fabric_config['skip_if_shortcut_exists']
 
-        max_retries = 3
-        max_threads = 2
+        max_retries = fabric_config.get('max_retries', Utils.MAX_RETRIES)
+        max_throttle_retries = fabric_config.get('max_throttle_retries', Utils.MAX_THROTTLE_RETRIES)
+        concurrency = concurrency or Utils.get_concurrency(fabric_config)
+        report = report if report is not None else SyncReport()
+
+        def finish(table, outcome, started, retries=0):
+            table['outcome'] = outcome
+            report.record(Utils.get_shortcut_name(table), table['operation'], outcome, time.time() - started, retries)
+            with counts_lock:
+                counts[outcome] += 1
 
         def create_shortcut(table):
-            nonlocal sc_created, sc_failed, sc_skipped
-            catalog_name = table['catalog_name']
-            schema_name = table['schema_name']
+            started = time.time()
             operation = table['operation']
             #table_name = shortcut_name.format(schema=schema_name, table=table['name'], catalog=catalog_name)
-            table_name = f"{Utils.PREFIX}_{catalog_name}_{schema_name}_{table['name']}"
+            table_name = Utils.get_shortcut_name(table)
             table_type = table['table_type']
 
-            if operation == "create":
+            if operation in {"create", "retarget", "upsert"}:
 
                 if table_type in {"EXTERNAL"}:
 
                     data_source_format = table['data_source_format']
-                    table_location = table['storage_location']
-
                     if data_source_format == "DELTA":
-                        # Remove the 'abfss://' scheme from the path
-                        without_scheme = table_location.replace("abfss://", "", 1)
-
-                        # Extract the storage account name and the rest of the path
-                        container_end = without_scheme.find("@")
-                        container = without_scheme[:container_end]
-                        remainder = without_scheme[container_end + 1:]
-
-                        account_end = remainder.find("/")
-                        storage_account = remainder[:account_end]
-                        path = remainder[account_end + 1:]
-                        https_path = f"https://{storage_account}/{container}"
-
                         url = f"https://{Utils.FABRIC_API_ENDPOINT}/v1/workspaces/{workspace_id}/items/{lakehouse_id}/shortcuts"
 
-                        if not skip_if_shortcut_exists:
+                        if operation in {"retarget", "upsert"}:
+                            # The storage location moved (or may have); replace any existing shortcut in place
+                            url += "?shortcutConflictPolicy=CreateOrOverwrite"
+                        elif not skip_if_shortcut_exists:
                             url += "?shortcutConflictPolicy=GenerateUniqueName"
 
-                        token = mssparkutils.credentials.getToken('pbi')
-
-                        payload = {
-                            "path": "Tables",
-                            "name": table_name,
-                            "target": {
-                                "adlsGen2": {
-                                    "location": https_path,
-                                    "subpath": path,
-                                    "connectionId": shortcut_connection_id
-                                }
-                            }
-                        }
-                        headers = {
-                            'Authorization': f'Bearer {token}',
-                            'Content-Type': 'application/json',
-                        }
-
-                        for attempt in range(max_retries):
+                        payload = Utils.get_shortcut_payload(table, shortcut_connection_id)
+                        attempt, throttled = 0, 0
+                        while True:
                             try:
-                                response = requests.post(url, json=payload, headers=headers)
+                                response = Utils.send_fabric_request(concurrency, 'POST', url, json=payload)
                                 if response.status_code == 429:
-                                    retry_after_seconds = 60
-                                    if 'Retry-After' in response.headers:
-                                        retry_after_seconds = int(response.headers['Retry-After']) + 5
-                                    print(f"! Upps [429] Exceeded the amount of calls while creating '{table_name}', sleeping for {retry_after_seconds} seconds.")
-                                    time.sleep(retry_after_seconds)
+                                    retry_after_seconds = Utils.get_retry_after_seconds(response)
+                                    print(f"! Upps [429] Exceeded the amount of calls while creating '{table_name}', pausing all workers for {retry_after_seconds} seconds.")
+                                    Utils.THROTTLE.pause(retry_after_seconds)
+                                    throttled += 1
+                                    if throttled <= max_throttle_retries:
+                                        continue
                                 elif response.status_code in [200, 201]:
                                     data = json.loads(response.text)
-                                    print(f"∟ Shortcut created successfully with name:'{data['name']}'")
-                                    sc_created += 1
+                                    if operation == "retarget":
+                                        print(f"∟ Shortcut retargeted successfully with name:'{data['name']}'")
+                                        finish(table, 'retargeted', started, attempt)
+                                    else:
+                                        print(f"∟ Shortcut created successfully with name:'{data['name']}'")
+                                        finish(table, 'created', started, attempt)
                                     break
                                 elif response.status_code == 400:
                                     data = json.loads(response.text)
@@ -174,70 +773,319 @@ class Utils:
                                     error_message = error_details[0].get('message', 'No error message found')
                                     if error_message == "Copy, Rename or Update of shortcuts are not supported by OneLake.":
                                         print(f"∟ Skipped shortcut creation for '{table_name}'. Shortcut with the SAME NAME exists.")
-                                        sc_skipped += 1
+                                        finish(table, 'skipped', started, attempt)
                                         break
                                     elif "Unauthorized. Access to target location" in error_message:
                                         print(f"! Upps [400] Cannot create shortcut for '{table_name}'. Access denied, please review.")
                                     else:
                                         print(f"! Upps [{response.status_code}] Failed to create shortcut. Response details: {response.text}")
+                                elif response.status_code == 401:
+                                    print(f"! Upps [401] Token rejected while creating '{table_name}', refreshing it.")
+                                    Utils.TOKEN_CACHE.invalidate('pbi')
                                 elif response.status_code == 403:
                                     print(f"! Upps [403] Cannot create shortcut for '{table_name}'. Access forbidden, please review.")
                                 else:
                                     print(f"! Upps [{response.status_code}] Failed to create shortcut '{table_name}'. Response details: {response.text}")
                             except requests.RequestException as e:
                                 print(f"Request failed: {e}")
-                            if attempt < 2:
+                            if attempt < max_retries - 1:
                                 sleep_time = 2 ** attempt
                                 print(f"___ Retrying in {sleep_time} seconds for '{table_name}'...")
                                 time.sleep(sleep_time)
+                                attempt += 1
                             else:
                                 print(f"! Max retries reached for '{table_name}'. Exiting.")
-                                sc_failed += 1
+                                finish(table, 'failed', started, attempt)
                                 break
                     else:
                         print(f"∟ Skipped shortcut creation for '{table_name}'. Format not supported: {data_source_format}.")
-                        sc_skipped += 1
+                        finish(table, 'skipped', started)
                 else:
                     print(f"∟ Skipped shortcut creation for '{table_name}'. Table type is not EXTERNAL.")
-                    sc_skipped += 1
+                    finish(table, 'skipped', started)
             else:
                 print(f"∟ Skipped shortcut creation for '{table_name}'. Shortcut with the SAME NAME exists.")
-                sc_skipped += 1 
+                finish(table, 'skipped', started)
             
-        with ThreadPoolExecutor(max_workers=max_threads) as executor:
-            executor.map(create_shortcut, tables)
+        if fabric_config.get('bulk_create', True):
+            handled_tables, tables = Utils.create_shortcuts_bulk(fabric_config, tables, concurrency, report)
+            for table in handled_tables:
+                counts[table['outcome']] += 1
+
+        with ThreadPoolExecutor(max_workers=concurrency.max_threads) as executor:
+            list(executor.map(create_shortcut, tables))
         
-        return sc_created, sc_skipped, sc_failed
+        return counts['created'], counts['retargeted'], counts['skipped'], counts['failed']
 
+    # Verification utils
 
-def sync_dbx_uc_tables_to_onelake(databricks_config, fabric_config):
-    tables = Utils.get_dbx_uc_tables(databricks_config)
-    all_shortcuts = Utils.get_lakehouse_shortcuts(fabric_config)
+    @staticmethod
+    def verify_shortcuts(fabric_config, shortcut_names, report=None):
+        """Probe each shortcut's target through the OneLake DFS endpoint and return a SyncReport.
 
-    uc_shortcuts = [name for name in all_shortcuts if name.startswith(Utils.PREFIX)]
+        Each probe is a single list call for at most one path under Tables/<shortcut>. Outcomes are
+        'healthy', 'empty' (target reachable but has no files), 'forbidden' (403 on the target),
+        'missing' (404, e.g. the target path was deleted) or 'error'.
+        """
+        workspace_id = fabric_config['workspace_id']
+        lakehouse_id = fabric_config['lakehouse_id']
+        max_retries = fabric_config.get('max_retries', Utils.MAX_RETRIES)
+        max_threads = fabric_config.get('verify_max_threads', Utils.VERIFY_MAX_THREADS)
+        concurrency = AdaptiveConcurrency(
+            min_threads=fabric_config.get('min_threads', Utils.MIN_THREADS),
+            max_threads=max_threads,
+            initial_threads=max_threads // 2 or 1,
+            latency_threshold_seconds=fabric_config.get('latency_threshold_seconds', Utils.LATENCY_THRESHOLD_SECONDS)
+        )
+        report = report if report is not None else SyncReport()
+        url = f"https://{Utils.ONELAKE_API_ENDPOINT}/{workspace_id}"
 
-    uc_table_names = [f"{Utils.PREFIX}_{entry['catalog_name']}_{entry['schema_name']}_{entry['name']}" for entry in tables]
+        def verify_shortcut(shortcut_name):
+            started = time.time()
+            params = {
+                'resource': 'filesystem',
+                'directory': f"{lakehouse_id}/Tables/{shortcut_name}",
+                'recursive': 'false',
+                'maxResults': 1
+            }
+            outcome = 'error'
+            for attempt in range(max_retries):
+                Utils.ONELAKE_THROTTLE.wait()
+                concurrency.acquire()
+                request_started = time.time()
+                status_code = None
+                try:
+                    response = requests.get(url, params=params, headers={
+                        'Authorization': f'Bearer {Utils.TOKEN_CACHE.get_token("storage")}',
+                        'x-ms-version': Utils.ONELAKE_API_VERSION
+                    })
+                    status_code = response.status_code
+                except requests.RequestException as e:
+                    print(f"Request failed: {e}")
+                finally:
+                    concurrency.release()
+                    concurrency.record(status_code, time.time() - request_started)
 
-    skipped_required = [name for name in uc_shortcuts if name in uc_table_names]
-    deletions_required = [name for name in uc_shortcuts if name not in uc_table_names]
-    creations_required = [name for name in uc_table_names if name not in uc_shortcuts]
+                if status_code == 200:
+                    outcome = 'healthy' if json.loads(response.text).get('paths') else 'empty'
+                    break
+                elif status_code == 403:
+                    outcome = 'forbidden'
+                    break
+                elif status_code == 404:
+                    outcome = 'missing'
+                    break
+                elif status_code in [429, 503]:
+                    Utils.ONELAKE_THROTTLE.pause(Utils.get_retry_after_seconds(response))
+                elif status_code == 401:
+                    Utils.TOKEN_CACHE.invalidate('storage')
+                if attempt < max_retries - 1:
+                    time.sleep(2 ** attempt)
 
-    print(f"Started syncing from Unity Catalog to Fabric...")
+            if outcome != 'healthy':
+                print(f"! Shortcut '{shortcut_name}' is {outcome}.")
+            report.record(shortcut_name, 'verify', outcome, time.time() - started, attempt)
+
+        with ThreadPoolExecutor(max_workers=max_threads) as executor:
+            list(executor.map(verify_shortcut, shortcut_names))
+
+        return report
+
+    # Incremental sync utils
+
+    @staticmethod
+    def get_watermark_path(fabric_config):
+        workspace_id = fabric_config['workspace_id']
+        lakehouse_id = fabric_config['lakehouse_id']
+        default_path = f"abfss://{workspace_id}@{Utils.ONELAKE_API_ENDPOINT}/{lakehouse_id}/Files/uc_sync/watermarks.json"
+        return fabric_config.get('watermark_path', default_path)
+
+    @staticmethod
+    def load_watermarks(watermark_path):
+        if not mssparkutils.fs.exists(watermark_path):
+            return {}
+        return json.loads(mssparkutils.fs.head(watermark_path, Utils.WATERMARK_MAX_BYTES))
+
+    @staticmethod
+    def save_watermarks(watermark_path, watermarks):
+        mssparkutils.fs.put(watermark_path, json.dumps(watermarks, indent=2), True)
+
+    @staticmethod
+    def get_watermark_key(table):
+        return f"{table['catalog_name']}.{table['schema_name']}"
+
+    @staticmethod
+    def get_table_timestamp(table):
+        # UC timestamps are epoch milliseconds; updated_at is missing on tables never altered
+        return max(table.get('created_at') or 0, table.get('updated_at') or 0)
+
+    @staticmethod
+    def needs_full_reconcile(fabric_config, watermarks, watermark_keys):
+        if not fabric_config.get('incremental_sync', False):
+            return True
+        full_reconcile_seconds = fabric_config.get('full_reconcile_hours', Utils.FULL_RECONCILE_HOURS) * 3600
+        for key in watermark_keys:
+            last_full_reconcile = watermarks.get(key, {}).get('last_full_reconcile')
+            if last_full_reconcile is None or time.time() - last_full_reconcile >= full_reconcile_seconds:
+                return True
+        return False
+
+    @staticmethod
+    def plan_incremental_changes(tables, watermarks):
+        """Return the tables created or changed since their schema's watermark, marked for upsert."""
+        changed_tables = []
+        for table in tables:
+            watermark = watermarks.get(Utils.get_watermark_key(table), {}).get('updated_at', 0)
+            if Utils.get_table_timestamp(table) > watermark:
+                table['operation'] = 'upsert'
+                changed_tables.append(table)
+        return changed_tables
+
+    @staticmethod
+    def advance_watermarks(watermarks, tables, watermark_keys, full_reconcile):
+        """Move each schema's watermark to its newest table, unless one of its tables failed to sync."""
+        newest, failed = {}, set()
+        for table in tables:
+            key = Utils.get_watermark_key(table)
+            newest[key] = max(newest.get(key, 0), Utils.get_table_timestamp(table))
+            if table.get('outcome') == 'failed':
+                failed.add(key)
+
+        for key in watermark_keys:
+            entry = watermarks.setdefault(key, {})
+            if key not in failed:
+                entry['updated_at'] = max(entry.get('updated_at', 0), newest.get(key, 0))
+            if full_reconcile:
+                entry['last_full_reconcile'] = time.time()
+
+
+def sync_dbx_uc_tables_to_onelake(databricks_config, fabric_config, report=None, concurrency=None, watermarks=None,
+                                  known_scopes=()):
+    """Sync one Unity Catalog catalog to OneLake shortcuts and return the SyncReport.
+
+    With fabric_config['incremental_sync'] set, only tables changed since the watermarks stored at
+    fabric_config['watermark_path'] (default Files/uc_sync/watermarks.json in the lakehouse) are
+    synced, and deletes and retargets are applied by a full reconcile every
+    fabric_config['full_reconcile_hours']. It is off by default: every run is a full reconcile and
+    nothing is written to the lakehouse. The Unity Catalog tables API has no modified-since filter,
+    so an incremental run still lists every table of the configured schemas and compares their
+    timestamps locally; what it saves are the Fabric calls, not the Unity Catalog listing.
+
+    With fabric_config['verify_shortcuts'] set, the targets of the shortcuts created or kept by
+    the run are probed afterwards; each probe is recorded in the report as a 'verify' entry.
+
+    `report`, `concurrency` and `watermarks` are passed in by sync_dbx_uc_catalogs_to_onelake
+    so that parallel catalog pipelines share them; when `watermarks` is given the caller saves them.
+    `known_scopes` are the (catalog, schema) pairs synced by the other pipelines, whose shortcuts
+    must not be deleted by this one.
+    """
+    report = report if report is not None else SyncReport()
+    tables = Utils.get_dbx_uc_tables(databricks_config)
+    if tables is None:
+        return report
+
+    dbx_uc_catalog = databricks_config['dbx_uc_catalog']
+    dbx_uc_schemas = databricks_config['dbx_uc_schemas']
+    watermark_keys = [f"{dbx_uc_catalog}.{schema}" for schema in dbx_uc_schemas]
+    incremental_sync = fabric_config.get('incremental_sync', False)
+    watermark_path = Utils.get_watermark_path(fabric_config)
+    save_watermarks = watermarks is None and incremental_sync
+    if watermarks is None:
+        watermarks = Utils.load_watermarks(watermark_path) if incremental_sync else {}
+    full_reconcile = Utils.needs_full_reconcile(fabric_config, watermarks, watermark_keys)
+
+    print(f"Started syncing '{dbx_uc_catalog}' from Unity Catalog to Fabric...")
 
-    # Delete shortcuts if not exist in UC tables
     consider_dbx_uc_table_changes = fabric_config['consider_dbx_uc_table_changes']
+    concurrency = concurrency or Utils.get_concurrency(fabric_config)
     sc_deleted, sc_failed_delete = 0, 0
-    if(consider_dbx_uc_table_changes): 
-        sc_deleted, sc_failed_delete = Utils.delete_shortcuts(fabric_config, deletions_required)
-
-    # Create shortcuts if not exist in Lakehouse
-    if tables is not None:
-        for entry in tables:
-            if f"{Utils.PREFIX}_{entry['catalog_name']}_{entry['schema_name']}_{entry['name']}" in creations_required:
-                entry['operation'] = 'create'
-            else:
-                entry['operation'] = 'skip'
-        sc_created, sc_skipped, sc_failed_create = Utils.create_shortcuts(fabric_config, tables)
+    if full_reconcile:
+        print(f"Running full reconcile of {len(tables)} tables in '{dbx_uc_catalog}'.")
+        current_shortcuts = Utils.get_lakehouse_shortcuts(fabric_config, concurrency)
+        scopes = {(dbx_uc_catalog, schema) for schema in dbx_uc_schemas}
+        known_scopes = set(known_scopes) | Utils.get_dbx_uc_overlapping_scopes(databricks_config)
+        deletions_required = Utils.plan_shortcut_changes(tables, current_shortcuts, scopes, known_scopes)
+        tables_to_sync = tables
+
+        # Delete shortcuts if not exist in UC tables
+        if(consider_dbx_uc_table_changes): 
+            sc_deleted, sc_failed_delete = Utils.delete_shortcuts(fabric_config, deletions_required, concurrency, report)
+    else:
+        # Deletions are only detected by the periodic full reconcile
+        tables_to_sync = Utils.plan_incremental_changes(tables, watermarks)
+        print(f"Running incremental sync: {len(tables_to_sync)} of {len(tables)} tables in '{dbx_uc_catalog}' changed since the last run.")
+
+    # Create shortcuts if not exist in Lakehouse, retarget the ones whose storage location moved
+    sc_created, sc_retargeted, sc_skipped, sc_failed_create = Utils.create_shortcuts(fabric_config, tables_to_sync, concurrency, report)
+
+    Utils.advance_watermarks(watermarks, tables, watermark_keys, full_reconcile and sc_failed_delete == 0)
+    if save_watermarks:
+        Utils.save_watermarks(watermark_path, watermarks)
 
     total_failed = sc_failed_delete + sc_failed_create
-    print(f"\nSync finished. {sc_created} shortcuts created, {sc_skipped} skipped, {total_failed} failed, {sc_deleted} deleted.")
\ No newline at end of file
+    print(f"\nSync of '{dbx_uc_catalog}' finished. {sc_created} shortcuts created, {sc_retargeted} retargeted, {sc_skipped} skipped, {total_failed} failed, {sc_deleted} deleted.")
+    print("Concurrency over time: " + " -> ".join(f"{limit} ({elapsed:.0f}s)" for elapsed, limit in concurrency.history))
+
+    if fabric_config.get('verify_shortcuts', False):
+        # Shortcuts created or kept by this run; tables an incremental run did not touch have no outcome
+        shortcut_names = [
+            Utils.get_shortcut_name(table) for table in tables
+            if table.get('table_type') == "EXTERNAL" and table.get('data_source_format') == "DELTA"
+            and table.get('outcome', 'skipped') in {'created', 'retargeted', 'skipped'}
+        ]
+        print(f"Verifying {len(shortcut_names)} shortcut targets of '{dbx_uc_catalog}'...")
+        Utils.verify_shortcuts(fabric_config, shortcut_names, report)
+        names = set(shortcut_names)
+        health = {}
+        broken = []
+        for entry in list(report.entries):
+            if entry['operation'] == 'verify' and entry['shortcut_name'] in names:
+                health[entry['outcome']] = health.get(entry['outcome'], 0) + 1
+                if entry['outcome'] != 'healthy':
+                    broken.append(entry['shortcut_name'])
+        print(f"Verification of '{dbx_uc_catalog}' finished: {health}")
+        if broken:
+            print(f"Shortcuts of '{dbx_uc_catalog}' with unhealthy targets: {', '.join(sorted(broken))}")
+    return report
+
+
+def sync_dbx_uc_catalogs_to_onelake(databricks_config, fabric_config):
+    """Sync several Unity Catalog catalogs in parallel, one pipeline per catalog.
+
+    databricks_config['dbx_uc_catalogs'] maps each catalog name to its list of schemas. The
+    pipelines share one concurrency controller and one SyncReport, which is returned and, when
+    fabric_config['report_path'] is set, written there as JSON.
+    """
+    dbx_uc_catalogs = databricks_config['dbx_uc_catalogs']
+    max_parallel_catalogs = fabric_config.get('max_parallel_catalogs', Utils.MAX_PARALLEL_CATALOGS)
+
+    report = SyncReport()
+    concurrency = Utils.get_concurrency(fabric_config)
+    incremental_sync = fabric_config.get('incremental_sync', False)
+    watermark_path = Utils.get_watermark_path(fabric_config)
+    watermarks = Utils.load_watermarks(watermark_path) if incremental_sync else {}
+
+    # Pipelines run in parallel in one lakehouse, so each must know which shortcuts the others own
+    all_scopes = {(catalog, schema) for catalog, schemas in dbx_uc_catalogs.items() for schema in schemas}
+
+    def sync_catalog(catalog):
+        catalog_config = dict(databricks_config, dbx_uc_catalog=catalog, dbx_uc_schemas=dbx_uc_catalogs[catalog])
+        try:
+            sync_dbx_uc_tables_to_onelake(catalog_config, fabric_config, report, concurrency, watermarks, all_scopes)
+        except Exception as e:
+            print(f"! Upps Sync of catalog '{catalog}' failed: {e}")
+
+    with ThreadPoolExecutor(max_workers=max_parallel_catalogs) as executor:
+        list(executor.map(sync_catalog, dbx_uc_catalogs))
+
+    if incremental_sync:
+        Utils.save_watermarks(watermark_path, watermarks)
+
+    summary = report.summary()
+    print(f"\nAll catalogs finished. {summary['shortcuts']} shortcuts processed: {summary['outcomes']}, "
+          f"{summary['retries']} retries, p50 {summary['p50_latency_seconds']}s, p95 {summary['p95_latency_seconds']}s.")
+    if summary['health']:
+        print(f"Shortcut health: {summary['health']}")
+    if 'report_path' in fabric_config:
+        mssparkutils.fs.put(fabric_config['report_path'], report.to_json(), True)
+    return report
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Content-addressed artifact store shared by the mirror scripts and install_wheels_only.py.
+
+Every mirror used to keep its own cache directory keyed by file name, so the same wheel
+fetched from JFrog, Azure Artifacts and PyPI was downloaded and stored three times, and
+installs went back to the network for files already on disk. `ArtifactStore` keeps each
+file once under its sha256 and indexes it by file name and source:
+
+- Blobs live in `blobs/<aa>/<sha256>`; downloads land in `incoming/` (with their `.part`
+  files, so interrupted downloads still resume) and are moved in once verified.
+- The index is SQLite in WAL mode, so several mirror and install processes can share one
+  store. A feed that publishes hashes hits any copy with that digest, whoever fetched it.
+- Files are handed out by hardlink, else reflink (copy-on-write clone on btrfs/XFS),
+  else copy (`link_or_copy`), so an upload or install does not duplicate the bytes.
+- Each hit refreshes the blob's last-used time; `prune` (run on `close`) evicts the
+  least recently used blobs until the store fits its size cap.
+
+Only the standard library is used, so installs can use the store in a bare environment.
+The default location comes from the FABRIC_ARTIFACT_STORE environment variable.
+"""
+from __future__ import annotations
+
+import abc
+import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+ARTIFACT_STORE_ENV = "FABRIC_ARTIFACT_STORE"
+DEFAULT_ARTIFACT_STORE_BYTES = 20 * 1024 ** 3
+# Linux ioctl that clones a file's extents (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+
+def _sha256_of_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ArtifactCache(abc.ABC):
+    """Where the mirror engine keeps downloaded distribution files.
+
+    `root` is the directory the files live in. Scratch directories passed to `materialize`
+    belong under it, so the hardlinks it makes stay on one filesystem.
+    """
+
+    root: str
+
+    @abc.abstractmethod
+    def find(self, filename: str, expected_sha256: Optional[str] = None, source: str = "") -> Optional[str]:
+        """sha256 of a usable local copy of `filename` (matching `expected_sha256` if given), or None."""
+
+    @abc.abstractmethod
+    def download_path(self, filename: str) -> str:
+        """Where a download of `filename` should be written (its `.part` file lives next to it)."""
+
+    @abc.abstractmethod
+    def add(self, path: str, sha256: str, filename: str, source: str = "") -> None:
+        """Take over a finished download at `path`."""
+
+    @abc.abstractmethod
+    def materialize(self, sha256: str, filename: str, dest_dir: str) -> str:
+        """A path named `filename` with the content `sha256`, for uploads and installs."""
+
+    def release(self, path: str) -> None:
+        """Called when a materialized path is no longer needed."""
+
+    def save(self) -> None:
+        """Persist bookkeeping; called at the end of every mirror run."""
+
+    def close(self) -> None:
+        self.save()
+
+
+def link_or_copy(src: str, dest: str) -> str:
+    """Make `dest` a hardlink of `src`, else a reflink (copy-on-write clone), else a copy.
+
+    Returns "hardlink", "reflink" or "copy". Hardlinks and reflinks take no extra space
+    and stay valid when the source is deleted.
+    """
+    if os.path.exists(dest):
+        os.remove(dest)
+    try:
+        os.link(src, dest)
+        return "hardlink"
+    except OSError:
+        pass
+    if sys.platform.startswith("linux"):
+        try:
+            import fcntl
+            with open(src, "rb") as fsrc, open(dest, "wb") as fdest:
+                fcntl.ioctl(fdest.fileno(), FICLONE, fsrc.fileno())
+            return "reflink"
+        except (OSError, ImportError):
+            if os.path.exists(dest):
+                os.remove(dest)
+    shutil.copyfile(src, dest)
+    return "copy"
+
+
+class ArtifactStore(ArtifactCache):
+    """Content-addressed store of distribution files, shared by all mirrors and installs.
+
+    Files are stored once per sha256 under `blobs/<aa>/<sha256>`, whichever feed or tool
+    fetched them, and a SQLite index (WAL mode, safe for concurrent processes) maps file
+    names to digests. Every hit refreshes the blob's last-used time; on `close` (or
+    `prune`) the least recently used blobs are deleted until the store fits `max_bytes`.
+    Files are handed out by hardlink or reflink (`link_or_copy`), so materializing a wheel
+    for an upload or an install does not copy it.
+    """
+
+    DB_FILENAME = "store.db"
+
+    def __init__(self, root: str, max_bytes: Optional[int] = DEFAULT_ARTIFACT_STORE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(root, "incoming"), exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS blobs (sha256 TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS names (filename TEXT NOT NULL, source TEXT NOT NULL,"
+                         " sha256 TEXT NOT NULL, PRIMARY KEY (filename, source))")
+            conn.execute("CREATE INDEX IF NOT EXISTS blobs_last_used ON blobs (last_used)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.root, self.DB_FILENAME), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.root, "blobs", sha256[:2], sha256)
+
+    def _touch(self, sha256: str) -> bool:
+        """Mark a blob as used; False (and the index entry dropped) if its file is gone."""
+        conn = self._conn()
+        with conn:
+            if os.path.exists(self.blob_path(sha256)):
+                return conn.execute("UPDATE blobs SET last_used = ? WHERE sha256 = ?", (time.time(), sha256)).rowcount > 0
+            conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+            conn.execute("DELETE FROM names WHERE sha256 = ?", (sha256,))
+        return False
+
+    def find(self, filename: str, expected_sha256: Optional[str] = None, source: str = "") -> Optional[str]:
+        if expected_sha256:
+            return expected_sha256 if self._touch(expected_sha256) else None
+        # Without an index hash, only trust what the same feed served under this name
+        row = self._conn().execute("SELECT sha256 FROM names WHERE filename = ? AND source = ?",
+                                   (filename, source)).fetchone()
+        return row[0] if row and self._touch(row[0]) else None
+
+    def filenames(self, suffix: str = "") -> Dict[str, str]:
+        """{file name: sha256} of every stored file whose name ends with `suffix`."""
+        rows = self._conn().execute(
+            "SELECT names.filename, names.sha256 FROM names JOIN blobs ON blobs.sha256 = names.sha256"
+            " ORDER BY blobs.last_used").fetchall()
+        return {filename: sha256 for filename, sha256 in rows if filename.lower().endswith(suffix)}
+
+    def download_path(self, filename: str) -> str:
+        return os.path.join(self.root, "incoming", filename)
+
+    def add(self, path: str, sha256: str, filename: str, source: str = "") -> None:
+        blob = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        if os.path.exists(blob):
+            os.remove(path)
+        else:
+            os.replace(path, blob)
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?)", (sha256, os.path.getsize(blob), time.time()))
+            conn.execute("INSERT OR REPLACE INTO names VALUES (?, ?, ?)", (filename, source, sha256))
+
+    def add_file(self, path: str, source: str = "") -> str:
+        """Copy (or link) an existing file into the store; returns its sha256."""
+        sha256 = _sha256_of_file(path)
+        if not self._touch(sha256):
+            incoming = self.download_path(os.path.basename(path))
+            link_or_copy(path, incoming)
+            self.add(incoming, sha256, os.path.basename(path), source)
+        else:
+            with self._conn() as conn:
+                conn.execute("INSERT OR REPLACE INTO names VALUES (?, ?, ?)", (os.path.basename(path), source, sha256))
+        return sha256
+
+    def materialize(self, sha256: str, filename: str, dest_dir: str) -> str:
+        os.makedirs(dest_dir, exist_ok=True)
+        dest = os.path.join(dest_dir, filename)
+        link_or_copy(self.blob_path(sha256), dest)
+        self._touch(sha256)
+        return dest
+
+    def release(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def total_bytes(self) -> int:
+        return self._conn().execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def prune(self, max_bytes: Optional[int] = None) -> int:
+        """Delete least recently used blobs until the store fits `max_bytes`; returns bytes freed."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        if max_bytes is None:
+            return 0
+        conn = self._conn()
+        excess = self.total_bytes() - max_bytes
+        freed = 0
+        for sha256, size in conn.execute("SELECT sha256, size FROM blobs ORDER BY last_used").fetchall():
+            if freed >= excess:
+                break
+            try:
+                os.remove(self.blob_path(sha256))
+            except FileNotFoundError:
+                pass
+            with conn:
+                conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+                conn.execute("DELETE FROM names WHERE sha256 = ?", (sha256,))
+            freed += size
+        if freed:
+            print(f"INFO: Evicted {freed / 1024 ** 2:.1f} MB of least recently used artifacts")
+        return freed
+
+    def close(self) -> None:
+        self.prune()
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -5,9 +5,16 @@ Mirror packages from an Azure DevOps Artifacts PyPI feed into a Fabric Environme
 This script supports:
 - PyPI-style simple index served by Azure Artifacts (recommended):
   https://pkgs.dev.azure.com/{org}/{project}/_packaging/{feed}/pypi/simple/
+  Pages are requested as PEP 691 JSON when offered and revalidated with ETag /
+  If-Modified-Since, so an unchanged package costs one 304.
 - Azure DevOps Packaging REST API fallback to enumerate packages in a feed.
-- Downloads distributions into a local cache, tracks uploaded artifacts in a JSON state file,
-  and uploads wheel files to Fabric staging using `FabricEnvironmentManager` from
+- Runs on the shared mirror engine (tools/package_mirror.py): listing, downloads into a
+  local cache (--download-workers, --chunk-size-kb), hash verification and Fabric uploads
+  (--upload-workers) run as overlapped stages, so network and upload time overlap.
+- Drops files the Fabric runtime cannot install (other Python versions, Windows/macOS/ARM
+  wheels) before downloading; --version-spec and --latest narrow the versions further.
+- Tracks uploaded artifacts in a state store (JSON journal or SQLite) and uploads wheel
+  files to Fabric staging using `FabricEnvironmentManager` from
   `tools/upload_wheel_to_fabric.py`.
 
 Auth for Azure DevOps: Personal Access Token (PAT). The script sends it as Basic auth
@@ -25,14 +32,8 @@ Usage (Windows cmd.exe):
 from __future__ import annotations
 import argparse
 import base64
-import hashlib
-import json
-import os
-import re
-import shutil
 import sys
-import time
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Dict, List, Optional
 
 import requests
 try:
@@ -43,6 +44,23 @@ except Exception:
     ClientSecretCredential = None
     AZURE_IDENTITY_AVAILABLE = False
 
+try:
+    from tools.package_mirror import (DOWNLOAD_CHUNK_SIZE, DOWNLOAD_WORKERS, VALID_DISTS, DistributionFilter,
+                                      FeedAdapter, MirrorEngine, MirrorState, SimpleIndexCache,
+                                      add_mirror_arguments, fetch_simple_index, run_mirror)
+except ImportError:
+    from package_mirror import (DOWNLOAD_CHUNK_SIZE, DOWNLOAD_WORKERS, VALID_DISTS, DistributionFilter,
+                                FeedAdapter, MirrorEngine, MirrorState, SimpleIndexCache,
+                                add_mirror_arguments, fetch_simple_index, run_mirror)
+
+try:
+    from tools.fabric_auth import FabricTokenAuth
+except ImportError:
+    from fabric_auth import FabricTokenAuth
+
+# Azure DevOps resource, for AAD tokens
+AZURE_DEVOPS_SCOPE = "499b84ac-1321-427f-aa17-267ca6975798/.default"
+
 # Try to import the Fabric manager from your tools file.
 try:
     from tools.upload_wheel_to_fabric import FabricEnvironmentManager
@@ -53,7 +71,6 @@ except Exception:
         FabricEnvironmentManager = None
 
 STATE_FILENAME = "azure_devops_mirror_state.json"
-VALID_DISTS = (".whl", ".tar.gz", ".zip")
 
 
 def safe_print(*args, **kwargs):
@@ -69,51 +86,11 @@ def safe_print(*args, **kwargs):
         print(*out, **kwargs)
 
 
-def sha256_of_file(path: str) -> str:
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
-    return h.hexdigest()
-
-
-class MirrorState:
-    def __init__(self, path: str):
-        self.path = path
-        self._data: Dict[str, Dict[str, Any]] = {}
-        if os.path.exists(path):
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    self._data = json.load(f)
-            except Exception:
-                safe_print("⚠️ Could not read existing state file; starting fresh")
-                self._data = {}
-
-    def save(self) -> None:
-        tmp = self.path + ".tmp"
-        with open(tmp, "w", encoding="utf-8") as f:
-            json.dump(self._data, f, indent=2, sort_keys=True)
-        shutil.move(tmp, self.path)
-
-    def is_uploaded(self, pkg_name: str, filename: str, sha256: str) -> bool:
-        key = f"{pkg_name}:{filename}"
-        rec = self._data.get(key)
-        return bool(rec and rec.get("sha256") == sha256 and rec.get("uploaded") is True)
-
-    def mark_uploaded(self, pkg_name: str, filename: str, sha256: str, upload_meta: dict) -> None:
-        key = f"{pkg_name}:{filename}"
-        self._data[key] = {
-            "sha256": sha256,
-            "uploaded": True,
-            "upload_meta": upload_meta,
-            "ts": int(time.time()),
-        }
-        self.save()
-
-
-def azure_pypi_simple_index(base: str, org: str, project: Optional[str], feed: str, pkg_name: str, session: requests.Session) -> List[str]:
+def azure_pypi_simple_index(base: str, org: str, project: Optional[str], feed: str, pkg_name: str,
+                            session: requests.Session,
+                            index_cache: Optional[SimpleIndexCache] = None) -> List[Dict[str, Any]]:
     """
-    Build the simple index URL for Azure Artifacts and return all hrefs found.
+    Build the simple index URL for Azure Artifacts and return the files it lists.
     Example simple index URL:
       https://pkgs.dev.azure.com/{org}/{project}/_packaging/{feed}/pypi/simple/{pkg}/
     If `project` is None, omit it: https://pkgs.dev.azure.com/{org}/_packaging/{feed}/pypi/simple/{pkg}/
@@ -124,17 +101,7 @@ def azure_pypi_simple_index(base: str, org: str, project: Optional[str], feed: s
     else:
         idx = f"{base}/{org}/_packaging/{feed}/pypi/simple/{pkg_name}/"
     safe_print(f"📡 Fetching simple index {idx}")
-    r = session.get(idx, timeout=30)
-    r.raise_for_status()
-    html = r.text
-    hrefs = re.findall(r'href=["\']([^"\']+)["\']', html, flags=re.IGNORECASE)
-    out: List[str] = []
-    for u in hrefs:
-        if u.startswith("http"):
-            out.append(u)
-        else:
-            out.append(idx.rstrip("/") + "/" + u.lstrip("/"))
-    return out
+    return fetch_simple_index(session, idx, index_cache)
 
 
 def azure_devops_list_packages_via_api(base: str, org: str, project: Optional[str], feed: str, session: requests.Session) -> List[str]:
@@ -164,41 +131,14 @@ def azure_devops_list_packages_via_api(base: str, org: str, project: Optional[st
     return names
 
 
-def download_url_to_path(session: requests.Session, url: str, dest_path: str, max_retries: int = 3) -> None:
-    attempts = 0
-    while attempts < max_retries:
-        attempts += 1
-        try:
-            with session.get(url, stream=True, timeout=60) as r:
-                r.raise_for_status()
-                tmp = dest_path + ".part"
-                with open(tmp, "wb") as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                shutil.move(tmp, dest_path)
-            return
-        except Exception as e:
-            safe_print(f"⚠️ Download attempt {attempts}/{max_retries} failed for {url}: {e}")
-            if attempts >= max_retries:
-                raise
-            time.sleep(2 ** (attempts - 1))
-
-
-def mirror_package_from_azure(pkg_name: str, base: str, org: str, project: Optional[str], feed: str,
-                              session: requests.Session, cache_dir: str, state: MirrorState,
-                              fabric_mgr: Any, upload_wheels_only: bool = True,
-                              publish_after: bool = False) -> None:
-    os.makedirs(cache_dir, exist_ok=True)
-    safe_print(f"🔎 Mirroring package: {pkg_name}")
-
+def list_package_entries_azure(pkg_name: str, base: str, org: str, project: Optional[str], feed: str,
+                                session: requests.Session,
+                                index_cache: Optional[SimpleIndexCache] = None) -> List[Dict[str, Any]]:
+    """Return the distribution files ({"url", "filename", "sha256"}) available for a package."""
     # Try simple index first
-    entries: List[Dict[str, str]] = []
+    entries: List[Dict[str, Any]] = []
     try:
-        urls = azure_pypi_simple_index(base, org, project, feed, pkg_name, session)
-        for u in urls:
-            fname = os.path.basename(u.split("?")[0])
-            entries.append({"url": u, "filename": fname})
+        entries.extend(azure_pypi_simple_index(base, org, project, feed, pkg_name, session, index_cache))
     except Exception:
         safe_print("⚠️ Simple index fetch failed, falling back to REST API listing")
         try:
@@ -206,65 +146,57 @@ def mirror_package_from_azure(pkg_name: str, base: str, org: str, project: Optio
             # If API listing returns names, we need to query simple index per package
             if pkg_name not in names:
                 safe_print(f"⚠️ Package {pkg_name} not found in feed via API; skipping")
-                return
+                return []
             # Try simple index again but using session (in case earlier session lacked auth/header)
-            urls = azure_pypi_simple_index(base, org, project, feed, pkg_name, session)
-            for u in urls:
-                fname = os.path.basename(u.split("?")[0])
-                entries.append({"url": u, "filename": fname})
+            entries.extend(azure_pypi_simple_index(base, org, project, feed, pkg_name, session, index_cache))
         except Exception as e:
             safe_print(f"❌ Could not enumerate package files: {e}")
-            return
+            return []
 
     safe_print(f"ℹ️ Found {len(entries)} items for {pkg_name}")
-    entries = [e for e in entries if e["filename"].lower().endswith(VALID_DISTS)]
-    if not entries:
-        safe_print("⚠️ No distribution files found matching known extensions; skipping")
-        return
-
-    for e in entries:
-        filename = e["filename"]
-        url = e["url"]
-        local_path = os.path.join(cache_dir, filename)
-
-        if not os.path.exists(local_path):
-            safe_print(f"⬇️ Downloading {filename} from {url}")
-            try:
-                download_url_to_path(session, url, local_path)
-            except Exception as ex:
-                safe_print(f"❌ Failed to download {url}: {ex}")
-                continue
+    return [e for e in entries if e["filename"].lower().endswith(VALID_DISTS)]
 
-        sha256 = sha256_of_file(local_path)
-        if state.is_uploaded(pkg_name, filename, sha256):
-            safe_print(f"✅ Already uploaded {filename}, skipping")
-            continue
 
-        if upload_wheels_only and not filename.lower().endswith(".whl"):
-            safe_print(f"ℹ️ Skipping non-wheel {filename} (enable sdist handling to upload these)")
-            continue
+class AzureArtifactsAdapter(FeedAdapter):
+    """Azure Artifacts PyPI feed: simple index first, Packaging REST API as the fallback."""
 
-        safe_print(f"⬆️ Uploading {filename} to Fabric (workspace={fabric_mgr.workspace_id})")
-        try:
-            upload_result = fabric_mgr.upload_wheel(local_path, max_retries=3)
-            if upload_result.get("success"):
-                state.mark_uploaded(pkg_name, filename, sha256, upload_result)
-                safe_print(f"✅ Uploaded and recorded: {filename}")
-            else:
-                safe_print(f"❌ Upload failed for {filename}: {upload_result.get('error')}")
-        except Exception as ex:
-            safe_print(f"❌ Exception during upload of {filename}: {ex}")
+    name = "Azure Artifacts"
+
+    def __init__(self, base: str, org: str, project: Optional[str], feed: str):
+        self.base = base
+        self.org = org
+        self.project = project
+        self.feed = feed
+
+    def list_entries(self, pkg_name: str, session: requests.Session,
+                     index_cache: Optional[SimpleIndexCache] = None) -> List[Dict[str, Any]]:
+        return list_package_entries_azure(pkg_name, self.base, self.org, self.project, self.feed, session, index_cache)
 
-    if publish_after:
-        safe_print("🔄 Publishing environment after uploads")
-        try:
-            pub = fabric_mgr.publish_environment()
-            if pub.get("success"):
-                safe_print("✅ Publish OK")
-            else:
-                safe_print(f"⚠️ Publish returned error: {pub.get('error')}")
-        except Exception as e:
-            safe_print(f"❌ Publish failed: {e}")
+
+def mirror_packages_from_azure(pkg_names: List[str], base: str, org: str, project: Optional[str], feed: str,
+                               session: requests.Session, cache_dir: str, state: MirrorState,
+                               fabric_mgr: Any, upload_wheels_only: bool = True,
+                               publish_after: bool = False, download_workers: int = DOWNLOAD_WORKERS,
+                               chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+                               dist_filter: Optional[DistributionFilter] = None) -> Dict[str, int]:
+    """Mirror many packages through the pipelined `MirrorEngine`, publishing once at the end."""
+    engine = MirrorEngine(AzureArtifactsAdapter(base, org, project, feed), session, cache_dir, state, fabric_mgr,
+                          dist_filter=dist_filter, upload_wheels_only=upload_wheels_only,
+                          download_workers=download_workers, chunk_size=chunk_size)
+    return engine.run(pkg_names, publish_after=publish_after)
+
+
+def mirror_package_from_azure(pkg_name: str, base: str, org: str, project: Optional[str], feed: str,
+                              session: requests.Session, cache_dir: str, state: MirrorState,
+                              fabric_mgr: Any, upload_wheels_only: bool = True,
+                              publish_after: bool = False, download_workers: int = DOWNLOAD_WORKERS,
+                              chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+                              dist_filter: Optional[DistributionFilter] = None) -> Dict[str, int]:
+    safe_print(f"🔎 Mirroring package: {pkg_name}")
+    return mirror_packages_from_azure([pkg_name], base, org, project, feed, session, cache_dir, state, fabric_mgr,
+                                      upload_wheels_only=upload_wheels_only, publish_after=publish_after,
+                                      download_workers=download_workers, chunk_size=chunk_size,
+                                      dist_filter=dist_filter)
 
 
 def build_azure_session(pat: Optional[str], client_id: Optional[str] = None, client_secret: Optional[str] = None, tenant_id: Optional[str] = None, use_aad: bool = False) -> requests.Session:
@@ -292,8 +224,8 @@ def build_azure_session(pat: Optional[str], client_id: Optional[str] = None, cli
             try:
                 safe_print("🔑 Acquiring AAD token via ClientSecretCredential for Azure DevOps")
                 cred = ClientSecretCredential(tenant_id=tenant_id, client_id=client_id, client_secret=client_secret)
-                token = cred.get_token("499b84ac-1321-427f-aa17-267ca6975798/.default").token
-                s.headers.update({"Authorization": f"Bearer {token}"})
+                # Refreshed before it expires, so long mirror runs keep access to the feed
+                s.auth = FabricTokenAuth(credential=cred, scope=AZURE_DEVOPS_SCOPE)
                 return s
             except Exception as e:
                 safe_print(f"⚠️ ClientSecretCredential token acquisition failed: {e}")
@@ -302,9 +234,7 @@ def build_azure_session(pat: Optional[str], client_id: Optional[str] = None, cli
     if AZURE_IDENTITY_AVAILABLE and DefaultAzureCredential is not None:
         try:
             safe_print("🔑 Acquiring AAD token via DefaultAzureCredential for Azure DevOps")
-            cred = DefaultAzureCredential()
-            token = cred.get_token("499b84ac-1321-427f-aa17-267ca6975798/.default").token
-            s.headers.update({"Authorization": f"Bearer {token}"})
+            s.auth = FabricTokenAuth(credential=DefaultAzureCredential(), scope=AZURE_DEVOPS_SCOPE)
             return s
         except Exception as e:
             safe_print(f"⚠️ DefaultAzureCredential token acquisition failed: {e}")
@@ -325,54 +255,19 @@ def main(argv: Optional[List[str]] = None) -> None:
     parser.add_argument("--org", required=True, help="Azure DevOps organization")
     parser.add_argument("--project", help="Azure DevOps project (optional)")
     parser.add_argument("--feed", required=True, help="Feed name or id")
-    parser.add_argument("--package-name", help="Single package name to mirror")
-    parser.add_argument("--package-list-file", help="File with package names (one per line)")
     parser.add_argument("--pat", help="Azure DevOps Personal Access Token (PAT)")
-    parser.add_argument("--cache", default=".azure_devops_mirror_cache", help="Local cache directory")
-    parser.add_argument("--workspace-id", required=True, help="Fabric workspace id")
-    parser.add_argument("--environment-id", required=True, help="Fabric environment id")
-    parser.add_argument("--publish", action="store_true", help="Publish environment after uploads")
-    parser.add_argument("--upload-wheels-only", action="store_true", default=True, help="Upload only wheel files (default True)")
-    # Fabric auth options (passed to FabricEnvironmentManager)
-    parser.add_argument("--fabric-token", help="Fabric bearer token")
-    parser.add_argument("--fabric-client-id", help="Fabric service principal client id")
-    parser.add_argument("--fabric-client-secret", help="Fabric service principal client secret")
-    parser.add_argument("--fabric-tenant-id", help="Fabric tenant id")
+    add_mirror_arguments(parser, default_cache=".azure_devops_mirror_cache")
     args = parser.parse_args(argv)
 
     if FabricEnvironmentManager is None:
         safe_print("❌ Could not import FabricEnvironmentManager from tools/upload_wheel_to_fabric.py. Ensure you run this from the repo root and the file exists.")
         sys.exit(2)
 
-    s = build_azure_session(args.pat)
-
-    fabric_mgr = FabricEnvironmentManager(
-        workspace_id=args.workspace_id,
-        environment_id=args.environment_id,
-        token=args.fabric_token,
-        client_id=args.fabric_client_id,
-        client_secret=args.fabric_client_secret,
-        tenant_id=args.fabric_tenant_id,
-    )
-
-    cache_dir = args.cache
-    os.makedirs(cache_dir, exist_ok=True)
-    state = MirrorState(os.path.join(cache_dir, STATE_FILENAME))
-
-    pkg_iter: Iterable[str] = ()
-    if args.package_name:
-        pkg_iter = [args.package_name]
-    elif args.package_list_file:
-        with open(args.package_list_file, "r", encoding="utf-8") as f:
-            pkg_iter = [ln.strip() for ln in f if ln.strip()]
-    else:
-        safe_print("❌ No package source provided. Use --package-name or --package-list-file.")
-        sys.exit(2)
-
-    for pkg in pkg_iter:
-        safe_print(f"➡️ Processing package {pkg}")
-        mirror_package_from_azure(pkg, args.base, args.org, args.project, args.feed, s, cache_dir, state, fabric_mgr, upload_wheels_only=args.upload_wheels_only, publish_after=args.publish)
-
+    adapter = AzureArtifactsAdapter(args.base, args.org, args.project, args.feed)
+    stats = run_mirror(parser, args, adapter, build_azure_session(args.pat), FabricEnvironmentManager, STATE_FILENAME)
+    if stats.get("failed"):
+        safe_print(f"❌ Mirror run finished with {stats['failed']} failure(s)")
+        sys.exit(1)
     safe_print("🎯 Mirror run complete")
 
 
@@ -42,6 +42,11 @@ except Exception:
     ClientSecretCredential = None
     AZURE_IDENTITY_AVAILABLE = False
 
+try:
+    from tools.fabric_auth import FabricTokenAuth
+except ImportError:
+    from fabric_auth import FabricTokenAuth
+
 
 class FabricAPI:
     def __init__(self, workspace_id: str, token: Optional[str] = None,
@@ -51,18 +56,18 @@ class FabricAPI:
         self.workspace_id = workspace_id
         self.base_url = base_url.rstrip('/')
         self.use_default_credential = use_default_credential
-        self.token = self._get_token(token, client_id, client_secret, tenant_id)
+        self.auth = self._get_auth(token, client_id, client_secret, tenant_id)
         self.session = requests.Session()
+        self.session.auth = self.auth
         self.session.headers.update({
-            'Authorization': f'Bearer {self.token}',
             'Content-Type': 'application/json',
             'User-Agent': 'FabricLA-Connector/1.0.0'
         })
 
-    def _get_token(self, token: Optional[str], client_id: Optional[str], client_secret: Optional[str], tenant_id: Optional[str]) -> str:
+    def _get_auth(self, token: Optional[str], client_id: Optional[str], client_secret: Optional[str], tenant_id: Optional[str]) -> FabricTokenAuth:
         if token:
             safe_print('Using provided bearer token')
-            return token
+            return FabricTokenAuth(token=token)
 
         if client_id and client_secret and tenant_id:
             if not AZURE_IDENTITY_AVAILABLE:
@@ -70,7 +75,7 @@ class FabricAPI:
             safe_print('Using service principal credentials')
             from azure.identity import ClientSecretCredential as _ClientSecret
             cred = _ClientSecret(tenant_id=tenant_id, client_id=client_id, client_secret=client_secret)
-            return cred.get_token('https://api.fabric.microsoft.com/.default').token
+            return FabricTokenAuth(credential=cred)
 
         if self.use_default_credential:
             if not AZURE_IDENTITY_AVAILABLE:
@@ -78,7 +83,7 @@ class FabricAPI:
             safe_print('Using DefaultAzureCredential (Azure CLI / Managed Identity / Environment)')
             from azure.identity import DefaultAzureCredential as _Default
             cred = _Default()
-            return cred.get_token('https://api.fabric.microsoft.com/.default').token
+            return FabricTokenAuth(credential=cred)
 
         raise RuntimeError('No authentication provided. Use --token or service principal or --use-default-credential')
 
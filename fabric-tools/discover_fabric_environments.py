@@ -30,6 +30,11 @@ try:
 except ImportError:
     AZURE_IDENTITY_AVAILABLE = False
 
+try:
+    from tools.fabric_auth import FabricTokenAuth
+except ImportError:
+    from fabric_auth import FabricTokenAuth
+
 
 class FabricEnvironmentDiscovery:
     """Fabric Environment discovery and validation tool."""
@@ -37,19 +42,19 @@ class FabricEnvironmentDiscovery:
     def __init__(self, token: Optional[str] = None, client_id: Optional[str] = None, 
                  client_secret: Optional[str] = None, tenant_id: Optional[str] = None):
         self.base_url = "https://api.fabric.microsoft.com/v1"
-        self.token = self._get_token(token, client_id, client_secret, tenant_id)
+        self.auth = self._get_auth(token, client_id, client_secret, tenant_id)
         self.session = requests.Session()
+        self.session.auth = self.auth
         self.session.headers.update({
-            'Authorization': f'Bearer {self.token}',
             'User-Agent': 'FabricLA-Connector-Discovery/1.0.0'
         })
     
-    def _get_token(self, token: Optional[str], client_id: Optional[str], 
-                   client_secret: Optional[str], tenant_id: Optional[str]) -> str:
-        """Get authentication token."""
+    def _get_auth(self, token: Optional[str], client_id: Optional[str], 
+                  client_secret: Optional[str], tenant_id: Optional[str]) -> FabricTokenAuth:
+        """Build the session auth; credential-backed tokens refresh before they expire."""
         if token:
             safe_print("🔑 Using provided bearer token")
-            return token
+            return FabricTokenAuth(token=token)
         
         if client_id and client_secret and tenant_id:
             safe_print("🔑 Using service principal authentication")
@@ -58,8 +63,7 @@ class FabricEnvironmentDiscovery:
             
             from azure.identity import ClientSecretCredential
             credential = ClientSecretCredential(tenant_id, client_id, client_secret)
-            token_result = credential.get_token("https://api.fabric.microsoft.com/.default")
-            return token_result.token
+            return FabricTokenAuth(credential=credential)
         
         safe_print("🔑 Using DefaultAzureCredential (Azure CLI)")
         if not AZURE_IDENTITY_AVAILABLE:
@@ -67,8 +71,7 @@ class FabricEnvironmentDiscovery:
         
         from azure.identity import DefaultAzureCredential
         credential = DefaultAzureCredential()
-        token_result = credential.get_token("https://api.fabric.microsoft.com/.default")
-        return token_result.token
+        return FabricTokenAuth(credential=credential)
     
     def list_workspaces(self) -> List[Dict[str, Any]]:
         """List all accessible workspaces."""
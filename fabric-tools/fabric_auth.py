@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Fabric bearer-token auth for requests sessions.
+
+The Fabric tools used to fetch one token at start-up and bake it into the session headers,
+so runs longer than the token lifetime (about an hour) failed with 401s partway through.
+`FabricTokenAuth` is a requests auth hook instead:
+
+- The token is cached and refreshed from the azure-identity credential shortly before it
+  expires. While one thread refreshes, the others keep using the still-valid token, so
+  in-flight work is never blocked or interrupted.
+- A request that still gets a 401 (token revoked, clock skew) forces a refresh and is
+  retried once with the new token when its body can be replayed.
+- A token passed explicitly (--token) cannot be refreshed and is used as-is.
+
+Usage:
+    session.auth = FabricTokenAuth(credential=DefaultAzureCredential())
+"""
+
+import threading
+import time
+from typing import Any, Optional
+
+import requests
+from requests.auth import AuthBase
+
+FABRIC_SCOPE = "https://api.fabric.microsoft.com/.default"
+REFRESH_MARGIN_SECONDS = 300
+
+
+class FabricTokenAuth(AuthBase):
+    """Attach a cached, auto-refreshing Fabric bearer token to every request."""
+
+    def __init__(self, credential: Any = None, token: Optional[str] = None,
+                 scope: str = FABRIC_SCOPE, refresh_margin_seconds: float = REFRESH_MARGIN_SECONDS):
+        if credential is None and not token:
+            raise ValueError("FabricTokenAuth needs a credential or a token")
+        self.credential = credential
+        self.scope = scope
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self._token = token
+        self._expires_on = 0.0
+        self._lock = threading.Lock()
+        if credential is not None:
+            # Fetch up front so a missing login fails at start-up, not on the first request
+            self.get_token()
+
+    def get_token(self, stale_token: Optional[str] = None) -> str:
+        """Return a valid token, refreshing it when it is close to expiry.
+
+        Pass `stale_token` to force a refresh after the service rejected that token; the
+        refresh is skipped if another thread already replaced it.
+        """
+        if self.credential is None:
+            return self._token
+
+        now = time.time()
+        if stale_token is None and self._token and now < self._expires_on - self.refresh_margin_seconds:
+            return self._token
+
+        # Only block when there is no usable token; otherwise let one thread refresh
+        must_wait = not self._token or now >= self._expires_on or stale_token is not None
+        if not self._lock.acquire(blocking=must_wait):
+            return self._token
+        try:
+            if stale_token is not None and self._token != stale_token:
+                return self._token
+            if stale_token is not None or not self._token or time.time() >= self._expires_on - self.refresh_margin_seconds:
+                access_token = self.credential.get_token(self.scope)
+                self._token = access_token.token
+                self._expires_on = float(access_token.expires_on)
+            return self._token
+        finally:
+            self._lock.release()
+
+    @property
+    def token(self) -> str:
+        return self.get_token()
+
+    def __call__(self, request: requests.PreparedRequest) -> requests.PreparedRequest:
+        request.headers['Authorization'] = f'Bearer {self.get_token()}'
+        if self.credential is not None:
+            request.register_hook('response', self._retry_unauthorized)
+        return request
+
+    def _retry_unauthorized(self, response: requests.Response, **kwargs: Any) -> requests.Response:
+        request = response.request
+        if response.status_code != 401 or getattr(request, '_fabric_auth_retried', False):
+            return response
+
+        stale_token = request.headers.get('Authorization', '')[len('Bearer '):]
+        token = self.get_token(stale_token=stale_token)
+        if token == stale_token:
+            return response
+        # Streamed bodies (file uploads) cannot be replayed; their callers retry with the new token
+        if request.body is not None and not isinstance(request.body, (bytes, str)):
+            return response
+
+        # Release the connection before resending, as requests' own auth handlers do
+        response.content
+        response.close()
+        retry_request = request.copy()
+        retry_request.headers['Authorization'] = f'Bearer {token}'
+        retry_request._fabric_auth_retried = True
+        retry_response = response.connection.send(retry_request, **kwargs)
+        retry_response.history.append(response)
+        retry_response.request = retry_request
+        return retry_response
@@ -3,10 +3,17 @@
 Usage:
   python tools\install_wheels_only.py --requirements requirements.txt
   python tools\install_wheels_only.py --dir wheels --no-deps
+  python tools\install_wheels_only.py --requirements requirements.txt --artifact-store D:\artifacts --offline
 
 This enforces that only pre-built wheels are installed. When using --requirements,
 the script will check that each requirement has at least one wheel available on PyPI
 before calling pip with --only-binary=:all:.
+
+With --artifact-store (or FABRIC_ARTIFACT_STORE) the wheels come from the content-addressed
+store the mirror scripts fill (see tools/artifact_store.py): pip downloads only what the
+store lacks and new wheels are added to it. pip installs straight from hardlinks of the
+stored wheels, so they are neither copied nor rehashed. --offline installs from the store
+alone. Wheels installed with --dir are added to the store as well.
 """
 from __future__ import annotations
 
@@ -17,6 +24,13 @@ from pathlib import Path
 import tempfile
 import shutil
 import json
+import os
+from urllib.parse import unquote, urlparse
+
+try:
+    from tools.artifact_store import ARTIFACT_STORE_ENV, DEFAULT_ARTIFACT_STORE_BYTES, ArtifactStore, link_or_copy
+except ImportError:
+    from artifact_store import ARTIFACT_STORE_ENV, DEFAULT_ARTIFACT_STORE_BYTES, ArtifactStore, link_or_copy
 
 
 def run(cmd, check=True):
@@ -42,7 +56,60 @@ def ensure_wheel_for_requirement(req: str) -> bool:
         return True
 
 
-def install_from_requirements(reqfile: Path) -> int:
+def install_from_store(reqfile: Path, store: ArtifactStore, offline: bool = False) -> int:
+    """Install requirements with wheels from the artifact store, downloading only what it lacks.
+
+    pip installs straight from hardlinks of the stored wheels, made in a scratch directory
+    inside the store so they stay on its filesystem; stored wheels are neither copied nor
+    rehashed. Only the wheels the store lacks are downloaded, hashed and added to it.
+    Resolving uses `pip install --report`, which needs pip 22.2 or later.
+    """
+    with tempfile.TemporaryDirectory(dir=store.root, prefix="install-") as scratch:
+        links_dir = os.path.join(scratch, "links")
+        new_dir = os.path.join(scratch, "new")
+        report_path = os.path.join(scratch, "report.json")
+        os.makedirs(links_dir)
+        os.makedirs(new_dir)
+        stored = store.filenames(".whl")
+        for filename, sha256 in stored.items():
+            link_or_copy(store.blob_path(sha256), os.path.join(links_dir, filename))
+        print(f"Artifact store offers {len(stored)} wheel(s)")
+
+        # Resolve without installing; the report names every wheel the requirements need
+        cmd = [sys.executable, "-m", "pip", "install", "--dry-run", "--ignore-installed", "--quiet",
+               "--report", report_path, "--only-binary=:all:", "--find-links", links_dir, "-r", str(reqfile)]
+        if offline:
+            cmd.insert(-2, "--no-index")
+        rc = run(cmd, check=False)
+        if rc != 0:
+            return rc
+        with open(report_path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+
+        missing = []
+        for item in report.get("install", []):
+            filename = unquote(os.path.basename(urlparse(item["download_info"]["url"]).path))
+            if filename in stored:
+                store.find(filename, stored[filename])  # counts as used for eviction
+            else:
+                missing.append(f"{item['metadata']['name']}=={item['metadata']['version']}")
+        if missing:
+            # pip's HTTP cache usually still holds these from the resolve, so they are not fetched twice
+            rc = run([sys.executable, "-m", "pip", "download", "--no-deps", "--only-binary=:all:",
+                      "-d", new_dir] + missing, check=False)
+            if rc != 0:
+                return rc
+            for name in sorted(os.listdir(new_dir)):
+                if name.endswith(".whl"):
+                    store.add_file(os.path.join(new_dir, name), source="pip")
+                    print(f"Added {name} to the artifact store")
+
+        cmd = [sys.executable, "-m", "pip", "install", "--only-binary=:all:", "--no-index",
+               "--find-links", links_dir, "--find-links", new_dir, "-r", str(reqfile)]
+        return run(cmd, check=False)
+
+
+def install_from_requirements(reqfile: Path, store: ArtifactStore | None = None, offline: bool = False) -> int:
     if not reqfile.exists():
         print(f"Requirements file {reqfile} not found", file=sys.stderr)
         return 2
@@ -51,6 +118,9 @@ def install_from_requirements(reqfile: Path) -> int:
     lines = [l.strip() for l in reqfile.read_text(encoding="utf-8").splitlines()]
     specs = [l for l in lines if l and not l.startswith("#")]
 
+    if store is not None and offline:
+        return install_from_store(reqfile, store, offline=True)
+
     missing = []
     for s in specs:
         ok = ensure_wheel_for_requirement(s.split()[0])
@@ -64,12 +134,15 @@ def install_from_requirements(reqfile: Path) -> int:
         print("Aborting wheel-only install.")
         return 3
 
+    if store is not None:
+        return install_from_store(reqfile, store)
+
     # delegate to pip
     cmd = [sys.executable, "-m", "pip", "install", "--only-binary=:all:", "-r", str(reqfile)]
     return run(cmd)
 
 
-def install_from_dir(wheels_dir: Path, no_deps: bool = False) -> int:
+def install_from_dir(wheels_dir: Path, no_deps: bool = False, store: ArtifactStore | None = None) -> int:
     if not wheels_dir.exists():
         print(f"Wheels directory {wheels_dir} not found", file=sys.stderr)
         return 4
@@ -79,6 +152,8 @@ def install_from_dir(wheels_dir: Path, no_deps: bool = False) -> int:
         return 5
 
     for w in whls:
+        if store is not None:
+            store.add_file(str(w), source="local")
         cmd = [sys.executable, "-m", "pip", "install", str(w)]
         if no_deps:
             cmd.insert(-1, "--no-deps")
@@ -91,6 +166,11 @@ def main(argv: list[str] | None = None):
     p.add_argument("--requirements", "-r", type=Path, help="requirements.txt file to install (wheel-only)")
     p.add_argument("--dir", "-d", type=Path, help="directory with .whl files to install")
     p.add_argument("--no-deps", action="store_true", help="pass --no-deps when installing local wheels")
+    p.add_argument("--artifact-store", type=Path, default=os.environ.get(ARTIFACT_STORE_ENV),
+                   help=f"shared artifact store to install from and add to (default ${ARTIFACT_STORE_ENV})")
+    p.add_argument("--artifact-store-max-gb", type=float, default=DEFAULT_ARTIFACT_STORE_BYTES / 1024 ** 3,
+                   help=f"evict least recently used artifacts above this size (default {DEFAULT_ARTIFACT_STORE_BYTES // 1024 ** 3})")
+    p.add_argument("--offline", action="store_true", help="install from the artifact store only, without an index")
     args = p.parse_args(argv)
 
     if args.requirements and args.dir:
@@ -101,10 +181,19 @@ def main(argv: list[str] | None = None):
         print("Specify --requirements or --dir", file=sys.stderr)
         return 7
 
-    if args.requirements:
-        return install_from_requirements(args.requirements)
+    if args.offline and not args.artifact_store:
+        print("--offline needs --artifact-store", file=sys.stderr)
+        return 8
+
+    store = ArtifactStore(str(args.artifact_store), int(args.artifact_store_max_gb * 1024 ** 3)) if args.artifact_store else None
+    try:
+        if args.requirements:
+            return install_from_requirements(args.requirements, store=store, offline=args.offline)
 
-    return install_from_dir(args.dir, no_deps=args.no_deps)
+        return install_from_dir(args.dir, no_deps=args.no_deps, store=store)
+    finally:
+        if store is not None:
+            store.close()
 
 
 if __name__ == "__main__":
@@ -3,9 +3,17 @@
 Mirror packages from a JFrog Artifactory (or any PyPI-compatible/simple index) into a Fabric Environment.
 
 Features:
-- Enumerates packages via PyPI "simple" index or Artifactory /api/storage listing
-- Downloads distributions into a local cache directory
-- Tracks uploaded artifacts in a JSON state file to avoid re-uploading
+- Enumerates packages via PyPI "simple" index (PEP 691 JSON when offered, revalidated with
+  ETag/If-Modified-Since so unchanged packages cost one 304). When the simple index is not
+  available, the repository's distribution files are listed once per run with a paginated
+  AQL query (or one /api/storage deep listing if AQL is refused) and looked up by
+  normalized package name
+- Runs on the shared mirror engine (tools/package_mirror.py): listing, downloads into a
+  local cache (--download-workers, --chunk-size-kb), hash verification and Fabric uploads
+  (--upload-workers) run as overlapped stages, so network and upload time overlap
+- Drops files the Fabric runtime cannot install (other Python versions, Windows/macOS/ARM
+  wheels) before downloading; --version-spec and --latest narrow the versions further
+- Tracks uploaded artifacts in a state store (JSON journal or SQLite) to avoid re-uploading
 - Uploads wheel files to Fabric staging using FabricEnvironmentManager from tools/upload_wheel_to_fabric.py
 
 Auth for JFrog:
@@ -20,17 +28,25 @@ Usage (Windows cmd.exe):
 """
 from __future__ import annotations
 import argparse
-import hashlib
 import json
 import os
-import re
-import shutil
 import sys
-import time
+import threading
 from typing import Any, Dict, Iterable, List, Optional
 
 import requests
 
+try:
+    from tools.package_mirror import (DOWNLOAD_CHUNK_SIZE, DOWNLOAD_WORKERS, VALID_DISTS, DistributionFilter,
+                                      FeedAdapter, MirrorEngine, MirrorState, SimpleIndexCache,
+                                      add_mirror_arguments, fetch_simple_index, normalize_project_name,
+                                      parse_distribution_filename, run_mirror)
+except ImportError:
+    from package_mirror import (DOWNLOAD_CHUNK_SIZE, DOWNLOAD_WORKERS, VALID_DISTS, DistributionFilter,
+                                FeedAdapter, MirrorEngine, MirrorState, SimpleIndexCache,
+                                add_mirror_arguments, fetch_simple_index, normalize_project_name,
+                                parse_distribution_filename, run_mirror)
+
 # Try to import the Fabric manager
 try:
     from tools.upload_wheel_to_fabric import FabricEnvironmentManager
@@ -41,7 +57,7 @@ except Exception:
         FabricEnvironmentManager = None
 
 STATE_FILENAME = "jfrog_mirror_state.json"
-VALID_DISTS = (".whl", ".tar.gz", ".zip")
+AQL_PAGE_SIZE = 5000
 
 
 def safe_print(*args, **kwargs):
@@ -57,48 +73,6 @@ def safe_print(*args, **kwargs):
         print(*out, **kwargs)
 
 
-def sha256_of_file(path: str) -> str:
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
-    return h.hexdigest()
-
-
-class MirrorState:
-    def __init__(self, path: str):
-        self.path = path
-        self._data: Dict[str, Dict[str, Any]] = {}
-        if os.path.exists(path):
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    self._data = json.load(f)
-            except Exception:
-                safe_print("WARNING: Could not read existing state file; starting fresh")
-                self._data = {}
-
-    def save(self) -> None:
-        tmp = self.path + ".tmp"
-        with open(tmp, "w", encoding="utf-8") as f:
-            json.dump(self._data, f, indent=2, sort_keys=True)
-        shutil.move(tmp, self.path)
-
-    def is_uploaded(self, pkg_name: str, filename: str, sha256: str) -> bool:
-        key = f"{pkg_name}:{filename}"
-        rec = self._data.get(key)
-        return bool(rec and rec.get("sha256") == sha256 and rec.get("uploaded") is True)
-
-    def mark_uploaded(self, pkg_name: str, filename: str, sha256: str, upload_meta: dict) -> None:
-        key = f"{pkg_name}:{filename}"
-        self._data[key] = {
-            "sha256": sha256,
-            "uploaded": True,
-            "upload_meta": upload_meta,
-            "ts": int(time.time()),
-        }
-        self.save()
-
-
 def artifactory_list(repo_base: str, repo: str, session: requests.Session) -> Iterable[Dict[str, Any]]:
     """
     List files in an Artifactory repository using the storage API.
@@ -116,120 +90,151 @@ def artifactory_list(repo_base: str, repo: str, session: requests.Session) -> It
         yield f
 
 
-def pypi_simple_list(base: str, pkg_name: str, session: requests.Session) -> List[str]:
+def artifactory_aql_list(repo_base: str, repo: str, session: requests.Session,
+                         page_size: int = AQL_PAGE_SIZE) -> Iterable[Dict[str, Any]]:
+    """
+    List the distribution files of an Artifactory repository with AQL.
+    Calls: POST {repo_base}/api/search/aql, one page of `page_size` items at a time
+    Yields items with 'path', 'name', 'sha256' and 'size'. Only the matching files are
+    returned, in a stable order, instead of a deep listing of the whole repository.
+    """
+    api_url = f"{repo_base.rstrip('/')}/api/search/aql"
+    criteria = {"repo": repo, "type": "file",
+                "$or": [{"name": {"$match": f"*{suffix}"}} for suffix in VALID_DISTS]}
+    offset = 0
+    while True:
+        query = (f"items.find({json.dumps(criteria)})"
+                 '.include("path","name","sha256","size")'
+                 f'.sort({{"$asc":["path","name"]}}).offset({offset}).limit({page_size})')
+        safe_print(f"INFO: Listing Artifactory repo {repo} via AQL (offset {offset})")
+        r = session.post(api_url, data=query, headers={"Content-Type": "text/plain"}, timeout=60)
+        r.raise_for_status()
+        results = r.json().get("results", [])
+        yield from results
+        if len(results) < page_size:
+            return
+        offset += page_size
+
+
+class ArtifactoryRepoIndex:
+    """The repository's distribution files, listed once per run and indexed by normalized package name.
+
+    Built on first use with `artifactory_aql_list`; if the server refuses AQL, one
+    `artifactory_list` deep listing is used instead. Safe to share between threads.
+    """
+
+    def __init__(self, jfrog_base: str, repo: str):
+        self.jfrog_base = jfrog_base
+        self.repo = repo
+        self._by_name: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _load(self, session: requests.Session) -> Dict[str, List[Dict[str, Any]]]:
+        try:
+            entries = [{"uri": "/" + "/".join(p for p in (item.get("path"), item["name"]) if p and p != "."),
+                        "sha2": item.get("sha256")}
+                       for item in artifactory_aql_list(self.jfrog_base, self.repo, session)]
+        except (requests.RequestException, ValueError) as e:
+            safe_print(f"WARNING: AQL search failed ({e}), falling back to one Artifactory storage listing")
+            entries = list(artifactory_list(self.jfrog_base, self.repo, session))
+
+        by_name: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in entries:
+            info = determine_files_from_artifactory_entry(self.jfrog_base, self.repo, entry)
+            parsed = parse_distribution_filename(info["filename"]) if info else None
+            if parsed:
+                by_name.setdefault(normalize_project_name(parsed["name"]), []).append(info)
+        safe_print(f"INFO: Indexed {sum(map(len, by_name.values()))} files for {len(by_name)} packages in {self.repo}")
+        return by_name
+
+    def entries(self, pkg_name: str, session: requests.Session) -> List[Dict[str, Any]]:
+        with self._lock:
+            if self._by_name is None and self._error is None:
+                try:
+                    self._by_name = self._load(session)
+                except Exception as e:
+                    # Remember the failure so the remaining packages do not each list the repo again
+                    self._error = str(e)
+        if self._error is not None:
+            raise RuntimeError(f"Artifactory listing of {self.repo} failed: {self._error}")
+        return list(self._by_name.get(normalize_project_name(pkg_name), []))
+
+
+def pypi_simple_list(base: str, pkg_name: str, session: requests.Session,
+                     index_cache: Optional[SimpleIndexCache] = None) -> List[Dict[str, Any]]:
     idx = base.rstrip("/") + f"/simple/{pkg_name}/"
     safe_print(f"INFO: Fetching simple index {idx}")
-    r = session.get(idx, timeout=30)
-    r.raise_for_status()
-    html = r.text
-    hrefs = re.findall(r'href=["\']([^"\']+)["\']', html, flags=re.IGNORECASE)
-    out = []
-    for u in hrefs:
-        if u.startswith("http"):
-            out.append(u)
-        else:
-            out.append(idx.rstrip("/") + "/" + u.lstrip("/"))
-    return out
-
-
-def download_url_to_path(session: requests.Session, url: str, dest_path: str, max_retries: int = 3) -> None:
-    attempts = 0
-    while attempts < max_retries:
-        attempts += 1
-        try:
-            with session.get(url, stream=True, timeout=60) as r:
-                r.raise_for_status()
-                tmp = dest_path + ".part"
-                with open(tmp, "wb") as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                shutil.move(tmp, dest_path)
-            return
-        except Exception as e:
-            safe_print(f"WARNING: Download attempt {attempts}/{max_retries} failed for {url}: {e}")
-            if attempts >= max_retries:
-                raise
-            time.sleep(2 ** (attempts - 1))
+    return fetch_simple_index(session, idx, index_cache)
 
 
-def determine_files_from_artifactory_entry(base_url: str, repo: str, entry: dict) -> Optional[Dict[str, str]]:
+def determine_files_from_artifactory_entry(base_url: str, repo: str, entry: dict) -> Optional[Dict[str, Any]]:
     uri = entry.get("uri")
     if not uri:
         return None
     full_url = base_url.rstrip("/") + f"/{repo}" + uri
     filename = os.path.basename(uri)
-    return {"url": full_url, "filename": filename}
+    return {"url": full_url, "filename": filename, "sha256": entry.get("sha2")}
 
 
-def mirror_package_from_jfrog(pkg_name: str, jfrog_base: str, repo: str, session: requests.Session,
-                             cache_dir: str, state: MirrorState, fabric_mgr: FabricEnvironmentManager,
-                             upload_wheels_only: bool = True, publish_after: bool = False) -> None:
-    os.makedirs(cache_dir, exist_ok=True)
-    safe_print(f"INFO: Mirroring package: {pkg_name}")
+def list_package_entries_jfrog(pkg_name: str, jfrog_base: str, repo: str, session: requests.Session,
+                               index_cache: Optional[SimpleIndexCache] = None,
+                               repo_index: Optional[ArtifactoryRepoIndex] = None) -> List[Dict[str, Any]]:
+    """Return the distribution files ({"url", "filename", "sha256"}) available for a package.
 
-    entries: List[Dict[str, str]] = []
+    Pass the same `repo_index` for every package of a run so the fallback lists the
+    repository only once.
+    """
+    entries: List[Dict[str, Any]] = []
     # Try simple index first
     try:
-        urls = pypi_simple_list(jfrog_base.rstrip('/') + f"/{repo}", pkg_name, session)
-        for u in urls:
-            fname = os.path.basename(u.split('?')[0])
-            entries.append({"url": u, "filename": fname})
+        entries.extend(pypi_simple_list(jfrog_base.rstrip('/') + f"/{repo}", pkg_name, session, index_cache))
     except Exception:
-        safe_print("WARNING: Simple index fetch failed, falling back to Artifactory storage API")
-        for entry in artifactory_list(jfrog_base, repo, session):
-            info = determine_files_from_artifactory_entry(jfrog_base, repo, entry)
-            if info:
-                entries.append(info)
+        safe_print("WARNING: Simple index fetch failed, falling back to the Artifactory repository listing")
+        entries.extend((repo_index or ArtifactoryRepoIndex(jfrog_base, repo)).entries(pkg_name, session))
 
     safe_print(f"INFO: Found {len(entries)} items for {pkg_name}")
-    entries = [e for e in entries if e["filename"].lower().endswith(VALID_DISTS)]
-    if not entries:
-        safe_print("WARNING: No distribution files found; skipping")
-        return
-
-    for e in entries:
-        filename = e["filename"]
-        url = e["url"]
-        local_path = os.path.join(cache_dir, filename)
-
-        if not os.path.exists(local_path):
-            safe_print(f"Downloading {filename} from {url}")
-            try:
-                download_url_to_path(session, url, local_path)
-            except Exception as ex:
-                safe_print(f"ERROR: Failed to download {url}: {ex}")
-                continue
-
-        sha256 = sha256_of_file(local_path)
-        if state.is_uploaded(pkg_name, filename, sha256):
-            safe_print(f"INFO: Already uploaded {filename}, skipping")
-            continue
-
-        if upload_wheels_only and not filename.lower().endswith('.whl'):
-            safe_print(f"INFO: Skipping non-wheel {filename} (enable sdist handling if needed)")
-            continue
-        safe_print(f"Uploading {filename} to Fabric (workspace={fabric_mgr.workspace_id})")
-        try:
-            upload_result = fabric_mgr.upload_wheel(local_path, max_retries=3)
-            if upload_result.get("success"):
-                state.mark_uploaded(pkg_name, filename, sha256, upload_result)
-                safe_print(f"INFO: Uploaded and recorded: {filename}")
-            else:
-                safe_print(f"ERROR: Upload failed for {filename}: {upload_result.get('error')}")
-        except Exception as ex:
-            safe_print(f"ERROR: Exception during upload of {filename}: {ex}")
+    return [e for e in entries if e["filename"].lower().endswith(VALID_DISTS)]
+
+
+class JFrogAdapter(FeedAdapter):
+    """Artifactory PyPI repository: simple index first, one repository listing per run as the fallback."""
+
+    name = "JFrog Artifactory"
+
+    def __init__(self, jfrog_base: str, repo: str):
+        self.jfrog_base = jfrog_base
+        self.repo = repo
+        self.repo_index = ArtifactoryRepoIndex(jfrog_base, repo)
+
+    def list_entries(self, pkg_name: str, session: requests.Session,
+                     index_cache: Optional[SimpleIndexCache] = None) -> List[Dict[str, Any]]:
+        return list_package_entries_jfrog(pkg_name, self.jfrog_base, self.repo, session, index_cache,
+                                          repo_index=self.repo_index)
 
-    if publish_after:
-        safe_print("INFO: Publishing environment after uploads")
-        try:
-            pub = fabric_mgr.publish_environment()
-            if pub.get("success"):
-                safe_print("INFO: Publish succeeded")
-            else:
-                safe_print(f"WARNING: Publish returned error: {pub.get('error')}")
-        except Exception as e:
-            safe_print(f"ERROR: Publish failed: {e}")
+
+def mirror_packages_from_jfrog(pkg_names: List[str], jfrog_base: str, repo: str, session: requests.Session,
+                               cache_dir: str, state: MirrorState, fabric_mgr: FabricEnvironmentManager,
+                               upload_wheels_only: bool = True, publish_after: bool = False,
+                               download_workers: int = DOWNLOAD_WORKERS, chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+                               dist_filter: Optional[DistributionFilter] = None) -> Dict[str, int]:
+    """Mirror many packages through the pipelined `MirrorEngine`, publishing once at the end."""
+    engine = MirrorEngine(JFrogAdapter(jfrog_base, repo), session, cache_dir, state, fabric_mgr,
+                          dist_filter=dist_filter, upload_wheels_only=upload_wheels_only,
+                          download_workers=download_workers, chunk_size=chunk_size)
+    return engine.run(pkg_names, publish_after=publish_after)
+
+
+def mirror_package_from_jfrog(pkg_name: str, jfrog_base: str, repo: str, session: requests.Session,
+                             cache_dir: str, state: MirrorState, fabric_mgr: FabricEnvironmentManager,
+                             upload_wheels_only: bool = True, publish_after: bool = False,
+                             download_workers: int = DOWNLOAD_WORKERS, chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+                             dist_filter: Optional[DistributionFilter] = None) -> Dict[str, int]:
+    safe_print(f"INFO: Mirroring package: {pkg_name}")
+    return mirror_packages_from_jfrog([pkg_name], jfrog_base, repo, session, cache_dir, state, fabric_mgr,
+                                      upload_wheels_only=upload_wheels_only, publish_after=publish_after,
+                                      download_workers=download_workers, chunk_size=chunk_size,
+                                      dist_filter=dist_filter)
 
 
 def build_jfrog_session(api_key: Optional[str], username: Optional[str], password: Optional[str]) -> requests.Session:
@@ -245,20 +250,10 @@ def main(argv: Optional[List[str]] = None) -> None:
     parser = argparse.ArgumentParser(description="Mirror packages from JFrog/Artifactory into Fabric Environment.")
     parser.add_argument("--jfrog-base", required=True, help="Artifactory base URL (e.g. https://myjfrog.example/artifactory)")
     parser.add_argument("--repo", required=True, help="Repository name in Artifactory")
-    parser.add_argument("--package-name", help="Single package name to mirror")
-    parser.add_argument("--package-list-file", help="File with package names (one per line)")
     parser.add_argument("--jfrog-api-key", help="JFrog API key (X-JFrog-Art-Api header)")
     parser.add_argument("--jfrog-user", help="JFrog username for basic auth")
     parser.add_argument("--jfrog-pass", help="JFrog password for basic auth")
-    parser.add_argument("--cache", default=".jfrog_mirror_cache", help="Local cache directory")
-    parser.add_argument("--workspace-id", required=True, help="Fabric workspace id")
-    parser.add_argument("--environment-id", required=True, help="Fabric environment id")
-    parser.add_argument("--publish", action="store_true", help="Publish environment after uploads")
-    parser.add_argument("--upload-wheels-only", action="store_true", default=True, help="Upload only wheel files (default True)")
-    parser.add_argument("--fabric-token", help="Fabric bearer token")
-    parser.add_argument("--fabric-client-id", help="Fabric service principal client id")
-    parser.add_argument("--fabric-client-secret", help="Fabric service principal client secret")
-    parser.add_argument("--fabric-tenant-id", help="Fabric tenant id")
+    add_mirror_arguments(parser, default_cache=".jfrog_mirror_cache")
     args = parser.parse_args(argv)
 
     if FabricEnvironmentManager is None:
@@ -266,34 +261,10 @@ def main(argv: Optional[List[str]] = None) -> None:
         sys.exit(2)
 
     session = build_jfrog_session(args.jfrog_api_key, args.jfrog_user, args.jfrog_pass)
-
-    fabric_mgr = FabricEnvironmentManager(
-        workspace_id=args.workspace_id,
-        environment_id=args.environment_id,
-        token=args.fabric_token,
-        client_id=args.fabric_client_id,
-        client_secret=args.fabric_client_secret,
-        tenant_id=args.fabric_tenant_id,
-    )
-
-    cache_dir = args.cache
-    os.makedirs(cache_dir, exist_ok=True)
-    state = MirrorState(os.path.join(cache_dir, STATE_FILENAME))
-
-    pkg_iter: Iterable[str] = ()
-    if args.package_name:
-        pkg_iter = [args.package_name]
-    elif args.package_list_file:
-        with open(args.package_list_file, "r", encoding="utf-8") as f:
-            pkg_iter = [ln.strip() for ln in f if ln.strip()]
-    else:
-        safe_print("ERROR: No package source provided. Use --package-name or --package-list-file.")
-        sys.exit(2)
-
-    for pkg in pkg_iter:
-        safe_print(f"Processing package {pkg}")
-        mirror_package_from_jfrog(pkg, args.jfrog_base, args.repo, session, cache_dir, state, fabric_mgr, upload_wheels_only=args.upload_wheels_only, publish_after=args.publish)
-
+    stats = run_mirror(parser, args, JFrogAdapter(args.jfrog_base, args.repo), session, FabricEnvironmentManager, STATE_FILENAME)
+    if stats.get("failed"):
+        safe_print(f"ERROR: Mirror run finished with {stats['failed']} failure(s)")
+        sys.exit(1)
     safe_print("Mirror run complete")
 
 
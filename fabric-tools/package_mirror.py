@@ -0,0 +1,1411 @@
+#!/usr/bin/env python3
+"""
+The mirroring engine behind jfrog_to_fabric_sync.py, azure_devops_to_fabric_sync.py and
+simple_index_to_fabric_sync.py, plus its building blocks.
+
+Engine
+- `MirrorEngine` reads a feed through a `FeedAdapter` (JFrog, Azure Artifacts or a plain
+  `SimpleIndexAdapter`) and runs list -> fetch -> verify -> upload as overlapped stages
+  connected by bounded queues, so listing, downloads and Fabric uploads run together.
+- `add_mirror_arguments` and `run_mirror` give every mirror script the same command line.
+
+Dependencies
+- With --with-deps, `DependencyResolver` expands the requested packages to their
+  dependency closure before the pipeline starts, evaluating markers for the Fabric
+  runtimes. Requires-Dist comes from PEP 658 `.metadata` files or from the wheel's
+  METADATA read with Range requests (`HttpRangeFile`), never from whole wheels when the
+  server supports ranges, and is cached per file in `.core_metadata_cache.json`.
+
+Artifact cache
+- Downloaded files go into an `ArtifactCache`: `FlatArtifactCache` (default) keeps them
+  by file name in the script's --cache directory; with --artifact-store the shared,
+  content-addressed `ArtifactStore` from artifact_store.py dedupes them across feeds
+  and with install_wheels_only.py, and evicts least recently used files above a cap.
+
+State stores
+- The mirror state records which (package, file, sha256) was already uploaded to Fabric.
+- `JournalMirrorState` (default) keeps the familiar JSON snapshot and appends each new
+  record to a `.journal` file next to it, so an upload costs one small append instead of
+  rewriting the whole file. The journal is folded into the snapshot every
+  `compact_every` records and when the store is closed.
+- `SqliteMirrorState` keeps the records in SQLite (WAL mode), which allows several
+  mirror processes to share one state file.
+Both give O(1) lookups and are safe to use from several threads.
+
+Index pages
+- `fetch_simple_index` asks for the PEP 691 JSON project page and falls back to PEP 503
+  HTML, returning each file's sha256, requires-python and yanked flag.
+- `SimpleIndexCache` keeps the pages with their ETag/Last-Modified and revalidates them
+  with conditional requests, so a package that did not change costs one 304.
+
+Downloads
+- `MirrorEngine` fetches files concurrently (bounded by `max_workers`) through one
+  session whose connection pool is sized with `mount_connection_pool`, streaming each
+  file in `chunk_size` pieces (1 MB by default).
+- Files are hashed while they stream; a `#sha256=` digest from the index is verified
+  before the file enters the cache. `HashIndex` remembers digests of cached files so
+  they are rehashed only when their size or mtime changes.
+- An interrupted download keeps its `.part` file and resumes it with a Range request
+  (If-Range guards against the file changing in between); the finished file is still
+  checked against the index hash. Failures back off exponentially per host
+  (`HostBackoff`), honouring Retry-After.
+
+Filtering
+- `DistributionFilter` drops files before anything is downloaded: versions outside a
+  specifier, versions older than the latest N, and wheels whose tags the target Fabric
+  runtime cannot load (default: CPython 3.10/3.11 on manylinux x86_64, or pure Python).
+  Yanked files and files whose requires-python excludes the runtime are dropped too.
+  Version and requires-python checks need the `packaging` package.
+"""
+from __future__ import annotations
+
+import abc
+import argparse
+import email.parser
+import hashlib
+import html
+import io
+import json
+import os
+import queue
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from packaging.requirements import InvalidRequirement, Requirement
+    from packaging.specifiers import InvalidSpecifier, SpecifierSet
+    from packaging.version import InvalidVersion, Version
+    PACKAGING_AVAILABLE = True
+except ImportError:
+    PACKAGING_AVAILABLE = False
+
+try:
+    from tools.artifact_store import ARTIFACT_STORE_ENV, DEFAULT_ARTIFACT_STORE_BYTES, ArtifactCache, ArtifactStore
+except ImportError:
+    from artifact_store import ARTIFACT_STORE_ENV, DEFAULT_ARTIFACT_STORE_BYTES, ArtifactCache, ArtifactStore
+
+STATE_BACKENDS = ("journal", "sqlite")
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_WORKERS = 8
+UPLOAD_WORKERS = 2
+PIPELINE_QUEUE_SIZE = 64
+FABRIC_PYTHON_VERSIONS = ("3.10", "3.11")
+FABRIC_MAX_GLIBC = (2, 35)
+SDIST_SUFFIXES = (".tar.gz", ".zip")
+VALID_DISTS = (".whl",) + SDIST_SUFFIXES
+SIMPLE_JSON_CONTENT_TYPE = "application/vnd.pypi.simple.v1+json"
+SIMPLE_INDEX_ACCEPT = (f"{SIMPLE_JSON_CONTENT_TYPE}, application/vnd.pypi.simple.v1+html;q=0.2, "
+                       "text/html;q=0.01")
+
+
+_print_lock = threading.Lock()
+
+
+def safe_print(*args, **kwargs):
+    # Pipeline stages print from many threads; keep each message on its own line
+    with _print_lock:
+        try:
+            print(*args, **kwargs)
+        except UnicodeEncodeError:
+            out = []
+            for a in args:
+                if isinstance(a, str):
+                    out.append(a.encode("ascii", "replace").decode("ascii"))
+                else:
+                    out.append(str(a))
+            print(*out, **kwargs)
+
+
+class MirrorState(abc.ABC):
+    """Interface of the mirror state stores."""
+
+    @staticmethod
+    def key(pkg_name: str, filename: str) -> str:
+        return f"{pkg_name}:{filename}"
+
+    @abc.abstractmethod
+    def get(self, pkg_name: str, filename: str) -> Optional[Dict[str, Any]]:
+        """The record stored for `filename` of `pkg_name`, or None."""
+
+    def is_uploaded(self, pkg_name: str, filename: str, sha256: str) -> bool:
+        rec = self.get(pkg_name, filename)
+        return bool(rec and rec.get("sha256") == sha256 and rec.get("uploaded") is True)
+
+    @abc.abstractmethod
+    def mark_uploaded(self, pkg_name: str, filename: str, sha256: str, upload_meta: dict) -> None:
+        """Record that `filename` with digest `sha256` was uploaded."""
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "MirrorState":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class JournalMirrorState(MirrorState):
+    """JSON snapshot plus an append-only journal of records added since the last compaction."""
+
+    def __init__(self, path: str, compact_every: int = 1000):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.compact_every = compact_every
+        self._data: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except Exception:
+                safe_print("WARNING: Could not read existing state file; starting fresh")
+                self._data = {}
+        torn = False
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        # A torn last line from an interrupted run; everything before it is intact
+                        torn = True
+                        continue
+                    if not isinstance(rec, dict) or not isinstance(rec.get("key"), str):
+                        # Not a record this store wrote; drop it like a torn line
+                        torn = True
+                        continue
+                    self._data[rec.pop("key")] = rec
+                    self._pending += 1
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        if torn:
+            # Start a clean journal so new records are not appended to the torn line
+            self._compact()
+
+    def get(self, pkg_name: str, filename: str) -> Optional[Dict[str, Any]]:
+        return self._data.get(self.key(pkg_name, filename))
+
+    def mark_uploaded(self, pkg_name: str, filename: str, sha256: str, upload_meta: dict) -> None:
+        rec = {
+            "sha256": sha256,
+            "uploaded": True,
+            "upload_meta": upload_meta,
+            "ts": int(time.time()),
+        }
+        key = self.key(pkg_name, filename)
+        with self._lock:
+            self._data[key] = rec
+            self._journal.write(json.dumps({"key": key, **rec}, sort_keys=True) + "\n")
+            self._journal.flush()
+            self._pending += 1
+            if self._pending >= self.compact_every:
+                self._compact()
+
+    def _compact(self) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._data, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+        # The snapshot now holds every journal record, so the journal can start over
+        self._journal.close()
+        self._journal = open(self.journal_path, "w", encoding="utf-8")
+        self._pending = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._journal.closed:
+                return
+            if self._pending:
+                self._compact()
+            self._journal.close()
+
+
+class SqliteMirrorState(MirrorState):
+    """Mirror state in SQLite (WAL mode); several threads or processes may write concurrently."""
+
+    def __init__(self, path: str, legacy_json_path: Optional[str] = None):
+        self.path = path
+        self._local = threading.local()
+        # Every thread's connection, so close() can reach the ones opened by worker threads
+        self._conns: List[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS mirror_state ("
+            " key TEXT PRIMARY KEY, sha256 TEXT NOT NULL, uploaded INTEGER NOT NULL,"
+            " upload_meta TEXT, ts INTEGER NOT NULL)"
+        )
+        conn.commit()
+        if legacy_json_path and os.path.exists(legacy_json_path):
+            self._import_json(legacy_json_path)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Each connection is used by its own thread only, but close() runs on another one
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def _import_json(self, json_path: str) -> None:
+        """Seed an empty database from the JSON state file of earlier runs."""
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM mirror_state LIMIT 1").fetchone():
+            return
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            safe_print("WARNING: Could not read existing state file; starting fresh")
+            return
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO mirror_state VALUES (?, ?, ?, ?, ?)",
+                [(key, rec.get("sha256", ""), int(bool(rec.get("uploaded"))),
+                  json.dumps(rec.get("upload_meta")), int(rec.get("ts", 0))) for key, rec in data.items()],
+            )
+
+    def get(self, pkg_name: str, filename: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT sha256, uploaded, upload_meta, ts FROM mirror_state WHERE key = ?",
+            (self.key(pkg_name, filename),),
+        ).fetchone()
+        if not row:
+            return None
+        return {"sha256": row[0], "uploaded": bool(row[1]), "upload_meta": json.loads(row[2] or "null"), "ts": row[3]}
+
+    def mark_uploaded(self, pkg_name: str, filename: str, sha256: str, upload_meta: dict) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO mirror_state VALUES (?, ?, 1, ?, ?)",
+                (self.key(pkg_name, filename), sha256, json.dumps(upload_meta), int(time.time())),
+            )
+
+    def close(self) -> None:
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            conn.close()
+        # Threads that use the store again get a fresh connection
+        self._local = threading.local()
+
+
+def open_mirror_state(cache_dir: str, state_filename: str, backend: str = "journal") -> MirrorState:
+    """Open the state store for a mirror; `state_filename` is the script's JSON state file name."""
+    json_path = os.path.join(cache_dir, state_filename)
+    if backend == "sqlite":
+        return SqliteMirrorState(os.path.splitext(json_path)[0] + ".db", legacy_json_path=json_path)
+    if backend == "journal":
+        return JournalMirrorState(json_path)
+    raise ValueError(f"Unknown state backend: {backend} (expected one of {', '.join(STATE_BACKENDS)})")
+
+
+def mount_connection_pool(session: requests.Session, pool_size: int) -> requests.Session:
+    """Size the session's connection pool so `pool_size` concurrent downloads reuse connections."""
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=max(pool_size, 10))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class JsonIndexFile:
+    """A small JSON dictionary kept in a hidden file of a cache directory.
+
+    Updates stay in memory (thread-safe) until `save`, which replaces the file atomically.
+    An unreadable file is treated as empty.
+    """
+
+    FILENAME = ".index.json"
+
+    def __init__(self, cache_dir: str):
+        self.path = os.path.join(cache_dir, self.FILENAME)
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except Exception:
+                self._data = {}
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._data, f)
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+
+class HashIndex(JsonIndexFile):
+    """SHA-256 of the files in a cache directory, keyed by file name, size and mtime.
+
+    A cached file is only rehashed when its size or mtime changed since it was recorded.
+    Downloads record the digest they computed while streaming, so a fresh file is never
+    read back just to hash it. The index is kept in `.sha256_index.json` in the directory.
+    """
+
+    FILENAME = ".sha256_index.json"
+
+    def sha256(self, path: str) -> str:
+        stat = os.stat(path)
+        name = os.path.basename(path)
+        with self._lock:
+            rec = self._data.get(name)
+        if rec and rec["size"] == stat.st_size and rec["mtime_ns"] == stat.st_mtime_ns:
+            return rec["sha256"]
+        digest = sha256_of_file(path)
+        self.record(path, digest)
+        return digest
+
+    def record(self, path: str, digest: str) -> None:
+        stat = os.stat(path)
+        with self._lock:
+            self._data[os.path.basename(path)] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+            self._dirty = True
+
+
+def sha256_of_file(path: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def parse_index_href(url: str) -> Dict[str, Optional[str]]:
+    """Split a simple-index link into {"url", "filename", "sha256"} (sha256 from a `#sha256=` fragment)."""
+    url, _, fragment = url.partition("#")
+    expected = None
+    for part in fragment.split("&"):
+        algorithm, _, value = part.partition("=")
+        if algorithm == "sha256" and value:
+            expected = value.lower()
+    return {"url": url, "filename": os.path.basename(url.split("?")[0]), "sha256": expected}
+
+
+def _html_attribute(tag: str, name: str) -> Optional[str]:
+    match = re.search(rf'\b{name}\s*=\s*["\']([^"\']*)["\']', tag, flags=re.IGNORECASE)
+    if match:
+        return html.unescape(match.group(1))
+    # PEP 592 allows a bare data-yanked attribute
+    return "" if re.search(rf'\s{name}(?=[\s>/])', tag, flags=re.IGNORECASE) else None
+
+
+def _core_metadata_flag(value: Any) -> Any:
+    """Normalize a PEP 658/714 metadata marker to False, True or the metadata file's sha256."""
+    if isinstance(value, dict):
+        return value.get("sha256") or True
+    if isinstance(value, str):
+        algorithm, _, digest = value.partition("=")
+        if algorithm == "sha256" and digest:
+            return digest.lower()
+        return value.lower() != "false"
+    return bool(value)
+
+
+def parse_simple_html(index_url: str, text: str) -> List[Dict[str, Any]]:
+    """Files of a PEP 503 HTML project page, with the PEP 592/658 yanked, requires-python and metadata attributes."""
+    entries = []
+    for tag in re.findall(r"<a\s[^>]*>", text, flags=re.IGNORECASE):
+        href = _html_attribute(tag, "href")
+        if not href:
+            continue
+        entry = parse_index_href(urljoin(index_url, href))
+        entry["requires_python"] = _html_attribute(tag, "data-requires-python") or None
+        entry["yanked"] = _html_attribute(tag, "data-yanked") is not None
+        # PEP 714 renamed PEP 658's data-dist-info-metadata; value is "true" or "<hash>=<digest>"
+        metadata = _html_attribute(tag, "data-core-metadata")
+        if metadata is None:
+            metadata = _html_attribute(tag, "data-dist-info-metadata")
+        entry["core_metadata"] = _core_metadata_flag(metadata)
+        entries.append(entry)
+    return entries
+
+
+def parse_simple_json(index_url: str, project: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Files of a PEP 691 JSON project page."""
+    entries = []
+    for file_info in project.get("files", []):
+        entry = parse_index_href(urljoin(index_url, file_info["url"]))
+        entry["filename"] = file_info.get("filename") or entry["filename"]
+        entry["sha256"] = (file_info.get("hashes") or {}).get("sha256") or entry["sha256"]
+        entry["requires_python"] = file_info.get("requires-python") or None
+        # `yanked` is either a boolean or the yank reason
+        entry["yanked"] = bool(file_info.get("yanked"))
+        entry["core_metadata"] = _core_metadata_flag(file_info.get("core-metadata", file_info.get("dist-info-metadata")))
+        entries.append(entry)
+    return entries
+
+
+class SimpleIndexCache(JsonIndexFile):
+    """Parsed simple-index pages with their ETag and Last-Modified validators.
+
+    `fetch_simple_index` revalidates a cached page with If-None-Match/If-Modified-Since, so
+    a package that did not change since the last run costs a single 304 response. The cache
+    is kept in `.simple_index_cache.json` in the mirror's cache directory.
+    """
+
+    FILENAME = ".simple_index_cache.json"
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._data.get(url)
+
+    def store(self, url: str, entries: List[Dict[str, Any]], etag: Optional[str], last_modified: Optional[str]) -> None:
+        if not etag and not last_modified:
+            return
+        with self._lock:
+            self._data[url] = {"etag": etag, "last_modified": last_modified, "entries": entries}
+            self._dirty = True
+
+
+def fetch_simple_index(session: requests.Session, index_url: str,
+                       cache: Optional[SimpleIndexCache] = None) -> List[Dict[str, Any]]:
+    """Files ({"url", "filename", "sha256", "requires_python", "yanked", "core_metadata"}) on a project page.
+
+    Asks for the PEP 691 JSON form and falls back to HTML when the server only offers that.
+    With a cache, the request is conditional and a 304 returns the cached files.
+    """
+    headers = {"Accept": SIMPLE_INDEX_ACCEPT}
+    cached = cache.get(index_url) if cache else None
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    r = session.get(index_url, headers=headers, timeout=30)
+    if r.status_code == 304 and cached:
+        return cached["entries"]
+    r.raise_for_status()
+
+    content_type = r.headers.get("Content-Type", "").split(";")[0].strip().lower()
+    if content_type == SIMPLE_JSON_CONTENT_TYPE:
+        entries = parse_simple_json(r.url or index_url, r.json())
+    else:
+        entries = parse_simple_html(r.url or index_url, r.text)
+    if cache:
+        cache.store(index_url, entries, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+    return entries
+
+
+class HostBackoff:
+    """Exponential backoff shared by every download from the same host.
+
+    Each failure against a host doubles the pause before the next request to it (up to
+    `max_delay`), and a success resets it, so a struggling server is given room by all
+    workers at once instead of being retried by each of them independently.
+    """
+
+    def __init__(self, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._failures: Dict[str, int] = {}
+        self._not_before: Dict[str, float] = {}
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return urlsplit(url).netloc.lower()
+
+    def wait(self, url: str) -> None:
+        with self._lock:
+            delay = self._not_before.get(self._host(url), 0.0) - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def failure(self, url: str, retry_after: Optional[float] = None) -> float:
+        host = self._host(url)
+        with self._lock:
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+            delay = min(self.max_delay, self.base_delay * 2 ** (failures - 1))
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            self._not_before[host] = max(self._not_before.get(host, 0.0), time.monotonic() + delay)
+        return delay
+
+    def success(self, url: str) -> None:
+        host = self._host(url)
+        with self._lock:
+            self._failures.pop(host, None)
+            self._not_before.pop(host, None)
+
+
+def _retry_after_seconds(response: Optional[requests.Response]) -> Optional[float]:
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+def download_url_to_path(session: requests.Session, url: str, dest_path: str, max_retries: int = 3,
+                         chunk_size: int = DOWNLOAD_CHUNK_SIZE, expected_sha256: Optional[str] = None,
+                         backoff: Optional[HostBackoff] = None) -> str:
+    """Download `url` to `dest_path`, hashing the bytes as they arrive; returns the SHA-256.
+
+    Bytes are written to `dest_path + ".part"`. When a transfer breaks off, the next
+    attempt (or the next run) resumes the `.part` file with a Range request; servers that
+    ignore the range simply send the whole file again. Attempts that got further than any
+    earlier one do not count against `max_retries`. With `expected_sha256`, a mismatching
+    file is discarded and downloaded again from the start.
+    """
+    backoff = backoff or HostBackoff()
+    tmp = dest_path + ".part"
+    validator: Optional[str] = None
+    furthest = 0
+    attempts = 0
+    while True:
+        backoff.wait(url)
+        offset = os.path.getsize(tmp) if os.path.exists(tmp) else 0
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            if validator:
+                # Only resume if the file is still the one the partial bytes came from
+                headers["If-Range"] = validator
+        response = None
+        try:
+            with session.get(url, stream=True, timeout=60, headers=headers) as response:
+                if response.status_code == 416:
+                    # The partial file is not a prefix of what the server has; start over
+                    os.remove(tmp)
+                    raise ValueError("server rejected the resume range")
+                response.raise_for_status()
+                validator = response.headers.get("ETag") or response.headers.get("Last-Modified") or validator
+
+                h = hashlib.sha256()
+                if offset and response.status_code == 206:
+                    with open(tmp, "rb") as f:
+                        for chunk in iter(lambda: f.read(chunk_size), b""):
+                            h.update(chunk)
+                    mode = "ab"
+                else:
+                    offset = 0
+                    mode = "wb"
+                with open(tmp, mode) as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if chunk:
+                            f.write(chunk)
+                            h.update(chunk)
+                            offset += len(chunk)
+                digest = h.hexdigest()
+                if expected_sha256 and digest != expected_sha256:
+                    os.remove(tmp)
+                    raise ValueError(f"SHA-256 mismatch: expected {expected_sha256}, got {digest}")
+                os.replace(tmp, dest_path)
+            backoff.success(url)
+            return digest
+        except Exception as e:
+            offset = os.path.getsize(tmp) if os.path.exists(tmp) else 0
+            progressed = offset > furthest
+            furthest = max(furthest, offset)
+            if not progressed:
+                attempts += 1
+            delay = backoff.failure(url, _retry_after_seconds(response))
+            if progressed:
+                safe_print(f"WARNING: Download of {url} broke off at {offset} bytes, resuming in {delay:.0f}s: {e}")
+                continue
+            safe_print(f"WARNING: Download attempt {attempts}/{max_retries} failed for {url}: {e}")
+            if attempts >= max_retries:
+                raise
+
+
+def parse_distribution_filename(filename: str) -> Optional[Dict[str, Any]]:
+    """Name, version and (for wheels) tag sets of a distribution file name, or None if unrecognised."""
+    if filename.lower().endswith(".whl"):
+        parts = filename[:-4].split("-")
+        if len(parts) not in (5, 6):
+            return None
+        python_tags, abi_tags, platform_tags = parts[-3:]
+        return {
+            "name": parts[0],
+            "version": parts[1],
+            "python": set(python_tags.split(".")),
+            "abi": set(abi_tags.split(".")),
+            "platform": set(platform_tags.split(".")),
+        }
+    for suffix in SDIST_SUFFIXES:
+        if filename.lower().endswith(suffix):
+            name, _, version = filename[:-len(suffix)].rpartition("-")
+            if name and version:
+                return {"name": name, "version": version}
+    return None
+
+
+def _platform_compatible(platform_tag: str, max_glibc: Tuple[int, int]) -> bool:
+    if platform_tag == "any":
+        return True
+    if platform_tag in ("manylinux1_x86_64", "manylinux2010_x86_64", "manylinux2014_x86_64", "linux_x86_64"):
+        return True
+    match = re.match(r"^manylinux_(\d+)_(\d+)_x86_64$", platform_tag)
+    return bool(match) and (int(match.group(1)), int(match.group(2))) <= max_glibc
+
+
+def wheel_is_compatible(info: Dict[str, Any], python_versions: Tuple[str, ...] = FABRIC_PYTHON_VERSIONS,
+                        max_glibc: Tuple[int, int] = FABRIC_MAX_GLIBC) -> bool:
+    """True when any of the wheel's tag triples can be loaded by one of `python_versions` on Linux x86_64."""
+    if not any(_platform_compatible(tag, max_glibc) for tag in info["platform"]):
+        return False
+    for version in python_versions:
+        major, minor = version.split(".")[:2]
+        cp = f"cp{major}{minor}"
+        for python_tag in info["python"]:
+            for abi_tag in info["abi"]:
+                if abi_tag == "none" and python_tag in (f"py{major}", f"py{major}{minor}", cp):
+                    return True
+                if abi_tag == cp and python_tag == cp:
+                    return True
+                # abi3 wheels built for an older CPython 3.x also load on newer ones
+                if abi_tag == "abi3" and python_tag.startswith(f"cp{major}") and int(python_tag[3:] or 0) <= int(minor):
+                    return True
+    return False
+
+
+class DistributionFilter:
+    """Decide which listed distribution files are worth downloading."""
+
+    def __init__(self, specifier: Optional[str] = None, latest: Optional[int] = None,
+                 python_versions: Optional[Tuple[str, ...]] = FABRIC_PYTHON_VERSIONS,
+                 max_glibc: Tuple[int, int] = FABRIC_MAX_GLIBC):
+        if (specifier or latest) and not PACKAGING_AVAILABLE:
+            raise RuntimeError("Version filtering requires the 'packaging' package. Install it with: pip install packaging")
+        self.specifier = SpecifierSet(specifier) if specifier else None
+        self.latest = latest
+        self.python_versions = python_versions
+        self.max_glibc = max_glibc
+
+    @staticmethod
+    def _version(filename: str) -> Optional["Version"]:
+        info = parse_distribution_filename(filename)
+        try:
+            return Version(info["version"]) if info else None
+        except InvalidVersion:
+            return None
+
+    def _supports_python(self, requires_python: Optional[str]) -> bool:
+        if not requires_python or not self.python_versions or not PACKAGING_AVAILABLE:
+            return True
+        try:
+            specifier = SpecifierSet(requires_python)
+        except InvalidSpecifier:
+            return True
+        return any(specifier.contains(f"{version}.0") for version in self.python_versions)
+
+    def apply(self, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        kept = []
+        for entry in entries:
+            if entry.get("yanked"):
+                continue
+            if not self._supports_python(entry.get("requires_python")):
+                continue
+            info = parse_distribution_filename(entry["filename"])
+            if info is None:
+                kept.append(entry)
+                continue
+            if self.python_versions and "python" in info and not wheel_is_compatible(info, self.python_versions, self.max_glibc):
+                continue
+            if self.specifier is not None:
+                version = self._version(entry["filename"])
+                if version is None or not self.specifier.contains(version):
+                    continue
+            kept.append(entry)
+
+        if self.latest:
+            versions = {entry["filename"]: self._version(entry["filename"]) for entry in kept}
+            releases = sorted({v for v in versions.values() if v is not None and not v.is_prerelease}, reverse=True)
+            newest = set(releases[:self.latest])
+            kept = [entry for entry in kept if versions[entry["filename"]] in newest]
+
+        if len(kept) < len(entries):
+            safe_print(f"INFO: Filter kept {len(kept)} of {len(entries)} files")
+        return kept
+
+
+class FlatArtifactCache(ArtifactCache):
+    """One directory of files keyed by file name, with a `HashIndex` of their digests."""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = self.root = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.hashes = HashIndex(cache_dir)
+
+    def find(self, filename: str, expected_sha256: Optional[str] = None, source: str = "") -> Optional[str]:
+        local_path = os.path.join(self.cache_dir, filename)
+        if not os.path.exists(local_path):
+            return None
+        digest = self.hashes.sha256(local_path)
+        if expected_sha256 and digest != expected_sha256:
+            safe_print(f"WARNING: Cached {filename} does not match the index hash; downloading again")
+            return None
+        return digest
+
+    def download_path(self, filename: str) -> str:
+        return os.path.join(self.cache_dir, filename)
+
+    def add(self, path: str, sha256: str, filename: str, source: str = "") -> None:
+        self.hashes.record(path, sha256)
+
+    def materialize(self, sha256: str, filename: str, dest_dir: str) -> str:
+        return os.path.join(self.cache_dir, filename)
+
+    def save(self) -> None:
+        self.hashes.save()
+
+
+def normalize_project_name(name: str) -> str:
+    """PEP 503 normalized project name, as used in simple-index URLs."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+class FeedAdapter(abc.ABC):
+    """A package feed the mirror engine can read: lists the distribution files of a package.
+
+    Entries are {"url", "filename", "sha256"} dicts, optionally with "requires_python"
+    and "yanked"; the engine filters, downloads, verifies and uploads them.
+    """
+
+    name = "feed"
+
+    @abc.abstractmethod
+    def list_entries(self, pkg_name: str, session: requests.Session,
+                     index_cache: Optional[SimpleIndexCache] = None) -> List[Dict[str, Any]]:
+        """The distribution file entries the feed lists for `pkg_name`."""
+
+
+class SimpleIndexAdapter(FeedAdapter):
+    """Any PEP 503/691 simple index, e.g. https://pypi.org/simple or a caching proxy."""
+
+    name = "simple index"
+
+    def __init__(self, index_url: str):
+        self.index_url = index_url.rstrip("/")
+
+    def list_entries(self, pkg_name: str, session: requests.Session,
+                     index_cache: Optional[SimpleIndexCache] = None) -> List[Dict[str, Any]]:
+        url = f"{self.index_url}/{normalize_project_name(pkg_name)}/"
+        safe_print(f"INFO: Fetching simple index {url}")
+        return fetch_simple_index(session, url, index_cache)
+
+
+_STAGE_DONE = object()
+
+
+class MirrorEngine:
+    """Mirror packages from a feed into a Fabric environment as overlapped stages.
+
+    list -> fetch -> verify -> upload. Each stage has its own worker threads and hands its
+    results to the next through a bounded queue, so listing, downloads, hashing and Fabric
+    uploads all run at the same time and a slow stage holds back the ones before it
+    instead of letting work pile up in memory.
+
+    - list: asks the adapter for each package's files (conditional index requests) and
+      drops files the `DistributionFilter` rejects, and non-wheels with `upload_wheels_only`
+    - fetch: downloads files that are missing from the artifact cache or do not match the
+      index hash (`FlatArtifactCache` in `cache_dir` by default, or a shared `ArtifactStore`)
+    - verify: checks the digest against the index and skips files already recorded in the
+      state
+    - upload: stages the file in Fabric and records it in the state
+    """
+
+    def __init__(self, adapter: FeedAdapter, session: requests.Session, cache_dir: str, state: MirrorState,
+                 fabric_mgr: Any, dist_filter: Optional[DistributionFilter] = None, upload_wheels_only: bool = True,
+                 download_workers: int = DOWNLOAD_WORKERS, upload_workers: int = UPLOAD_WORKERS,
+                 verify_workers: int = 2, chunk_size: int = DOWNLOAD_CHUNK_SIZE, max_retries: int = 3,
+                 queue_size: int = PIPELINE_QUEUE_SIZE, artifact_cache: Optional[ArtifactCache] = None):
+        self.adapter = adapter
+        self.session = session
+        self.cache_dir = cache_dir
+        self.state = state
+        self.fabric_mgr = fabric_mgr
+        self.dist_filter = dist_filter
+        self.upload_wheels_only = upload_wheels_only
+        self.download_workers = max(1, download_workers)
+        self.upload_workers = max(1, upload_workers)
+        self.verify_workers = max(1, verify_workers)
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.queue_size = queue_size
+        os.makedirs(cache_dir, exist_ok=True)
+        self.files = artifact_cache or FlatArtifactCache(cache_dir)
+        # Next to the files, so materialize() links instead of copying; one per process, as a
+        # shared ArtifactStore can serve several mirrors at once
+        self.upload_dir = os.path.join(self.files.root, f".upload-{os.getpid()}")
+        self.index_cache = SimpleIndexCache(cache_dir)
+        self.backoff = HostBackoff()
+        self.stats: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._seen: set = set()
+        self._listed: Dict[str, List[Dict[str, Any]]] = {}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def _stage(self, name: str, work: Any, inbox: "queue.Queue", outbox: Optional["queue.Queue"],
+               workers: int, downstream_workers: int) -> List[threading.Thread]:
+        """Start `workers` threads applying `work` to inbox items; the last one to finish closes the outbox."""
+        remaining = [workers]
+
+        def loop() -> None:
+            while True:
+                item = inbox.get()
+                if item is _STAGE_DONE:
+                    break
+                try:
+                    for result in work(item):
+                        outbox.put(result)
+                except Exception as e:
+                    self._count("failed")
+                    label = item if isinstance(item, str) else item[1].get("filename") if isinstance(item[1], dict) else item[1]
+                    safe_print(f"ERROR: {name} failed for {label}: {e}")
+            with self._lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last and outbox is not None:
+                for _ in range(downstream_workers):
+                    outbox.put(_STAGE_DONE)
+
+        threads = [threading.Thread(target=loop, name=f"mirror-{name}-{i}", daemon=True) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _list(self, pkg_name: str):
+        if pkg_name in self._listed:
+            entries = self._listed[pkg_name]
+        else:
+            entries = self.adapter.list_entries(pkg_name, self.session, self.index_cache)
+        entries = [e for e in entries if e["filename"].lower().endswith(VALID_DISTS)]
+        if self.dist_filter:
+            entries = self.dist_filter.apply(entries)
+        if not entries:
+            safe_print(f"WARNING: No distribution files found for {pkg_name}; skipping")
+        for entry in entries:
+            with self._lock:
+                # A file listed for two packages (or twice) is fetched once
+                if entry["filename"] in self._seen:
+                    continue
+                self._seen.add(entry["filename"])
+            self._count("listed")
+            if self.upload_wheels_only and not entry["filename"].lower().endswith(".whl"):
+                # Dropped before the fetch stage, so no bytes of it are downloaded
+                safe_print(f"INFO: Skipping non-wheel {entry['filename']} (enable sdist handling if needed)")
+                self._count("skipped")
+                continue
+            yield pkg_name, entry
+
+    def ensure_local(self, entry: Dict[str, Any]) -> Tuple[str, bool]:
+        """Make sure the artifact cache holds `entry`; returns (sha256, whether it was already cached)."""
+        filename = entry["filename"]
+        digest = self.files.find(filename, entry.get("sha256"), self.adapter.name)
+        if digest:
+            return digest, True
+        safe_print(f"Downloading {filename} from {entry['url']}")
+        download_path = self.files.download_path(filename)
+        digest = download_url_to_path(self.session, entry["url"], download_path, max_retries=self.max_retries,
+                                      chunk_size=self.chunk_size, expected_sha256=entry.get("sha256"),
+                                      backoff=self.backoff)
+        self.files.add(download_path, digest, filename, self.adapter.name)
+        return digest, False
+
+    def _fetch(self, item: Tuple[str, Dict[str, Any]]):
+        pkg_name, entry = item
+        digest, cached = self.ensure_local(entry)
+        self._count("cached" if cached else "downloaded")
+        yield pkg_name, entry, digest
+
+    def _verify(self, item: Tuple[str, Dict[str, Any], str]):
+        pkg_name, entry, sha256 = item
+        filename = entry["filename"]
+        if entry.get("sha256") and sha256 != entry["sha256"]:
+            raise ValueError(f"SHA-256 mismatch: expected {entry['sha256']}, got {sha256}")
+        if self.state.is_uploaded(pkg_name, filename, sha256):
+            safe_print(f"INFO: Already uploaded {filename}, skipping")
+            self._count("already_uploaded")
+            return
+        yield pkg_name, filename, sha256
+
+    def _upload(self, item: Tuple[str, str, str]):
+        pkg_name, filename, sha256 = item
+        safe_print(f"Uploading {filename} to Fabric (workspace={self.fabric_mgr.workspace_id})")
+        local_path = self.files.materialize(sha256, filename, self.upload_dir)
+        try:
+            upload_result = self.fabric_mgr.upload_wheel(local_path, max_retries=self.max_retries, sha256=sha256)
+        finally:
+            self.files.release(local_path)
+        if not upload_result.get("success"):
+            raise RuntimeError(f"upload failed: {upload_result.get('error')}")
+        self.state.mark_uploaded(pkg_name, filename, sha256, upload_result)
+        self._count("uploaded")
+        safe_print(f"INFO: Uploaded and recorded: {filename}")
+        return ()
+
+    def run(self, pkg_names: List[str], publish_after: bool = False,
+            listed: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> Dict[str, int]:
+        """Mirror `pkg_names`, publish once at the end if asked, and return per-stage counts.
+
+        The publish is skipped when nothing was uploaded. 'failed' counts the items that
+        failed in any stage, plus a failed publish. `listed` maps package names to files that were already listed (for example by
+        `DependencyResolver`); those packages skip the list request.
+        """
+        self._listed = listed or {}
+        list_workers = max(1, min(self.download_workers, len(pkg_names)))
+        packages: "queue.Queue" = queue.Queue()
+        for pkg_name in pkg_names:
+            packages.put(pkg_name)
+        for _ in range(list_workers):
+            packages.put(_STAGE_DONE)
+        to_fetch: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        to_verify: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        to_upload: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+
+        threads = self._stage("list", self._list, packages, to_fetch, list_workers, self.download_workers)
+        threads += self._stage("fetch", self._fetch, to_fetch, to_verify, self.download_workers, self.verify_workers)
+        threads += self._stage("verify", self._verify, to_verify, to_upload, self.verify_workers, self.upload_workers)
+        threads += self._stage("upload", self._upload, to_upload, None, self.upload_workers, 0)
+        try:
+            for thread in threads:
+                thread.join()
+        finally:
+            self.files.save()
+            self.index_cache.save()
+            shutil.rmtree(self.upload_dir, ignore_errors=True)
+
+        if publish_after and not self.stats.get("uploaded"):
+            safe_print("INFO: Nothing was uploaded; skipping publish")
+        elif publish_after:
+            safe_print("INFO: Publishing environment after uploads")
+            try:
+                pub = self.fabric_mgr.publish_environment()
+                if pub.get("success"):
+                    safe_print("INFO: Publish succeeded")
+                else:
+                    safe_print(f"WARNING: Publish returned error: {pub.get('error')}")
+                    self._count("failed")
+            except Exception as e:
+                safe_print(f"ERROR: Publish failed: {e}")
+                self._count("failed")
+
+        safe_print("INFO: " + ", ".join(f"{key.replace('_', ' ')}: {self.stats.get(key, 0)}" for key in
+                                        ("listed", "cached", "downloaded", "already_uploaded", "skipped", "uploaded", "failed")))
+        return dict(self.stats)
+
+
+class RangeNotSupported(Exception):
+    pass
+
+
+class HttpRangeFile(io.RawIOBase):
+    """Read-only, seekable view of a remote file that fetches byte ranges on demand.
+
+    `zipfile` only reads the end-of-central-directory record, the central directory and
+    the members it is asked for, so opening a wheel through this class and reading its
+    METADATA costs two or three small Range requests instead of downloading the wheel.
+    Raises `RangeNotSupported` when the server ignores Range requests.
+    """
+
+    def __init__(self, session: requests.Session, url: str, block_size: int = 64 * 1024):
+        self.session = session
+        self.url = url
+        self.block_size = block_size
+        self._blocks: List[Tuple[int, bytes]] = []
+        self._pos = 0
+        # The first request reads the tail, where the zip central directory lives, and the file size
+        self.size = -1
+        start, data, size = self._get(f"bytes=-{block_size}")
+        self.size = size
+        self._blocks.append((start, data))
+
+    def _get(self, byte_range: str) -> Tuple[int, bytes, int]:
+        # Streamed, so a server that ignores Range is not read to the end just to find out
+        with self.session.get(self.url, headers={"Range": byte_range}, timeout=30, stream=True) as r:
+            r.raise_for_status()
+            match = re.match(r"bytes (\d+)-\d+/(\d+)", r.headers.get("Content-Range", ""))
+            if r.status_code != 206 or not match:
+                raise RangeNotSupported(f"{self.url} does not support Range requests")
+            return int(match.group(1)), r.content, int(match.group(2))
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def read(self, n: int = -1) -> bytes:
+        end = self.size if n is None or n < 0 else min(self.size, self._pos + n)
+        if end <= self._pos:
+            return b""
+        for start, data in self._blocks:
+            if start <= self._pos and end <= start + len(data):
+                break
+        else:
+            # Read ahead a whole block; zipfile reads a member's header and data separately
+            start, data, _ = self._get(f"bytes={self._pos}-{max(end, self._pos + self.block_size) - 1}")
+            self._blocks.append((start, data))
+        chunk = data[self._pos - start:end - start]
+        self._pos += len(chunk)
+        return chunk
+
+    def readinto(self, buffer: Any) -> int:
+        chunk = self.read(len(buffer))
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+
+def read_wheel_metadata(path_or_file: Any) -> str:
+    """The `*.dist-info/METADATA` text of a wheel (a local path or a file object such as `HttpRangeFile`)."""
+    with zipfile.ZipFile(path_or_file) as wheel:
+        for name in wheel.namelist():
+            if re.match(r"^[^/]+\.dist-info/METADATA$", name):
+                return wheel.read(name).decode("utf-8", "replace")
+    raise ValueError("wheel has no .dist-info/METADATA")
+
+
+class CoreMetadataCache(JsonIndexFile):
+    """Requires-Dist of distribution files already inspected, keyed by file name and sha256.
+
+    Published files never change, so their metadata is read once and reused by later runs.
+    The cache is kept in `.core_metadata_cache.json` in the mirror's cache directory.
+    """
+
+    FILENAME = ".core_metadata_cache.json"
+
+    @staticmethod
+    def _key(entry: Dict[str, Any]) -> str:
+        return f"{entry['filename']}#{entry.get('sha256') or ''}"
+
+    def get(self, entry: Dict[str, Any]) -> Optional[List[str]]:
+        with self._lock:
+            return self._data.get(self._key(entry))
+
+    def store(self, entry: Dict[str, Any], requires: List[str]) -> None:
+        with self._lock:
+            self._data[self._key(entry)] = requires
+            self._dirty = True
+
+
+def fabric_marker_environments(python_versions: Tuple[str, ...] = FABRIC_PYTHON_VERSIONS) -> List[Dict[str, str]]:
+    """PEP 508 marker environments of the Fabric Spark runtimes (CPython on Linux x86_64)."""
+    return [{
+        "implementation_name": "cpython",
+        "implementation_version": f"{version}.0",
+        "os_name": "posix",
+        "platform_machine": "x86_64",
+        "platform_python_implementation": "CPython",
+        "platform_system": "Linux",
+        "python_full_version": f"{version}.0",
+        "python_version": version,
+        "sys_platform": "linux",
+    } for version in python_versions]
+
+
+class DependencyResolver:
+    """Resolve the dependency closure of a set of requirements from a mirror engine's feed.
+
+    Each project gets the newest version that satisfies every requirement seen for it and
+    passes the engine's `DistributionFilter`. Dependencies come from the chosen wheel's core
+    metadata: the PEP 658 `.metadata` file when the index offers one, otherwise METADATA is
+    read out of the wheel with Range requests (`HttpRangeFile`). Only servers without Range
+    support cost a full download, into the engine's cache, where the mirror run reuses it.
+    Projects are listed and inspected concurrently, one dependency level per round.
+
+    This is a greedy resolver: when a later requirement narrows a project it is re-picked
+    (and the requirements of its old version are withdrawn), but there is no backtracking
+    over alternative versions of other projects. Sdist-only
+    projects are mirrored without their dependencies, which would need a build to read.
+    """
+
+    def __init__(self, engine: "MirrorEngine", python_versions: Optional[Tuple[str, ...]] = None,
+                 max_workers: int = DOWNLOAD_WORKERS):
+        if not PACKAGING_AVAILABLE:
+            raise RuntimeError("Dependency resolution requires the 'packaging' package. Install it with: pip install packaging")
+        self.engine = engine
+        self.environments = fabric_marker_environments(tuple(python_versions or FABRIC_PYTHON_VERSIONS))
+        self.max_workers = max(1, max_workers)
+        self.metadata_cache = CoreMetadataCache(engine.cache_dir)
+        self._listings: Dict[str, List[Dict[str, Any]]] = {}
+
+    def _applies(self, requirement: "Requirement", extras: set) -> bool:
+        if requirement.marker is None:
+            return True
+        return any(requirement.marker.evaluate(dict(env, extra=extra))
+                   for env in self.environments for extra in (extras or {""}))
+
+    def _candidates(self, name: str, display_name: str) -> List[Dict[str, Any]]:
+        if name not in self._listings:
+            engine = self.engine
+            entries = engine.adapter.list_entries(display_name, engine.session, engine.index_cache)
+            entries = [e for e in entries if e["filename"].lower().endswith(VALID_DISTS)]
+            self._listings[name] = engine.dist_filter.apply(entries) if engine.dist_filter else entries
+        return self._listings[name]
+
+    def _core_metadata(self, entry: Dict[str, Any]) -> str:
+        engine = self.engine
+        if entry.get("core_metadata"):
+            r = engine.session.get(entry["url"] + ".metadata", timeout=30)
+            r.raise_for_status()
+            expected = entry["core_metadata"] if isinstance(entry["core_metadata"], str) else None
+            if expected and hashlib.sha256(r.content).hexdigest() != expected:
+                raise ValueError(f"SHA-256 mismatch for {entry['filename']}.metadata")
+            return r.content.decode("utf-8", "replace")
+        try:
+            return read_wheel_metadata(HttpRangeFile(engine.session, entry["url"]))
+        except RangeNotSupported:
+            # The whole wheel is needed anyway; fetch it into the cache the pipeline reads from
+            digest, _ = engine.ensure_local(entry)
+            local_path = engine.files.materialize(digest, entry["filename"], engine.upload_dir)
+            try:
+                return read_wheel_metadata(local_path)
+            finally:
+                engine.files.release(local_path)
+
+    def _requires(self, entry: Dict[str, Any]) -> List[str]:
+        requires = self.metadata_cache.get(entry)
+        if requires is None:
+            message = email.parser.Parser().parsestr(self._core_metadata(entry), headersonly=True)
+            requires = message.get_all("Requires-Dist") or []
+            self.metadata_cache.store(entry, requires)
+        return requires
+
+    def _select(self, name: str, display_name: str, specifier: "SpecifierSet",
+                extras: set) -> Optional[Dict[str, Any]]:
+        by_version: Dict[Version, List[Dict[str, Any]]] = {}
+        for entry in self._candidates(name, display_name):
+            version = DistributionFilter._version(entry["filename"])
+            if version is not None:
+                by_version.setdefault(version, []).append(entry)
+        matching = sorted((v for v in by_version if specifier.contains(v)), reverse=True)
+        if not matching:
+            safe_print(f"WARNING: No mirrorable version of {display_name} satisfies '{specifier}'")
+            return None
+        version = matching[0]
+        files = by_version[version]
+        wheels = sorted((e for e in files if e["filename"].lower().endswith(".whl")),
+                        key=lambda e: not e.get("core_metadata"))
+        requires: List[Requirement] = []
+        if wheels:
+            for line in self._requires(wheels[0]):
+                try:
+                    requirement = Requirement(line)
+                except InvalidRequirement:
+                    safe_print(f"WARNING: Ignoring unparsable requirement '{line}' of {wheels[0]['filename']}")
+                    continue
+                if self._applies(requirement, extras):
+                    requires.append(requirement)
+        else:
+            safe_print(f"WARNING: {display_name} {version} has no wheel; its dependencies are not resolved")
+        return {"version": version, "files": files, "requires": requires}
+
+    def resolve(self, requirements: List[str], max_rounds: int = 50) -> Dict[str, List[Dict[str, Any]]]:
+        """Map each project in the closure of `requirements` to the files of its chosen version."""
+        # constraints[project][origin]: what `origin` (a chosen project, or "" for the
+        # requirements passed in) asks of `project`. Re-picking a project withdraws its old
+        # requirements, so constraints of versions that were replaced do not linger.
+        constraints: Dict[str, Dict[str, Requirement]] = {}
+        names: Dict[str, str] = {}
+        chosen: Dict[str, Dict[str, Any]] = {}
+        unsatisfiable: Dict[str, str] = {}
+
+        def add(origin: str, requirement: Requirement) -> None:
+            name = normalize_project_name(requirement.name)
+            names.setdefault(name, requirement.name)
+            previous = constraints.setdefault(name, {}).get(origin)
+            if previous is not None:
+                merged = Requirement(requirement.name)
+                merged.specifier = previous.specifier & requirement.specifier
+                merged.extras = previous.extras | requirement.extras
+                requirement = merged
+            constraints[name][origin] = requirement
+
+        def withdraw(origin: str) -> None:
+            for by_origin in constraints.values():
+                by_origin.pop(origin, None)
+
+        def wanted(name: str) -> Tuple[SpecifierSet, set]:
+            specifier, extras = SpecifierSet(), set()
+            for requirement in constraints[name].values():
+                specifier &= requirement.specifier
+                extras |= requirement.extras
+            return specifier, extras
+
+        def select(name: str) -> Optional[Dict[str, Any]]:
+            specifier, extras = wanted(name)
+            try:
+                result = self._select(name, names[name], specifier, extras)
+            except Exception as e:
+                safe_print(f"ERROR: Could not resolve {names[name]}: {e}")
+                result = None
+            if result is not None:
+                result["extras"] = extras
+            return result
+
+        for line in requirements:
+            add("", Requirement(line))
+        rounds = 0
+        while rounds < max_rounds:
+            # Projects nothing asks for any more (their dependant was re-picked) leave the closure
+            orphans = [name for name in chosen if not constraints.get(name)]
+            while orphans:
+                for name in orphans:
+                    del chosen[name]
+                    withdraw(name)
+                orphans = [name for name in chosen if not constraints.get(name)]
+
+            todo = []
+            for name, by_origin in sorted(constraints.items()):
+                if not by_origin:
+                    continue
+                specifier, extras = wanted(name)
+                if unsatisfiable.get(name) == f"{specifier}{sorted(extras)}":
+                    continue
+                current = chosen.get(name)
+                if current is None or not specifier.contains(current["version"]) or not extras <= current["extras"]:
+                    todo.append(name)
+            if not todo:
+                break
+            rounds += 1
+
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(todo))) as executor:
+                for name, result in zip(todo, executor.map(select, todo)):
+                    if result is None:
+                        # Keep an earlier pick, and do not retry until the constraints change
+                        specifier, extras = wanted(name)
+                        unsatisfiable[name] = f"{specifier}{sorted(extras)}"
+                        continue
+                    withdraw(name)
+                    chosen[name] = result
+                    for requirement in result["requires"]:
+                        add(name, requirement)
+        else:
+            safe_print(f"WARNING: Dependency resolution stopped after {max_rounds} rounds")
+
+        self.metadata_cache.save()
+        safe_print(f"INFO: Resolved {len(chosen)} projects in {rounds} rounds: "
+                   + ", ".join(f"{names[n]}=={chosen[n]['version']}" for n in sorted(chosen)))
+        return {names[name]: result["files"] for name, result in chosen.items()}
+
+
+def add_mirror_arguments(parser: argparse.ArgumentParser, default_cache: str) -> None:
+    """Arguments shared by the mirror scripts: package selection, cache, pipeline, filters and Fabric target."""
+    parser.add_argument("--package-name", help="Single package name to mirror")
+    parser.add_argument("--package-list-file", help="File with package names (one per line)")
+    parser.add_argument("--cache", default=default_cache, help="Local cache directory")
+    parser.add_argument("--download-workers", type=int, default=DOWNLOAD_WORKERS,
+                        help=f"Concurrent downloads across all packages (default {DOWNLOAD_WORKERS})")
+    parser.add_argument("--upload-workers", type=int, default=UPLOAD_WORKERS,
+                        help=f"Concurrent Fabric uploads, overlapped with downloads (default {UPLOAD_WORKERS})")
+    parser.add_argument("--chunk-size-kb", type=int, default=DOWNLOAD_CHUNK_SIZE // 1024,
+                        help=f"Download chunk size in KB (default {DOWNLOAD_CHUNK_SIZE // 1024})")
+    parser.add_argument("--artifact-store", default=os.environ.get(ARTIFACT_STORE_ENV),
+                        help=f"Shared content-addressed artifact store directory, reused across mirrors and "
+                             f"install_wheels_only.py (default ${ARTIFACT_STORE_ENV}; unset keeps files in --cache)")
+    parser.add_argument("--artifact-store-max-gb", type=float, default=DEFAULT_ARTIFACT_STORE_BYTES / 1024 ** 3,
+                        help=f"Evict least recently used artifacts above this size "
+                             f"(default {DEFAULT_ARTIFACT_STORE_BYTES // 1024 ** 3})")
+    parser.add_argument("--state-backend", choices=STATE_BACKENDS, default="journal",
+                        help="Upload state store: JSON snapshot plus append-only journal (default), or SQLite for concurrent runs")
+    parser.add_argument("--version-spec", help="Only mirror versions matching this specifier, e.g. \">=2.0,<3\" (needs 'packaging')")
+    parser.add_argument("--latest", type=int, help="Only mirror the newest N releases of each package (needs 'packaging')")
+    parser.add_argument("--python-versions", default=",".join(FABRIC_PYTHON_VERSIONS),
+                        help=f"Python versions wheels must support (default {','.join(FABRIC_PYTHON_VERSIONS)})")
+    parser.add_argument("--any-platform", action="store_true",
+                        help="Mirror wheels for every Python version and platform, not only Fabric-compatible ones")
+    parser.add_argument("--with-deps", action="store_true",
+                        help="Also mirror the dependency closure; package names may then carry specifiers "
+                             "and extras, e.g. \"mypkg[sql]>=2\" (needs 'packaging')")
+    parser.add_argument("--workspace-id", required=True, help="Fabric workspace id")
+    parser.add_argument("--environment-id", required=True, help="Fabric environment id")
+    parser.add_argument("--publish", action="store_true", help="Publish environment after uploads")
+    parser.add_argument("--upload-wheels-only", action="store_true", default=True, help="Upload only wheel files (default True)")
+    parser.add_argument("--fabric-token", help="Fabric bearer token")
+    parser.add_argument("--fabric-client-id", help="Fabric service principal client id")
+    parser.add_argument("--fabric-client-secret", help="Fabric service principal client secret")
+    parser.add_argument("--fabric-tenant-id", help="Fabric tenant id")
+
+
+def run_mirror(parser: argparse.ArgumentParser, args: argparse.Namespace, adapter: FeedAdapter,
+               session: requests.Session, fabric_manager_cls: Any, state_filename: str) -> Dict[str, int]:
+    """Run a mirror script's command line (see `add_mirror_arguments`) against `adapter`.
+
+    Returns the engine's counts; the scripts exit with status 1 when 'failed' is non-zero.
+    """
+    if args.package_name:
+        pkg_names = [args.package_name]
+    elif args.package_list_file:
+        with open(args.package_list_file, "r", encoding="utf-8") as f:
+            pkg_names = [ln.strip() for ln in f if ln.strip()]
+    else:
+        parser.error("No package source provided. Use --package-name or --package-list-file.")
+
+    python_versions = None if args.any_platform else [v.strip() for v in args.python_versions.split(",") if v.strip()]
+    try:
+        dist_filter = DistributionFilter(specifier=args.version_spec, latest=args.latest, python_versions=python_versions)
+    except (RuntimeError, ValueError) as e:
+        parser.error(str(e))
+
+    fabric_mgr = fabric_manager_cls(
+        workspace_id=args.workspace_id,
+        environment_id=args.environment_id,
+        token=args.fabric_token,
+        client_id=args.fabric_client_id,
+        client_secret=args.fabric_client_secret,
+        tenant_id=args.fabric_tenant_id,
+    )
+
+    os.makedirs(args.cache, exist_ok=True)
+    artifact_cache = None
+    if args.artifact_store:
+        artifact_cache = ArtifactStore(args.artifact_store, int(args.artifact_store_max_gb * 1024 ** 3))
+    try:
+        with open_mirror_state(args.cache, state_filename, args.state_backend) as state:
+            engine = MirrorEngine(adapter, mount_connection_pool(session, args.download_workers), args.cache, state,
+                                  fabric_mgr, dist_filter=dist_filter, upload_wheels_only=args.upload_wheels_only,
+                                  download_workers=args.download_workers, upload_workers=args.upload_workers,
+                                  chunk_size=args.chunk_size_kb * 1024, artifact_cache=artifact_cache)
+            listed = None
+            if args.with_deps:
+                try:
+                    resolver = DependencyResolver(engine, python_versions=python_versions, max_workers=args.download_workers)
+                    listed = resolver.resolve(pkg_names)
+                except (RuntimeError, ValueError) as e:
+                    parser.error(str(e))
+                pkg_names = list(listed)
+            return engine.run(pkg_names, publish_after=args.publish, listed=listed)
+    finally:
+        if artifact_cache is not None:
+            artifact_cache.close()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Fabric Environment Staging Planner
+
+Brings a Fabric Environment's libraries to a desired state instead of only adding to it.
+The desired state is a directory of package files (custom libraries), a requirements file
+(public libraries, written to staging as environment.yml), or both.
+
+The planner reads the environment's staging and published libraries and computes the
+minimal change:
+- upload: package files that are missing from staging or whose content changed
+- delete: staged package files (.whl, .tar.gz, .zip, .egg) that are not in the directory;
+  other custom files such as .jar or .py are left alone
+- environment.yml: uploaded when the requirements differ from the staged pip list, or
+  deleted when the requirements file is empty
+
+Without --apply the plan is only printed. With --apply, uploads and deletes run in
+parallel and --publish publishes once at the end. Publishing is skipped when there was
+nothing to change and staging already matches the published state.
+
+Examples:
+    # Show what would change
+    python tools/plan_fabric_environment.py --workspace-id <ws> --environment-id <env> --dir dist --use-default-credential
+
+    # Apply the wheel directory and requirements, then publish once
+    python tools/plan_fabric_environment.py --workspace-id <ws> --environment-id <env> --dir dist --requirements requirements.txt --apply --publish --use-default-credential
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional
+
+try:
+    from tools.upload_wheel_to_fabric import (FabricEnvironmentManager, PACKAGE_EXTENSIONS,
+                                              PUBLISH_TIMEOUT_SECONDS, safe_print)
+except ImportError:
+    from upload_wheel_to_fabric import (FabricEnvironmentManager, PACKAGE_EXTENSIONS,
+                                        PUBLISH_TIMEOUT_SECONDS, safe_print)
+
+ENVIRONMENT_YML = "environment.yml"
+
+
+def normalize_requirement(requirement: str) -> str:
+    """Canonical form of a requirement line, so `Foo_Bar >= 1.0` and `foo-bar>=1.0` compare equal."""
+    requirement = re.sub(r'\s+', '', requirement)
+    match = re.match(r'^([A-Za-z0-9][A-Za-z0-9._-]*)(.*)$', requirement)
+    if not match:
+        return requirement
+    return re.sub(r'[-_.]+', '-', match.group(1)).lower() + match.group(2)
+
+
+def read_requirements(path: str) -> List[str]:
+    """Requirement lines of a requirements file; comments and pip options are skipped."""
+    requirements = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line and not line.startswith('-'):
+                requirements.append(line)
+    return requirements
+
+
+def parse_environment_yml_pip(environment_yml: str) -> List[str]:
+    """The pip requirements listed in an environment.yml."""
+    requirements = []
+    pip_indent: Optional[int] = None
+    for line in environment_yml.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith('#'):
+            continue
+        indent = len(line) - len(line.lstrip())
+        if stripped in ('- pip:', '-pip:'):
+            pip_indent = indent
+            continue
+        if pip_indent is not None:
+            if indent > pip_indent and stripped.startswith('-'):
+                requirements.append(stripped[1:].strip().strip('"\''))
+            else:
+                pip_indent = None
+    return requirements
+
+
+def render_environment_yml(requirements: List[str]) -> str:
+    lines = ['dependencies:', '  - pip:']
+    lines.extend(f'      - {requirement}' for requirement in requirements)
+    return '\n'.join(lines) + '\n'
+
+
+class EnvironmentPlanner:
+    """Plan and apply the minimal staging change that makes an environment match a spec."""
+
+    def __init__(self, manager: FabricEnvironmentManager, wheel_dir: Optional[str] = None,
+                 requirements_path: Optional[str] = None):
+        if not wheel_dir and not requirements_path:
+            raise ValueError("Provide a wheel directory, a requirements file, or both")
+        self.manager = manager
+        self.wheel_dir = wheel_dir
+        self.requirements_path = requirements_path
+
+    @staticmethod
+    def _is_package(name: str) -> bool:
+        return name != ENVIRONMENT_YML and name.lower().endswith(PACKAGE_EXTENSIONS)
+
+    def plan(self) -> Dict[str, Any]:
+        staged = self.manager.get_staging_libraries(refresh=True)
+        published = self.manager.get_published_libraries()
+        staged_yml = self.manager.get_environment_yml()
+        published_yml = self.manager.get_environment_yml(published=True)
+
+        plan: Dict[str, Any] = {'upload': [], 'delete': [], 'unchanged': [], 'environment_yml': None}
+
+        if self.wheel_dir:
+            desired = {os.path.basename(path): path
+                       for path in FabricEnvironmentManager.resolve_package_paths(self.wheel_dir)}
+            for name, path in sorted(desired.items()):
+                if self.manager.is_unchanged(name, os.path.getsize(path), wheel_path=path):
+                    plan['unchanged'].append(name)
+                else:
+                    plan['upload'].append(path)
+            plan['delete'] = sorted(name for name in staged if self._is_package(name) and name not in desired)
+
+        if self.requirements_path:
+            desired_requirements = read_requirements(self.requirements_path)
+            current = sorted(normalize_requirement(r) for r in parse_environment_yml_pip(staged_yml))
+            if sorted(normalize_requirement(r) for r in desired_requirements) != current:
+                if desired_requirements:
+                    plan['environment_yml'] = render_environment_yml(desired_requirements)
+                elif staged_yml:
+                    plan['delete'].append(ENVIRONMENT_YML)
+
+        # Staging can already differ from what is published (an earlier run without publish)
+        plan['pending_publish'] = (
+            set(staged) != set(published)
+            or sorted(map(normalize_requirement, parse_environment_yml_pip(staged_yml)))
+            != sorted(map(normalize_requirement, parse_environment_yml_pip(published_yml)))
+        )
+        plan['has_changes'] = bool(plan['upload'] or plan['delete'] or plan['environment_yml'])
+        return plan
+
+    @staticmethod
+    def print_plan(plan: Dict[str, Any]) -> None:
+        for path in plan['upload']:
+            safe_print(f"  + {os.path.basename(path)}")
+        if plan['environment_yml']:
+            safe_print(f"  + {ENVIRONMENT_YML} (public libraries changed)")
+        for name in plan['delete']:
+            safe_print(f"  - {name}")
+        safe_print(f"📋 Plan: {len(plan['upload']) + bool(plan['environment_yml'])} to upload, "
+                   f"{len(plan['delete'])} to delete, {len(plan['unchanged'])} unchanged"
+                   f"{', staging has unpublished changes' if plan['pending_publish'] else ''}")
+
+    def apply(self, plan: Dict[str, Any], max_workers: int = 4, max_retries: int = 3,
+              publish: bool = False, publish_timeout: float = PUBLISH_TIMEOUT_SECONDS) -> bool:
+        """Apply the plan; returns True when every step (and the optional publish) succeeded."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            upload_paths = list(plan['upload'])
+            if plan['environment_yml']:
+                yml_path = os.path.join(tmp_dir, ENVIRONMENT_YML)
+                with open(yml_path, 'w', encoding='utf-8') as f:
+                    f.write(plan['environment_yml'])
+                upload_paths.append(yml_path)
+
+            # Deletes go first so a replaced version is never staged next to its successor
+            delete_results = self.manager.delete_staging_libraries(plan['delete'], max_retries=max_retries,
+                                                                   max_workers=max_workers)
+            upload_results = self.manager.upload_wheels(upload_paths, max_retries=max_retries,
+                                                        max_workers=max_workers, skip_unchanged=False)
+
+        failed = [r['library_name'] for r in delete_results if not r['success']]
+        failed += [r['wheel_name'] for r in upload_results if not r['success']]
+        if failed:
+            safe_print(f"❌ {len(failed)} change(s) failed: {', '.join(failed)}")
+            if publish:
+                safe_print("⚠️ Skipping publish; applied changes remain in staging")
+            return False
+
+        if not publish:
+            return True
+        if not plan['has_changes'] and not plan['pending_publish']:
+            safe_print("✅ Environment already matches the spec, skipping publish")
+            return True
+        return self.manager.publish_environment(max_wait=publish_timeout)['success']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Make a Fabric Environment match a wheel directory and/or requirements file')
+    parser.add_argument('--workspace-id', required=True, help='Fabric workspace ID')
+    parser.add_argument('--environment-id', required=True, help='Fabric environment ID')
+    parser.add_argument('--dir', help='Directory (or glob) holding the desired custom package files')
+    parser.add_argument('--requirements', help='requirements.txt holding the desired public libraries')
+    parser.add_argument('--apply', action='store_true', help='Apply the plan (default: only print it)')
+    parser.add_argument('--publish', action='store_true', help='Publish once after applying the plan')
+    parser.add_argument('--parallel', type=int, default=4, help='Concurrent uploads and deletes (default: 4)')
+    parser.add_argument('--retries', type=int, default=3, help='Number of retry attempts (default: 3)')
+    parser.add_argument('--publish-timeout', type=int, default=PUBLISH_TIMEOUT_SECONDS,
+                        help=f'Seconds to wait for the publish to complete (default: {PUBLISH_TIMEOUT_SECONDS})')
+    parser.add_argument('--ledger',
+                        help='File recording hashes of uploaded packages; without it every staged package '
+                             'file counts as changed, since the API lists names only')
+
+    # Authentication options
+    parser.add_argument('--token', help='Bearer token for authentication')
+    parser.add_argument('--client-id', help='Service principal client ID')
+    parser.add_argument('--client-secret', help='Service principal client secret')
+    parser.add_argument('--tenant-id', help='Azure tenant ID')
+    parser.add_argument('--use-default-credential', action='store_true', help='Use DefaultAzureCredential when available')
+
+    args = parser.parse_args()
+    if not args.dir and not args.requirements:
+        parser.error('provide --dir, --requirements, or both')
+
+    try:
+        manager = FabricEnvironmentManager(
+            workspace_id=args.workspace_id,
+            environment_id=args.environment_id,
+            token=args.token,
+            client_id=args.client_id,
+            client_secret=args.client_secret,
+            tenant_id=args.tenant_id,
+            use_default_credential=args.use_default_credential,
+            ledger_path=args.ledger
+        )
+        planner = EnvironmentPlanner(manager, wheel_dir=args.dir, requirements_path=args.requirements)
+        plan = planner.plan()
+        planner.print_plan(plan)
+
+        if not args.apply:
+            safe_print("💡 Dry run; add --apply to make these changes")
+            return
+        if not planner.apply(plan, max_workers=args.parallel, max_retries=args.retries,
+                             publish=args.publish, publish_timeout=args.publish_timeout):
+            sys.exit(1)
+        safe_print("🎉 Environment matches the spec" if args.publish else "📋 Staging matches the spec; add --publish to make it active")
+    except Exception as e:
+        safe_print(f"❌ Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Mirror packages from any PEP 503/691 simple index (pypi.org, devpi, a caching proxy, ...)
+into a Fabric Environment.
+
+This is the plain-index front end of the shared mirror engine in tools/package_mirror.py,
+next to jfrog_to_fabric_sync.py and azure_devops_to_fabric_sync.py:
+- Project pages are requested as PEP 691 JSON when offered and revalidated with
+  ETag/If-Modified-Since, so unchanged packages cost one 304
+- Files the Fabric runtime cannot install are dropped before downloading; --version-spec
+  and --latest narrow the versions further
+- Listing, downloads, hash verification and Fabric uploads run as overlapped stages
+- Uploaded files are tracked in a state store (JSON journal or SQLite)
+
+Only wheel files are uploaded by default. Sdists are downloaded but skipped unless you add a build step.
+
+Usage (Windows cmd.exe):
+  python tools\\simple_index_to_fabric_sync.py --index-url https://pypi.org/simple --package-list-file packages.txt --workspace-id <WS> --environment-id <ENV> --fabric-token <FABRIC_TOKEN>
+
+"""
+from __future__ import annotations
+import argparse
+import sys
+from typing import List, Optional
+
+import requests
+
+try:
+    from tools.package_mirror import SimpleIndexAdapter, add_mirror_arguments, run_mirror, safe_print
+except ImportError:
+    from package_mirror import SimpleIndexAdapter, add_mirror_arguments, run_mirror, safe_print
+
+# Try to import the Fabric manager
+try:
+    from tools.upload_wheel_to_fabric import FabricEnvironmentManager
+except Exception:
+    try:
+        from upload_wheel_to_fabric import FabricEnvironmentManager
+    except Exception:
+        FabricEnvironmentManager = None
+
+STATE_FILENAME = "simple_index_mirror_state.json"
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Mirror packages from a PEP 503/691 simple index into Fabric Environment.")
+    parser.add_argument("--index-url", default="https://pypi.org/simple",
+                        help="Simple index base URL (default https://pypi.org/simple)")
+    parser.add_argument("--index-user", help="Username for basic auth against the index")
+    parser.add_argument("--index-pass", help="Password or token for basic auth against the index")
+    add_mirror_arguments(parser, default_cache=".simple_index_mirror_cache")
+    args = parser.parse_args(argv)
+
+    if FabricEnvironmentManager is None:
+        safe_print("ERROR: Could not import FabricEnvironmentManager from tools/upload_wheel_to_fabric.py. Ensure you run this from the repo root and the file exists.")
+        sys.exit(2)
+
+    session = requests.Session()
+    if args.index_user and args.index_pass:
+        session.auth = (args.index_user, args.index_pass)
+    stats = run_mirror(parser, args, SimpleIndexAdapter(args.index_url), session, FabricEnvironmentManager, STATE_FILENAME)
+    if stats.get("failed"):
+        safe_print(f"ERROR: Mirror run finished with {stats['failed']} failure(s)")
+        sys.exit(1)
+    safe_print("Mirror run complete")
+
+
+if __name__ == "__main__":
+    main()
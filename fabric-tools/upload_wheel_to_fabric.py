@@ -18,8 +18,14 @@ Key behaviors:
 Behavioral details:
 - Retries with exponential backoff on transient failures (configurable via
     --retries).
+- --file accepts a single file, a directory (every package file in it) or a
+    glob pattern. Multiple files are uploaded concurrently (--parallel).
 - Uploads to the Fabric staging libraries endpoint. If --publish is provided,
-    the tool will attempt to publish the environment after a successful upload.
+    the tool publishes the environment once, after all uploads succeeded.
+- --targets rolls the same files out to many environments (one
+    "workspace_id,environment_id" per line) with a global upload limit
+    (--max-concurrent-uploads); publishes overlap and a per-target report is
+    printed (and written as JSON with --report).
 - Exit codes: 0 on success (upload and optional publish); non-zero when upload
     or publish fails.
 
@@ -37,15 +43,33 @@ Examples:
 
         # Upload using service principal
         python tools/upload_wheel_to_fabric.py --workspace-id <ws> --environment-id <env> --file dist/pkg.whl --client-id <id> --client-secret <secret> --tenant-id <tenant>
+
+        # Upload every wheel in dist/ (4 at a time) and publish once
+        python tools/upload_wheel_to_fabric.py --workspace-id <ws> --environment-id <env> --file "dist/*.whl" --parallel 4 --publish --use-default-credential
+
+        # Roll dist/ out to every environment in targets.csv and publish each
+        python tools/upload_wheel_to_fabric.py --targets targets.csv --file dist --publish --report rollout.json --use-default-credential
 """
 
 import argparse
+import asyncio
+import glob
+import hashlib
+import mimetypes
 import os
 import sys
 import time
 import json
+import threading
+import uuid
 import requests
-from typing import Dict, Any, Optional
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+
+PACKAGE_EXTENSIONS = ('.whl', '.tar.gz', '.zip', '.egg')
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+PUBLISH_TIMEOUT_SECONDS = 1800
 
 def safe_print(*args, **kwargs):
     """Print function that handles encoding issues on Windows."""
@@ -69,35 +93,320 @@ except ImportError:
     ClientSecretCredential = None
     AZURE_IDENTITY_AVAILABLE = False
 
+try:
+    from tools.fabric_auth import FabricTokenAuth
+except ImportError:
+    from fabric_auth import FabricTokenAuth
+
+
+class MultipartFileStream:
+    """Streaming multipart/form-data body for a single file.
+
+    The file is read in `chunk_size` pieces while the request is sent, so memory use stays
+    bounded regardless of the file size. The total length is known up front, so requests
+    still sends a Content-Length header. With `hash_content`, the SHA-256 of the file is
+    computed from the same reads and available as `sha256` once the body has been sent.
+    """
+
+    def __init__(self, file_path: str, file_name: str, field_name: str = 'file',
+                 chunk_size: int = UPLOAD_CHUNK_SIZE,
+                 progress_callback: Optional[Callable[[int, int], None]] = None,
+                 hash_content: bool = False):
+        boundary = uuid.uuid4().hex
+        file_content_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.progress_callback = progress_callback
+        self._head = (
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{file_name}"\r\n'
+            f'Content-Type: {file_content_type}\r\n\r\n'
+        ).encode('utf-8')
+        self._tail = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+        self._length = len(self._head) + os.path.getsize(file_path) + len(self._tail)
+        self._hash = hashlib.sha256() if hash_content else None
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def sha256(self) -> Optional[str]:
+        return self._hash.hexdigest() if self._hash is not None else None
+
+    def __iter__(self) -> Iterator[bytes]:
+        sent = 0
+        yield self._head
+        with open(self.file_path, 'rb') as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                sent += len(chunk)
+                if self._hash is not None:
+                    self._hash.update(chunk)
+                if self.progress_callback:
+                    self.progress_callback(sent, self._length - len(self._head) - len(self._tail))
+                yield chunk
+        yield self._tail
+
+
+_hash_cache: Dict[Tuple[str, int, int], str] = {}
+_hash_cache_lock = threading.Lock()
+
+
+def sha256_of_file(path: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
+    """SHA-256 of a file; cached by path, size and mtime so fan-out to many targets hashes once."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _hash_cache_lock:
+        cached = _hash_cache.get(key)
+    if cached:
+        return cached
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    with _hash_cache_lock:
+        _hash_cache[key] = h.hexdigest()
+    return _hash_cache[key]
+
+
+class UploadLedger:
+    """Append-only record of the files this tool uploaded, keyed by workspace/environment/file name.
+
+    The staging API lists file names only, so a staged file's size and hash cannot be compared
+    with a local file; this ledger is the only evidence that a staged file is the one uploaded.
+    It only helps when it outlives the run (keep it in a persisted cache in CI) and when this
+    tool is the only writer to the environment: a same-named file uploaded by someone else is
+    still treated as unchanged.
+
+    Records are held in memory and each upload appends one JSON line, so recording is O(1).
+    `open` returns one shared instance per path, for managers of several environments.
+    """
+
+    _instances: Dict[str, 'UploadLedger'] = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: str) -> 'UploadLedger':
+        path = os.path.abspath(path)
+        with cls._instances_lock:
+            if path not in cls._instances:
+                cls._instances[path] = cls(path)
+            return cls._instances[path]
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        lines = 0
+        for line in text.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by an interrupted run
+            if isinstance(record, dict) and isinstance(record.get('key'), str):
+                self._records[record.pop('key')] = record
+                lines += 1
+        # Also rewrite after a torn last line, so the next append starts on a line of its own
+        if lines > 2 * len(self._records) or not text.endswith('\n'):
+            self._rewrite()
+
+    def _rewrite(self) -> None:
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for key, record in self._records.items():
+                f.write(json.dumps(dict(record, key=key)) + '\n')
+        os.replace(tmp_path, self.path)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._records.get(key)
+
+    def record(self, key: str, size: int, sha256: str) -> None:
+        record = {'size': size, 'sha256': sha256, 'uploaded_at': time.time()}
+        with self._lock:
+            self._records[key] = record
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(dict(record, key=key)) + '\n')
+
+
+def print_upload_progress(wheel_name: str) -> Callable[[int, int], None]:
+    """Progress callback that prints every 10% of a file."""
+    last_reported = [-1]
+
+    def callback(sent: int, total: int) -> None:
+        percent = int(sent * 100 / total) if total else 100
+        if percent // 10 > last_reported[0]:
+            last_reported[0] = percent // 10
+            safe_print(f"   {wheel_name}: {percent}% ({sent / (1024 * 1024):.1f} MB)")
+
+    return callback
+
+class LongRunningOperationPoller:
+    """Polls Fabric long-running operations until they finish.
+
+    The operation URL comes from the Location header (or x-ms-operation-id). Each wait honours
+    the server's Retry-After header and otherwise backs off exponentially up to `max_delay`.
+    `wait` blocks the caller; `wait_async` sleeps on the event loop instead of a thread, so
+    many operations (one per environment in `FabricFleetPublisher`) can be followed at once.
+    """
+
+    FAILED_STATUSES = ('Failed', 'Cancelled', 'Canceled')
+
+    def __init__(self, session: requests.Session, base_url: str,
+                 initial_delay: float = 2.0, max_delay: float = 30.0):
+        self.session = session
+        self.base_url = base_url
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+
+    def operation_url(self, response: requests.Response) -> Optional[str]:
+        location = response.headers.get('Location')
+        if location:
+            return location
+        operation_id = response.headers.get('x-ms-operation-id')
+        if operation_id:
+            return f"{self.base_url}/operations/{operation_id}"
+        return None
+
+    def _next_delay(self, response: Optional[requests.Response], attempt: int) -> float:
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                pass
+        return min(self.max_delay, self.initial_delay * (2 ** attempt))
+
+    def _evaluate(self, response: requests.Response, label: str) -> Optional[Dict[str, Any]]:
+        """Return the final result, or None while the operation is still running."""
+        if response.status_code != 200:
+            safe_print(f"⚠️ {label}: unable to check operation status: HTTP {response.status_code}")
+            return None
+
+        operation_status = response.json()
+        status = operation_status.get('status', 'Unknown')
+        if status == 'Succeeded':
+            safe_print(f"✅ {label}: completed successfully")
+            return {'success': True, 'message': f'{label} completed', 'operation_status': operation_status}
+        if status in self.FAILED_STATUSES:
+            error_msg = operation_status.get('error', 'Unknown error')
+            safe_print(f"❌ {label}: failed: {error_msg}")
+            return {'success': False, 'error': f'{label} failed: {error_msg}', 'operation_status': operation_status}
+        safe_print(f"⏳ {label}: {status}")
+        return None
+
+    def _no_operation(self, label: str) -> Dict[str, Any]:
+        return {'success': True, 'message': f'{label} completed (no operation ID)'}
+
+    def _timed_out(self, label: str, timeout: float) -> Dict[str, Any]:
+        safe_print(f"⏰ {label}: timeout after {timeout:.0f}s")
+        return {
+            'success': False,
+            'error': f'Timeout waiting for {label}',
+            'message': 'Check Fabric UI for the operation status'
+        }
+
+    def wait(self, response: requests.Response, label: str = 'Operation',
+             timeout: float = PUBLISH_TIMEOUT_SECONDS) -> Dict[str, Any]:
+        url = self.operation_url(response)
+        if not url:
+            return self._no_operation(label)
+
+        start_time = time.monotonic()
+        last_response: Optional[requests.Response] = response
+        attempt = 0
+        while time.monotonic() - start_time < timeout:
+            time.sleep(self._next_delay(last_response, attempt))
+            attempt += 1
+            try:
+                last_response = self.session.get(url, timeout=30)
+            except Exception as e:
+                safe_print(f"⚠️ {label}: error checking operation status: {e}")
+                last_response = None
+                continue
+            result = self._evaluate(last_response, label)
+            if result is not None:
+                return result
+        return self._timed_out(label, timeout)
+
+    async def wait_async(self, response: requests.Response, label: str = 'Operation',
+                         timeout: float = PUBLISH_TIMEOUT_SECONDS) -> Dict[str, Any]:
+        url = self.operation_url(response)
+        if not url:
+            return self._no_operation(label)
+
+        start_time = time.monotonic()
+        last_response: Optional[requests.Response] = response
+        attempt = 0
+        while time.monotonic() - start_time < timeout:
+            await asyncio.sleep(self._next_delay(last_response, attempt))
+            attempt += 1
+            try:
+                last_response = await asyncio.to_thread(self.session.get, url, timeout=30)
+            except Exception as e:
+                safe_print(f"⚠️ {label}: error checking operation status: {e}")
+                last_response = None
+                continue
+            result = self._evaluate(last_response, label)
+            if result is not None:
+                return result
+        return self._timed_out(label, timeout)
+
+
 class FabricEnvironmentManager:
     """Enhanced Fabric Environment manager with upload, publish capabilities, and retry logic."""
-    
+
+
     def __init__(self, workspace_id: str, environment_id: str, 
                  token: Optional[str] = None, client_id: Optional[str] = None, 
                  client_secret: Optional[str] = None, tenant_id: Optional[str] = None,
-                 use_default_credential: bool = False):
+                 use_default_credential: bool = False, ledger_path: Optional[str] = None,
+                 auth: Optional[FabricTokenAuth] = None):
         self.workspace_id = workspace_id
         self.environment_id = environment_id
         self.base_url = "https://api.fabric.microsoft.com/v1"
+
+        # Staging library list, fetched once per manager; optional ledger of what this tool uploaded
+        self.ledger_path = ledger_path
+        self.ledger = UploadLedger.open(ledger_path) if ledger_path else None
+        self._staging_libraries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._staging_lock = threading.Lock()
         
-        # Authentication
+        # Authentication; the auth hook refreshes the token before it expires
         self.use_default_credential = use_default_credential
-        self.token = self._get_token(token, client_id, client_secret, tenant_id)
+        self.auth = auth or self._get_auth(token, client_id, client_secret, tenant_id)
         
-        # Setup session
+        # Setup session; the pool is sized so concurrent uploads each keep a connection alive
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+        self.session.mount('https://', adapter)
+        self.session.auth = self.auth
         self.session.headers.update({
-            'Authorization': f'Bearer {self.token}',
             'Content-Type': 'application/json',
             'User-Agent': 'FabricLA-Connector/1.0.0'
         })
+        self.poller = LongRunningOperationPoller(self.session, self.base_url)
     
-    def _get_token(self, token: Optional[str], client_id: Optional[str], client_secret: Optional[str], tenant_id: Optional[str]) -> str:
-        """Get authentication token using various methods."""
+    @property
+    def token(self) -> str:
+        return self.auth.get_token()
+
+    def _get_auth(self, token: Optional[str], client_id: Optional[str], client_secret: Optional[str], tenant_id: Optional[str]) -> FabricTokenAuth:
+        """Build the session auth from the first available authentication method."""
         
         if token:
             safe_print("🔑 Using provided bearer token")
-            return token
+            return FabricTokenAuth(token=token)
         
         if client_id and client_secret and tenant_id:
             if not AZURE_IDENTITY_AVAILABLE:
@@ -114,7 +423,7 @@ class FabricEnvironmentManager:
                 client_id=client_id,
                 client_secret=client_secret
             )
-            return credential.get_token("https://api.fabric.microsoft.com/.default").token
+            return FabricTokenAuth(credential=credential)
 
         if self.use_default_credential:
             if not AZURE_IDENTITY_AVAILABLE:
@@ -126,28 +435,165 @@ class FabricEnvironmentManager:
             safe_print("Using DefaultAzureCredential (Azure CLI / Managed Identity / Environment)")
             from azure.identity import DefaultAzureCredential as _DefaultAzureCredential
             credential = _DefaultAzureCredential()
-            return credential.get_token("https://api.fabric.microsoft.com/.default").token
+            return FabricTokenAuth(credential=credential)
         
         raise Exception(
             "No authentication method available. Provide --token, or supply service principal credentials "
             "(--client-id, --client-secret, --tenant-id), or install 'azure-identity' and use --use-default-credential."
         )
     
-    def upload_wheel(self, wheel_path: str, max_retries: int = 3) -> Dict[str, Any]:
-        """Upload wheel file to staging libraries with retry logic."""
+    def get_staging_libraries(self, refresh: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Return {file name: metadata} for the environment's staging libraries.
+
+        The list is fetched once and reused by every upload of this manager. Metadata holds
+        whatever the API returns for the file (size or hash when available), or is empty
+        when the API only lists names.
+        """
+        with self._staging_lock:
+            if self._staging_libraries is None or refresh:
+                self._staging_libraries = self._list_libraries('staging/libraries')
+            return self._staging_libraries
+
+    def get_published_libraries(self) -> Dict[str, Dict[str, Any]]:
+        """Return {file name: metadata} for the environment's published libraries."""
+        return self._list_libraries('libraries')
+
+    def get_environment_yml(self, published: bool = False) -> str:
+        """Return the environment.yml (public libraries) of staging or published state, or ''."""
+        data = self._get_library_state('libraries' if published else 'staging/libraries')
+        return data.get('environmentYml') or ''
+
+    def _get_library_state(self, path: str) -> Dict[str, Any]:
+        url = f"{self.base_url}/workspaces/{self.workspace_id}/environments/{self.environment_id}/{path}"
+        try:
+            response = self.session.get(url, timeout=60)
+            if response.status_code == 200:
+                return response.json()
+            if response.status_code != 404:
+                safe_print(f"⚠️ Unable to list {path}: HTTP {response.status_code}")
+        except Exception as e:
+            safe_print(f"⚠️ Error listing {path}: {e}")
+        return {}
+
+    def _list_libraries(self, path: str) -> Dict[str, Dict[str, Any]]:
+        data = self._get_library_state(path)
+        libraries: Dict[str, Dict[str, Any]] = {}
+        custom = data.get('customLibraries') or {}
+        entries = [entry for files in custom.values() if isinstance(files, list) for entry in files]
+        entries.extend(data.get('libraries') or [])
+        for entry in entries:
+            if isinstance(entry, str):
+                libraries[entry] = {}
+            elif isinstance(entry, dict) and entry.get('name'):
+                libraries[entry['name']] = entry
+        return libraries
+
+    def delete_staging_library(self, library_name: str, max_retries: int = 3) -> Dict[str, Any]:
+        """Remove one library (a custom file or environment.yml) from staging, with retries."""
+        url = f"{self.base_url}/workspaces/{self.workspace_id}/environments/{self.environment_id}/staging/libraries"
+        error = 'not attempted'
+        for attempt in range(max_retries):
+            try:
+                response = self.session.delete(url, params={'libraryToDelete': library_name}, timeout=60)
+                # 404: already gone, which is the state we want
+                if response.status_code in (200, 204, 404):
+                    safe_print(f"🗑️ Removed {library_name} from staging")
+                    with self._staging_lock:
+                        if self._staging_libraries is not None:
+                            self._staging_libraries.pop(library_name, None)
+                    return {'success': True, 'library_name': library_name}
+                error = f"HTTP {response.status_code} - {response.text}"
+            except Exception as e:
+                error = str(e)
+            if attempt < max_retries - 1:
+                wait_time = 2 ** attempt
+                safe_print(f"⏳ Delete of {library_name} failed ({error}), retrying in {wait_time}s...")
+                time.sleep(wait_time)
+        safe_print(f"❌ Failed to remove {library_name}: {error}")
+        return {'success': False, 'error': error, 'library_name': library_name}
+
+    def delete_staging_libraries(self, library_names: List[str], max_retries: int = 3,
+                                 max_workers: int = 4) -> List[Dict[str, Any]]:
+        """Remove several libraries from staging concurrently; results are returned in input order."""
+        if not library_names:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(library_names)))) as executor:
+            return list(executor.map(lambda name: self.delete_staging_library(name, max_retries), library_names))
+
+    def needs_publish(self, upload_results: List[Dict[str, Any]]) -> bool:
+        """True unless every result was skipped and each skipped file is already published."""
+        if any(not result.get('skipped') for result in upload_results):
+            return True
+        published = self.get_published_libraries()
+        return any(result['wheel_name'] not in published for result in upload_results)
+
+    def _ledger_key(self, wheel_name: str) -> str:
+        return f"{self.workspace_id}/{self.environment_id}/{wheel_name}"
+
+    def _record_upload(self, wheel_name: str, size: int, sha256: Optional[str]) -> None:
+        if self.ledger is not None and sha256:
+            self.ledger.record(self._ledger_key(wheel_name), size, sha256)
+
+    def is_unchanged(self, wheel_name: str, size: int, sha256: Optional[str] = None,
+                     wheel_path: Optional[str] = None) -> bool:
+        """True when staging already holds this exact file (same name, size and hash).
+
+        The API currently reports names only; then the file counts as unchanged only if the
+        ledger (`ledger_path`) recorded uploading this size and hash, and never without one.
+        Pass the digest as `sha256`, or `wheel_path` to have the file hashed only when there
+        is a staged copy of the same size to compare it with.
+        """
+        staged = self.get_staging_libraries().get(wheel_name)
+        if staged is None:
+            return False
+
+        remote_hash = staged.get('sha256') or staged.get('hash')
+        remote_size = staged.get('size', staged.get('contentLength'))
+        if remote_size is not None and int(remote_size) != size:
+            return False
+        if remote_hash:
+            return remote_hash.lower() == (sha256 or sha256_of_file(wheel_path))
+
+        # The API only reports names; fall back to what this tool recorded when it uploaded the file
+        recorded = self.ledger.get(self._ledger_key(wheel_name)) if self.ledger is not None else None
+        if not recorded or recorded.get('size') != size:
+            return False
+        return recorded.get('sha256') == (sha256 or sha256_of_file(wheel_path))
+
+    def upload_wheel(self, wheel_path: str, max_retries: int = 3,
+                     progress_callback: Optional[Callable[[int, int], None]] = None,
+                     skip_unchanged: bool = True, sha256: Optional[str] = None) -> Dict[str, Any]:
+        """Upload wheel file to staging libraries with retry logic.
+
+        With skip_unchanged, a file the ledger recorded uploading with the same size and hash
+        is not uploaded again and the result has 'skipped': True. The file is only hashed for
+        that comparison or, with a ledger, while it streams to record it. Pass `sha256` when
+        the caller already knows the file's digest.
+        """
         
         if not os.path.exists(wheel_path):
             raise FileNotFoundError(f"Wheel file not found: {wheel_path}")
         
         wheel_name = os.path.basename(wheel_path)
         wheel_size = os.path.getsize(wheel_path)
+
+        if skip_unchanged and self.is_unchanged(wheel_name, wheel_size, sha256, wheel_path):
+            safe_print(f"⏭️ {wheel_name} is unchanged in staging, skipping upload")
+            return {
+                'success': True,
+                'skipped': True,
+                'message': f'Library {wheel_name} already staged',
+                'wheel_name': wheel_name
+            }
         
         safe_print(f"📦 Uploading {wheel_name} ({wheel_size / 1024:.1f} KB)")
         
         for attempt in range(max_retries):
             try:
-                result = self._attempt_upload(wheel_path, wheel_name)
+                result = self._attempt_upload(wheel_path, wheel_name, progress_callback,
+                                              hash_content=self.ledger is not None and not sha256)
                 if result['success']:
+                    self._record_upload(wheel_name, wheel_size, sha256 or result.get('sha256'))
                     return result
                 
                 # If this was the last attempt, return the error
@@ -178,35 +624,67 @@ class FabricEnvironmentManager:
             'wheel_name': wheel_name
         }
     
-    def _attempt_upload(self, wheel_path: str, wheel_name: str) -> Dict[str, Any]:
-        """Single upload attempt."""
+    @staticmethod
+    def resolve_package_paths(path_spec: str) -> List[str]:
+        """Expand a file path, directory or glob pattern into a sorted list of package files."""
+        if os.path.isdir(path_spec):
+            return sorted(
+                os.path.join(path_spec, name) for name in os.listdir(path_spec)
+                if name.lower().endswith(PACKAGE_EXTENSIONS) and os.path.isfile(os.path.join(path_spec, name))
+            )
+        if glob.has_magic(path_spec):
+            return sorted(path for path in glob.glob(path_spec) if os.path.isfile(path))
+        return [path_spec]
+
+    def upload_wheels(self, wheel_paths: List[str], max_retries: int = 3, max_workers: int = 4,
+                      show_progress: bool = False, skip_unchanged: bool = True) -> List[Dict[str, Any]]:
+        """Upload several files to staging concurrently; results are returned in input order."""
+        if not wheel_paths:
+            return []
+        if skip_unchanged:
+            self.get_staging_libraries()
+
+        safe_print(f"📦 Uploading {len(wheel_paths)} file(s) with up to {max_workers} in parallel")
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(wheel_paths)))) as executor:
+            return list(executor.map(
+                lambda path: self._upload_or_error(path, max_retries, show_progress, skip_unchanged), wheel_paths
+            ))
+
+    def _upload_or_error(self, wheel_path: str, max_retries: int, show_progress: bool = False,
+                         skip_unchanged: bool = True) -> Dict[str, Any]:
+        progress_callback = print_upload_progress(os.path.basename(wheel_path)) if show_progress else None
+        try:
+            return self.upload_wheel(wheel_path, max_retries=max_retries, progress_callback=progress_callback,
+                                     skip_unchanged=skip_unchanged)
+        except Exception as e:
+            safe_print(f"❌ {os.path.basename(wheel_path)}: {e}")
+            return {'success': False, 'error': str(e), 'wheel_name': os.path.basename(wheel_path)}
+
+    def _attempt_upload(self, wheel_path: str, wheel_name: str,
+                        progress_callback: Optional[Callable[[int, int], None]] = None,
+                        hash_content: bool = False) -> Dict[str, Any]:
+        """Single upload attempt, streamed through the pooled session.
+
+        With `hash_content`, a successful result carries the file's 'sha256' computed while it streamed.
+        """
         url = f"{self.base_url}/workspaces/{self.workspace_id}/environments/{self.environment_id}/staging/libraries"
-        import mimetypes
 
-        # Create proper multipart form data
-        content_type = mimetypes.guess_type(wheel_path)[0] or 'application/octet-stream'
-        with open(wheel_path, 'rb') as f:
-            files = {
-                'file': (wheel_name, f, content_type)
-            }
-            
-            # Create new headers without Content-Type (requests will set it automatically for multipart)
-            headers = {
-                'Authorization': f'Bearer {self.token}',
-                'User-Agent': 'FabricLA-Connector/1.0.0'
-            }
-            
-            # Use fresh post request instead of session to avoid header conflicts
-            response = requests.post(url, files=files, headers=headers, timeout=120)
+        body = MultipartFileStream(wheel_path, wheel_name, progress_callback=progress_callback,
+                                   hash_content=hash_content)
+        # Override the session's JSON Content-Type; Authorization comes from the session
+        response = self.session.post(url, data=body, headers={'Content-Type': body.content_type}, timeout=(30, 600))
         
         if response.status_code == 200:
             safe_print(f"✅ Upload successful: {wheel_name} (staged)")
-            return {
+            result = {
                 'success': True,
                 'message': f'Library {wheel_name} uploaded to staging',
                 'status_code': response.status_code,
                 'wheel_name': wheel_name
             }
+            if body.sha256:
+                result['sha256'] = body.sha256
+            return result
         else:
             error_msg = f"Upload failed: HTTP {response.status_code}"
             try:
@@ -223,10 +701,10 @@ class FabricEnvironmentManager:
                 'wheel_name': wheel_name
             }
     
-    def publish_environment(self) -> Dict[str, Any]:
-        """Publish the environment to make staging changes effective."""
+    def _start_publish(self) -> Tuple[Optional[requests.Response], Optional[Dict[str, Any]]]:
+        """Request a publish; returns (accepted response, None) or (None, error result)."""
         
-        safe_print("🚀 Publishing environment...")
+        safe_print(f"🚀 Publishing environment {self.environment_id}...")
         
         url = f"{self.base_url}/workspaces/{self.workspace_id}/environments/{self.environment_id}/staging/publish"
         
@@ -234,101 +712,203 @@ class FabricEnvironmentManager:
         
         if response.status_code in [200, 202]:
             safe_print("✅ Publish initiated successfully")
-            
-            # Check if it's a long-running operation
-            if response.status_code == 202:
-                operation_id = response.headers.get('x-ms-operation-id')
+            operation_id = response.headers.get('x-ms-operation-id')
+            if operation_id:
                 safe_print(f"📊 Long-running operation ID: {operation_id}")
-                
-                # Wait for completion (optional)
-                if operation_id:
-                    return self._wait_for_publish_completion(operation_id)
-                else:
-                    return {
-                        'success': True,
-                        'message': 'Environment published successfully (no operation ID)',
-                        'status_code': response.status_code
-                    }
-            
-            return {
-                'success': True,
-                'message': 'Environment published successfully',
-                'status_code': response.status_code
-            }
-        else:
-            error_msg = f"Publish failed: HTTP {response.status_code}"
-            try:
-                error_detail = response.json()
-                error_msg += f" - {error_detail}"
-            except:
-                error_msg += f" - {response.text}"
-            
-            safe_print(f"❌ {error_msg}")
-            return {
-                'success': False,
-                'error': error_msg,
-                'status_code': response.status_code
-            }
-    
-    def _wait_for_publish_completion(self, operation_id: str, max_wait: int = 300) -> Dict[str, Any]:
-        """Wait for publish operation to complete."""
-        
-        if not operation_id:
-            return {'success': True, 'message': 'Publish completed (no operation ID)'}
-        
-        operation_url = f"{self.base_url}/operations/{operation_id}"
-        safe_print(f"⏳ Waiting for publish completion (max {max_wait}s)...")
+            return response, None
+
+        error_msg = f"Publish failed: HTTP {response.status_code}"
+        try:
+            error_detail = response.json()
+            error_msg += f" - {error_detail}"
+        except:
+            error_msg += f" - {response.text}"
         
-        start_time = time.time()
-        while time.time() - start_time < max_wait:
-            try:
-                response = self.session.get(operation_url)
-                if response.status_code == 200:
-                    operation_status = response.json()
-                    status = operation_status.get('status', 'Unknown')
-                    
-                    if status == 'Succeeded':
-                        safe_print("✅ Publish completed successfully")
-                        return {
-                            'success': True,
-                            'message': 'Environment published and active',
-                            'operation_status': operation_status
-                        }
-                    elif status == 'Failed':
-                        error_msg = operation_status.get('error', 'Unknown error')
-                        safe_print(f"❌ Publish failed: {error_msg}")
-                        return {
-                            'success': False,
-                            'error': f'Publish operation failed: {error_msg}',
-                            'operation_status': operation_status
-                        }
-                    elif status in ['Running', 'NotStarted']:
-                        safe_print(f"⏳ Status: {status}")
-                        time.sleep(10)
-                    else:
-                        safe_print(f"⚠️ Unknown status: {status}")
-                        time.sleep(10)
-                else:
-                    safe_print(f"⚠️ Unable to check operation status: HTTP {response.status_code}")
-                    time.sleep(10)
-            except Exception as e:
-                safe_print(f"⚠️ Error checking operation status: {e}")
-                time.sleep(10)
+        safe_print(f"❌ {error_msg}")
+        return None, {
+            'success': False,
+            'error': error_msg,
+            'status_code': response.status_code
+        }
+
+    def publish_environment(self, max_wait: float = PUBLISH_TIMEOUT_SECONDS) -> Dict[str, Any]:
+        """Publish the environment to make staging changes effective."""
+        response, error = self._start_publish()
+        if error:
+            return error
+
+        # Check if it's a long-running operation
+        if response.status_code == 202:
+            return self.poller.wait(response, label='Publish', timeout=max_wait)
         
-        safe_print("⏰ Timeout waiting for publish completion")
         return {
-            'success': False,
-            'error': 'Timeout waiting for publish completion',
-            'message': 'Check Fabric UI for publish status'
+            'success': True,
+            'message': 'Environment published successfully',
+            'status_code': response.status_code
+        }
+
+    async def publish_environment_async(self, max_wait: float = PUBLISH_TIMEOUT_SECONDS) -> Dict[str, Any]:
+        """Publish without holding a thread while the operation runs, for awaiting many publishes at once."""
+        response, error = await asyncio.to_thread(self._start_publish)
+        if error:
+            return error
+
+        if response.status_code == 202:
+            return await self.poller.wait_async(response, label=f'Publish of {self.environment_id}', timeout=max_wait)
+
+        return {
+            'success': True,
+            'message': 'Environment published successfully',
+            'status_code': response.status_code
+        }
+    
+    def _wait_for_publish_completion(self, operation_id: str, max_wait: int = PUBLISH_TIMEOUT_SECONDS) -> Dict[str, Any]:
+        """Wait for a publish operation by ID (kept for callers that only have the operation ID)."""
+        response = requests.Response()
+        response.headers['x-ms-operation-id'] = operation_id
+        return self.poller.wait(response, label='Publish', timeout=max_wait)
+
+class FabricFleetPublisher:
+    """Roll one set of packages out to many (workspace, environment) targets at once.
+
+    Uploads across all targets share one concurrency limit; each target publishes as soon as
+    its own uploads finish, so publishes overlap with each other and with remaining uploads.
+    `run` returns one report row per target with its status and timings.
+    """
+
+    def __init__(self, targets: List[Tuple[str, str]], max_concurrent_uploads: int = 8,
+                 max_retries: int = 3, publish: bool = False, force: bool = False,
+                 publish_timeout: float = PUBLISH_TIMEOUT_SECONDS, show_progress: bool = False,
+                 **manager_kwargs: Any):
+        self.targets = targets
+        self.max_concurrent_uploads = max(1, max_concurrent_uploads)
+        self.max_retries = max_retries
+        self.publish = publish
+        self.force = force
+        self.publish_timeout = publish_timeout
+        self.show_progress = show_progress
+        self.manager_kwargs = manager_kwargs
+
+    @staticmethod
+    def load_targets(path: str) -> List[Tuple[str, str]]:
+        """Read `workspace_id,environment_id` lines; blank lines, comments and a header are ignored."""
+        targets = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                parts = [part.strip() for part in line.split(',')]
+                if len(parts) < 2 or parts[0].lower() in ('workspace_id', 'workspace'):
+                    continue
+                targets.append((parts[0], parts[1]))
+        return targets
+
+    def run(self, package_paths: List[str]) -> List[Dict[str, Any]]:
+        return asyncio.run(self.run_async(package_paths))
+
+    async def run_async(self, package_paths: List[str]) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        # Upload threads are bounded by the semaphore; the extra workers serve publish polling
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.max_concurrent_uploads + 8))
+        upload_slots = asyncio.Semaphore(self.max_concurrent_uploads)
+
+        # Authenticate once and share the auth (and its token refreshes) with every target
+        kwargs = dict(self.manager_kwargs)
+        if not kwargs.get('auth'):
+            first = await asyncio.to_thread(FabricEnvironmentManager, *self.targets[0], **kwargs)
+            kwargs = {'auth': first.auth, 'ledger_path': kwargs.get('ledger_path')}
+
+        safe_print(f"🚚 Rolling out {len(package_paths)} file(s) to {len(self.targets)} environment(s), "
+                   f"up to {self.max_concurrent_uploads} upload(s) at a time")
+        return await asyncio.gather(*(
+            self._roll_out(workspace_id, environment_id, package_paths, upload_slots, kwargs)
+            for workspace_id, environment_id in self.targets
+        ))
+
+    async def _upload(self, manager: FabricEnvironmentManager, path: str,
+                      upload_slots: asyncio.Semaphore) -> Dict[str, Any]:
+        async with upload_slots:
+            return await asyncio.to_thread(manager._upload_or_error, path, self.max_retries,
+                                           self.show_progress, not self.force)
+
+    async def _roll_out(self, workspace_id: str, environment_id: str, package_paths: List[str],
+                        upload_slots: asyncio.Semaphore, manager_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        report: Dict[str, Any] = {
+            'workspace_id': workspace_id,
+            'environment_id': environment_id,
+            'status': 'error',
+            'uploaded': 0,
+            'skipped': 0,
+            'failed': [],
+            'upload_seconds': 0.0,
+            'publish_seconds': 0.0,
+            'error': None,
         }
+        started = time.monotonic()
+        try:
+            manager = await asyncio.to_thread(FabricEnvironmentManager, workspace_id, environment_id, **manager_kwargs)
+            if not self.force:
+                await asyncio.to_thread(manager.get_staging_libraries)
+
+            results = await asyncio.gather(*(self._upload(manager, path, upload_slots) for path in package_paths))
+            report['upload_seconds'] = round(time.monotonic() - started, 1)
+            report['uploaded'] = sum(1 for result in results if result['success'] and not result.get('skipped'))
+            report['skipped'] = sum(1 for result in results if result.get('skipped'))
+            report['failed'] = [result['wheel_name'] for result in results if not result['success']]
+
+            if report['failed']:
+                report['status'] = 'upload_failed'
+            elif not self.publish:
+                report['status'] = 'staged'
+            elif not self.force and not await asyncio.to_thread(manager.needs_publish, results):
+                report['status'] = 'unchanged'
+            else:
+                publish_started = time.monotonic()
+                publish_result = await manager.publish_environment_async(max_wait=self.publish_timeout)
+                report['publish_seconds'] = round(time.monotonic() - publish_started, 1)
+                report['status'] = 'published' if publish_result['success'] else 'publish_failed'
+                report['error'] = None if publish_result['success'] else publish_result.get('error')
+        except Exception as e:
+            report['error'] = str(e)
+        report['total_seconds'] = round(time.monotonic() - started, 1)
+
+        icon = '✅' if report['status'] in ('published', 'staged', 'unchanged') else '❌'
+        safe_print(f"{icon} {workspace_id}/{environment_id}: {report['status']} in {report['total_seconds']}s")
+        return report
+
+    @staticmethod
+    def print_report(reports: List[Dict[str, Any]]) -> None:
+        safe_print(f"{'Workspace':<38} {'Environment':<38} {'Status':<15} {'Up':>4} {'Skip':>5} "
+                   f"{'Upload s':>9} {'Publish s':>10} {'Total s':>8}")
+        for report in reports:
+            safe_print(f"{report['workspace_id']:<38} {report['environment_id']:<38} {report['status']:<15} "
+                       f"{report['uploaded']:>4} {report['skipped']:>5} {report['upload_seconds']:>9} "
+                       f"{report['publish_seconds']:>10} {report['total_seconds']:>8}")
+            if report['error'] or report['failed']:
+                safe_print(f"    {report['error'] or 'failed: ' + ', '.join(report['failed'])}")
+
 
 def main():
     parser = argparse.ArgumentParser(description='Upload packages (whl, sdist, etc.) to Fabric Environment with optional publish and retry logic')
-    parser.add_argument('--workspace-id', required=True, help='Fabric workspace ID')
-    parser.add_argument('--environment-id', required=True, help='Fabric environment ID')
-    parser.add_argument('--file', required=True, help='Path to package file')
-    parser.add_argument('--publish', action='store_true', help='Publish environment after upload')
+    parser.add_argument('--workspace-id', help='Fabric workspace ID')
+    parser.add_argument('--environment-id', help='Fabric environment ID')
+    parser.add_argument('--targets', help='File of "workspace_id,environment_id" lines to roll out to many environments')
+    parser.add_argument('--max-concurrent-uploads', type=int, default=8,
+                        help='Uploads in flight across all --targets (default: 8)')
+    parser.add_argument('--report', help='Write the per-target --targets report to this JSON file')
+    parser.add_argument('--file', required=True, help='Path to a package file, a directory of packages, or a glob pattern')
+    parser.add_argument('--publish', action='store_true', help='Publish environment once after all uploads')
     parser.add_argument('--retries', type=int, default=3, help='Number of retry attempts (default: 3)')
+    parser.add_argument('--parallel', type=int, default=4, help='Number of concurrent uploads (default: 4)')
+    parser.add_argument('--progress', action='store_true', help='Print upload progress every 10%% of each file')
+    parser.add_argument('--publish-timeout', type=int, default=PUBLISH_TIMEOUT_SECONDS,
+                        help=f'Seconds to wait for the publish to complete (default: {PUBLISH_TIMEOUT_SECONDS})')
+    parser.add_argument('--force', action='store_true', help='Upload even when an identical file is already staged')
+    parser.add_argument('--ledger',
+                        help='File recording hashes of uploaded packages. The API lists staged files by name only, '
+                             'so unchanged files are detected (and skipped) only through this ledger; keep it '
+                             'somewhere that persists between runs')
     
     # Authentication options
     parser.add_argument('--token', help='Bearer token for authentication')
@@ -338,6 +918,12 @@ def main():
     parser.add_argument('--use-default-credential', action='store_true', help='Use DefaultAzureCredential when available')
     
     args = parser.parse_args()
+    if not args.targets and not (args.workspace_id and args.environment_id):
+        parser.error('--workspace-id and --environment-id are required unless --targets is given')
+
+    if args.targets:
+        run_fleet(args)
+        return
     
     try:
         # Initialize manager
@@ -348,19 +934,32 @@ def main():
             client_id=args.client_id,
             client_secret=args.client_secret,
             tenant_id=args.tenant_id,
-            use_default_credential=args.use_default_credential
+            use_default_credential=args.use_default_credential,
+            ledger_path=args.ledger
         )
         
-        # Upload wheel
-        upload_result = manager.upload_wheel(args.file, max_retries=args.retries)
+        package_paths = FabricEnvironmentManager.resolve_package_paths(args.file)
+        if not package_paths:
+            safe_print(f"❌ No package files found for: {args.file}")
+            sys.exit(1)
+
+        # Upload all packages, then publish once
+        upload_results = manager.upload_wheels(package_paths, max_retries=args.retries, max_workers=args.parallel,
+                                               show_progress=args.progress, skip_unchanged=not args.force)
+        failed = [result['wheel_name'] for result in upload_results if not result['success']]
         
-        if not upload_result['success']:
+        if failed:
+            safe_print(f"❌ {len(failed)} of {len(upload_results)} upload(s) failed: {', '.join(failed)}")
+            if args.publish:
+                safe_print("⚠️ Skipping publish; successful uploads remain in staging")
             sys.exit(1)
         
         # Publish if requested
-        if args.publish:
+        if args.publish and not args.force and not manager.needs_publish(upload_results):
+            safe_print("✅ Nothing changed and all packages are already published, skipping publish")
+        elif args.publish:
             safe_print("🔄 Auto-publish enabled")
-            publish_result = manager.publish_environment()
+            publish_result = manager.publish_environment(max_wait=args.publish_timeout)
             
             if not publish_result['success']:
                 safe_print("⚠️ Upload succeeded but publish failed")
@@ -379,5 +978,49 @@ def main():
         safe_print(f"❌ Error: {e}")
         sys.exit(1)
 
+def run_fleet(args: argparse.Namespace) -> None:
+    """Roll the packages out to every environment listed in --targets."""
+    try:
+        targets = FabricFleetPublisher.load_targets(args.targets)
+        package_paths = FabricEnvironmentManager.resolve_package_paths(args.file)
+        if not targets:
+            safe_print(f"❌ No targets found in: {args.targets}")
+            sys.exit(1)
+        if not package_paths:
+            safe_print(f"❌ No package files found for: {args.file}")
+            sys.exit(1)
+
+        fleet = FabricFleetPublisher(
+            targets,
+            max_concurrent_uploads=args.max_concurrent_uploads,
+            max_retries=args.retries,
+            publish=args.publish,
+            force=args.force,
+            publish_timeout=args.publish_timeout,
+            show_progress=args.progress,
+            token=args.token,
+            client_id=args.client_id,
+            client_secret=args.client_secret,
+            tenant_id=args.tenant_id,
+            use_default_credential=args.use_default_credential,
+            ledger_path=args.ledger
+        )
+        reports = fleet.run(package_paths)
+    except Exception as e:
+        safe_print(f"❌ Error: {e}")
+        sys.exit(1)
+
+    FabricFleetPublisher.print_report(reports)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+        safe_print(f"📝 Report written to {args.report}")
+
+    failed = [report for report in reports if report['status'] not in ('published', 'staged', 'unchanged')]
+    if failed:
+        safe_print(f"❌ {len(failed)} of {len(reports)} target(s) failed")
+        sys.exit(1)
+    safe_print(f"🎉 All {len(reports)} target(s) completed")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,12 +1,19 @@
 import os
 import argparse
 import csv
+import email.utils
 import subprocess
+import threading
+import time
+import requests
 import yaml
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from azure.identity import DefaultAzureCredential
 from azure.storage.blob import BlobServiceClient
 
+ONELAKE_DFS_URL = "https://onelake.dfs.fabric.microsoft.com"
+STORAGE_SCOPE = "https://storage.azure.com/.default"
+
 
 def load_config(config_path):
     with open(config_path, 'r') as f:
@@ -60,6 +67,10 @@ def create_shortcut(args, folder_name, skip_folders, lakehouse_folder):
             print(result.stderr)
     except Exception as e:
         print(f"Error running fab CLI: {e}")
+        return None
+    if result.returncode != 0:
+        print(f"Failed to create shortcut {shortcut_full_path} (fab exited with {result.returncode})")
+        return None
     return {
         "location": args.get('account_url', ''),
         "subpath": subpath,
@@ -70,6 +81,110 @@ def create_shortcut(args, folder_name, skip_folders, lakehouse_folder):
         "shortcutName": shortcut_name
     }
 
+class RateLimiter:
+    """Requests-per-second limit shared by all verification workers; a 429 pauses all of them."""
+
+    def __init__(self, rate_per_second):
+        self.interval = 1.0 / rate_per_second
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        time.sleep(max(0.0, slot - now))
+
+    def pause(self, seconds):
+        with self.lock:
+            self.next_slot = max(self.next_slot, time.monotonic() + seconds)
+
+def retry_after_seconds(response, default=10):
+    """Seconds to wait from a Retry-After header, which holds either seconds or an HTTP date."""
+    retry_after = response.headers.get('Retry-After')
+    if not retry_after:
+        return default
+    try:
+        return int(retry_after)
+    except ValueError:
+        try:
+            return max(0, int(email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time()))
+        except (TypeError, ValueError):
+            return default
+
+def storage_token_provider(credential):
+    # One token for all workers, refreshed shortly before it expires
+    lock = threading.Lock()
+    cached = {}
+    def get_token():
+        with lock:
+            if 'token' not in cached or cached['token'].expires_on - time.time() < 300:
+                cached['token'] = credential.get_token(STORAGE_SCOPE)
+            return cached['token'].token
+    return get_token
+
+def verify_shortcut(config, result, get_token, limiter, max_retries=3):
+    """Probe a shortcut's target with a single list call for at most one path through OneLake DFS."""
+    shortcut_path = f"{config['lakehouse']}.Lakehouse/Files/{config['lakehouse_folder']}/{result['target']}/{result['shortcutName']}"
+    url = f"{ONELAKE_DFS_URL}/{config['workspace']}"
+    params = {'resource': 'filesystem', 'directory': shortcut_path, 'recursive': 'false', 'maxResults': 1}
+    started = time.time()
+    status, http_status = 'error', None
+    for attempt in range(max_retries):
+        limiter.wait()
+        try:
+            response = requests.get(url, params=params, headers={
+                'Authorization': f'Bearer {get_token()}',
+                'x-ms-version': '2023-11-03'
+            }, timeout=30)
+        except requests.RequestException as e:
+            print(f"Error probing {shortcut_path}: {e}")
+            time.sleep(2 ** attempt)
+            continue
+        http_status = response.status_code
+        if http_status == 200:
+            status = 'healthy' if response.json().get('paths') else 'empty'
+            break
+        if http_status == 403:
+            status = 'forbidden'
+            break
+        if http_status == 404:
+            status = 'missing'
+            break
+        if http_status in (429, 503):
+            limiter.pause(retry_after_seconds(response))
+        else:
+            time.sleep(2 ** attempt)
+    if status != 'healthy':
+        print(f"Shortcut {shortcut_path} is {status} (HTTP {http_status})")
+    return {
+        "shortcutName": result['shortcutName'],
+        "path": shortcut_path,
+        "status": status,
+        "httpStatus": http_status,
+        "latencyMs": int((time.time() - started) * 1000)
+    }
+
+def verify_shortcuts(config, results, credential):
+    get_token = storage_token_provider(credential)
+    limiter = RateLimiter(config.get('verify_rate', 50))
+    with ThreadPoolExecutor(max_workers=config.get('verify_parallel', 32)) as executor:
+        futures = [executor.submit(verify_shortcut, config, result, get_token, limiter) for result in results]
+        health = [future.result() for future in as_completed(futures)]
+
+    with open("shortcut_health.csv", "w", newline='') as csvfile:
+        fieldnames = ["shortcutName", "path", "status", "httpStatus", "latencyMs"]
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        for row in sorted(health, key=lambda row: row['path']):
+            writer.writerow(row)
+
+    counts = {}
+    for row in health:
+        counts[row['status']] = counts.get(row['status'], 0) + 1
+    print(f"Verified {len(health)} shortcuts: {counts}. Health report written to shortcut_health.csv.")
+
 def main():
     parser = argparse.ArgumentParser(description="Bulk create Fabric shortcuts from ADLS Gen2 folders.")
     parser.add_argument('--config', help='Path to YAML config file')
@@ -85,6 +200,9 @@ def main():
     parser.add_argument('--max-depth', type=int, default=None, help='Max recursion depth for folder discovery')
     parser.add_argument('--parallel', type=int, default=4, help='Number of parallel shortcut creations')
     parser.add_argument('--shortcut-template', default='shortcut_{folder}', help='Template for shortcut names')
+    parser.add_argument('--verify', action='store_true', default=None, help='Probe every shortcut target through OneLake after creation')
+    parser.add_argument('--verify-parallel', type=int, default=None, help='Number of parallel verification probes (default 32)')
+    parser.add_argument('--verify-rate', type=float, default=None, help='Max verification probes per second across all workers (default 50)')
     args = parser.parse_args()
 
     # Load config file if provided
@@ -129,7 +247,15 @@ def main():
         for row in results:
             writer.writerow(row)
 
-    print("All shortcuts created and shortcuts.csv written.")
+    failed = len(folders - skip_folders) - len(results)
+    if failed:
+        print(f"{len(results)} shortcuts created, {failed} failed; only the created ones are in shortcuts.csv.")
+    else:
+        print("All shortcuts created and shortcuts.csv written.")
+
+    # Only shortcuts that exist are probed; failed creations would all show up as missing
+    if config.get('verify'):
+        verify_shortcuts(config, results, credential)
 
 if __name__ == "__main__":
     main()